@@ -0,0 +1,134 @@
+import asyncio
+import math
+import random
+import secrets
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from fastapi import HTTPException
+
+from config import settings
+from metrics import metrics
+from repositories import RedisRepository
+
+# Smoothing of the mean time a slot is held, used to estimate Retry-After
+HOLD_SECONDS_SMOOTHING = 0.1
+
+# kind -> smoothed seconds a slot is held, shared by the controllers of the process
+_hold_seconds: Dict[str, float] = {}
+
+
+class AdmissionController:
+    """
+    Per-org and per-user concurrency limits of a kind of request, e.g. chat or load, held across the worker processes
+    in Redis.
+
+    A request takes a slot of its user and one of its org, slots are leases in sorted sets scored by their expiry so
+    that slots of crashed workers are reclaimed. Requests over a limit wait in the bounded queue of their org, and are
+    rejected with 429 and a Retry-After header when the queue is full or they waited for `max_wait` seconds.
+    """
+
+    def __init__(
+        self,
+        redis_repository: RedisRepository,
+        org_concurrency: int = 16,
+        user_concurrency: int = 4,
+        queue_size: int = 32,
+        max_wait: float = 10,
+        lease: int = 300,
+        poll_interval: float = 0.05,
+    ):
+        self.redis_repository = redis_repository
+        self.org_concurrency = org_concurrency
+        self.user_concurrency = user_concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    async def _acquire(self, key: str, token: str, limit: int) -> bool:
+        now = time.time()
+        # Slots are ranked by expiry, i.e. by arrival, the first `limit` are held
+        if await self.redis_repository.add_ranked(key, token, now + self.lease, expire_before=now) < limit:
+            return True
+
+        await self.redis_repository.remove_ranked(key, token)
+        return False
+
+    def _reject(self, kind: str, reason: str, queue_depth: int):
+        metrics.increment("admission_requests_total", kind=kind, outcome=reason)
+
+        # Time for the queue ahead to drain through the slots of the org
+        hold_seconds = _hold_seconds.get(kind, 1.0)
+        retry_after = math.ceil(max(1.0, hold_seconds * (queue_depth + 1) / self.org_concurrency))
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many concurrent {kind} requests, please retry later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    @asynccontextmanager
+    async def admit(self, kind: str, org_id: str, user_id: str) -> AsyncIterator[None]:
+        """Hold a slot of the user and of the org for the duration of the context"""
+
+        user_key = f"admission:{kind}:user:{org_id}:{user_id}"
+        org_key = f"admission:{kind}:org:{org_id}"
+        queue_key = f"admission:{kind}:queue:{org_id}"
+        token = secrets.token_hex(16)
+
+        started_at = time.monotonic()
+        queued = False
+        try:
+            while True:
+                if await self._acquire(user_key, token, self.user_concurrency):
+                    if await self._acquire(org_key, token, self.org_concurrency):
+                        break
+                    await self.redis_repository.remove_ranked(user_key, token)
+
+                if not queued:
+                    now = time.time()
+                    rank = await self.redis_repository.add_ranked(
+                        queue_key, token, now + self.max_wait + self.poll_interval, expire_before=now
+                    )
+                    queued = True
+                    metrics.observe("admission_queue_depth", rank + 1, kind=kind)
+                    if rank >= self.queue_size:
+                        self._reject(kind, "rejected", queue_depth=rank)
+                if time.monotonic() - started_at > self.max_wait:
+                    self._reject(kind, "timeout", queue_depth=self.queue_size)
+
+                # Jittered, so that the waiting requests of several workers do not poll in lockstep
+                await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+        finally:
+            if queued:
+                await self.redis_repository.remove_ranked(queue_key, token)
+
+        wait_seconds = time.monotonic() - started_at
+        metrics.increment("admission_requests_total", kind=kind, outcome="queued" if queued else "admitted")
+        metrics.observe("admission_wait_seconds", wait_seconds, kind=kind)
+
+        admitted_at = time.monotonic()
+        try:
+            yield
+        finally:
+            await self.redis_repository.remove_ranked(org_key, token)
+            await self.redis_repository.remove_ranked(user_key, token)
+
+            hold_seconds = time.monotonic() - admitted_at
+            previous = _hold_seconds.get(kind, hold_seconds)
+            _hold_seconds[kind] = previous + HOLD_SECONDS_SMOOTHING * (hold_seconds - previous)
+            metrics.observe("admission_hold_seconds", hold_seconds, kind=kind)
+
+
+def admission_controller(redis_repository: RedisRepository) -> AdmissionController:
+    """Admission controller with the limits from the settings"""
+
+    return AdmissionController(
+        redis_repository=redis_repository,
+        org_concurrency=settings.ADMISSION_ORG_CONCURRENCY,
+        user_concurrency=settings.ADMISSION_USER_CONCURRENCY,
+        queue_size=settings.ADMISSION_QUEUE_SIZE,
+        max_wait=settings.ADMISSION_MAX_WAIT,
+        lease=settings.ADMISSION_LEASE,
+    )
@@ -0,0 +1,12 @@
+import os
+
+# Benchmarks run against local stand-ins, the integration credentials only need placeholder values
+for name in (
+    "AIRTABLE_CLIENT_ID",
+    "AIRTABLE_CLIENT_SECRET",
+    "HUBSPOT_CLIENT_ID",
+    "HUBSPOT_CLIENT_SECRET",
+    "NOTION_CLIENT_ID",
+    "NOTION_CLIENT_SECRET",
+):
+    os.environ.setdefault(name, "benchmark")
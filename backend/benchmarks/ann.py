@@ -0,0 +1,101 @@
+"""
+Benchmark of the IVF approximate nearest neighbour search against brute force scoring, reporting recall@k and query
+latency per number of probed clusters, for a whole index and for a query scoped to a subset of its nodes.
+
+Run from the backend directory:
+    $ python -m benchmarks.ann --nodes 200000 --dimensions 256
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.compression import make_embeddings, make_nodes
+from metrics import percentile
+from rag.vector_stores import CompressedVectorStore
+
+PROBES = [1, 4, 8, 16, 32, 64]
+
+
+def run(store: CompressedVectorStore, name: str, queries: np.ndarray, expected: list, top_k: int, node_ids) -> dict:
+    hits, latencies = 0, []
+    for query, expected_ids in zip(queries, expected):
+        started_at = time.perf_counter()
+        result = store.query(
+            VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k, node_ids=node_ids)
+        )
+        latencies.append(time.perf_counter() - started_at)
+        hits += len(set(result.ids) & expected_ids)
+
+    return {
+        "search": name,
+        f"recall@{top_k}": hits / (len(queries) * top_k),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+
+def main(args: argparse.Namespace):
+    embeddings = make_embeddings(args.nodes, args.dimensions, args.clusters, args.seed, spread=args.spread)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = embeddings[rng.integers(len(embeddings), size=args.queries)]
+    queries = queries + 0.5 * rng.normal(size=queries.shape).astype(np.float32) / np.sqrt(args.dimensions)
+
+    store = CompressedVectorStore(codec_name="float32", ann_min_nodes=args.nodes)
+    started_at = time.perf_counter()
+    for start in range(0, args.nodes, 10000):
+        store.add(make_nodes(embeddings[start : start + 10000], offset=start))
+    build_seconds = time.perf_counter() - started_at
+
+    # Every other node, like an access list in a shared index
+    subset = [f"node_{index}" for index in range(0, args.nodes, 2)]
+
+    results = []
+    for scope, node_ids, candidates in [
+        ("all", None, np.arange(args.nodes)),
+        ("half", subset, np.arange(0, args.nodes, 2)),
+    ]:
+        expected = [
+            set(f"node_{candidates[index]}" for index in np.argsort(-(embeddings[candidates] @ query))[: args.top_k])
+            for query in queries
+        ]
+
+        store.ann_min_nodes = None
+        results.append({"scope": scope, **run(store, "brute force", queries, expected, args.top_k, node_ids)})
+        store.ann_min_nodes = len(candidates)
+        for probes in PROBES:
+            store.ann_probes = probes
+            results.append(
+                {"scope": scope, **run(store, f"ivf probes={probes}", queries, expected, args.top_k, node_ids)}
+            )
+
+    table = Table(
+        title=f"ANN search, {args.nodes} nodes of {args.dimensions} dimensions, built in {build_seconds:.1f}s"
+    )
+    for column in results[0]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.3f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=200000, help="Number of stored embeddings")
+    parser.add_argument("--dimensions", type=int, default=256, help="Embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=500, help="Number of topics the embeddings are drawn around")
+    parser.add_argument("--spread", type=float, default=1.5, help="Spread of the embeddings around their topic")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Hits per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    main(parser.parse_args())
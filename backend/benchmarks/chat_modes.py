@@ -0,0 +1,96 @@
+"""
+Benchmark of the chat modes, reporting LLM and embedding round trips and latency per mode.
+
+Run from the backend directory:
+    $ python -m benchmarks.chat_modes --llm-latency 0.3 --embed-latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import make_hubspot_items
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from config import settings
+from metrics import percentile
+
+QUESTIONS = [
+    "Who are my contacts at Acme?",
+    "Show the contact John Smith",
+    "List my HubSpot contacts at Globex",
+    "Which company does Maria Garcia work for?",
+    "Compare the contacts at Acme and Initech",
+    "How many contacts do I have at Hooli and why are there so few?",
+    "Summarize my contacts across all companies",
+    "Explain the relationship between Wayne and Stark contacts",
+]
+
+MODES = ["react", "condense_plus_context", "context", "auto"]
+
+
+async def run_mode(engine, mode: str, repeats: int) -> dict:
+    settings.CHAT_MODE = mode
+    latencies, llm_calls, embed_calls = [], [], []
+
+    for repeat in range(repeats):
+        for index, question in enumerate(QUESTIONS):
+            engine.llm.calls, engine.embed_model.calls = 0, 0
+
+            started_at = time.perf_counter()
+            await engine.chat(
+                user_id="benchmark", org_id="benchmark", chat_session_id=f"{mode}_{repeat}_{index}", message=question
+            )
+            latencies.append(time.perf_counter() - started_at)
+
+            llm_calls.append(engine.llm.calls)
+            embed_calls.append(engine.embed_model.calls)
+
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "llm_round_trips": sum(llm_calls) / len(llm_calls),
+        "embedding_round_trips": sum(embed_calls) / len(embed_calls),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+
+async def main(args: argparse.Namespace):
+    settings.RAG_STORAGE_PATH = tempfile.mkdtemp(prefix="rag_benchmark_")
+    settings.SEMANTIC_CACHE_ENABLED = False
+
+    # Imported after the settings are patched, so that the engine picks them up
+    from rag import RAGEngine
+
+    engine = RAGEngine(llm=FakeLLM(latency=args.llm_latency), embed_model=FakeEmbedding(latency=args.embed_latency))
+    await engine.add_integration_items(
+        user_id="benchmark", org_id="benchmark", items=make_hubspot_items(args.items), integration_type="Hubspot"
+    )
+
+    results = [await run_mode(engine, mode, args.repeats) for mode in MODES]
+
+    table = Table(title="Chat modes")
+    for column in ["mode", "requests", "llm_round_trips", "embedding_round_trips", "p50_ms", "p95_ms"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.2f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200, help="Number of HubSpot contacts to ingest")
+    parser.add_argument("--repeats", type=int, default=3, help="Times every question is asked per mode")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per LLM round trip")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding round trip")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    asyncio.run(main(parser.parse_args()))
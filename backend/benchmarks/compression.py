@@ -0,0 +1,165 @@
+"""
+Benchmark of the compressed embedding storage, reporting recall@k against exact float search, resident memory,
+disk size and query latency per codec, dimensions and re-ranking.
+
+Embeddings are synthetic, clustered and with a variance decaying along the dimensions, like Matryoshka embeddings
+which keep most of their information in the leading dimensions.
+
+Run from the backend directory:
+    $ python -m benchmarks.compression --nodes 2000 --dimensions 3072
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from rich.console import Console
+from rich.table import Table
+
+from metrics import percentile
+from rag.vector_stores import JSON_STORE_FILE, CompressedVectorStore, SubsetVectorStore
+
+# codec, stored dimensions (None keeps them all), float re-ranking
+CONFIGURATIONS = [
+    ("float32", None, False),
+    ("float32", 1024, False),
+    ("float32", 256, False),
+    ("int8", None, False),
+    ("int8", None, True),
+    ("int8", 1024, True),
+    ("int8", 256, True),
+    ("pq", 1024, False),
+    ("pq", 1024, True),
+    ("pq", 256, True),
+]
+
+
+def make_embeddings(count: int, dimensions: int, clusters: int, seed: int, spread: float = 0.5) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    scales = 1.0 / np.sqrt(1.0 + np.arange(dimensions) / 32.0)
+    centers = rng.normal(size=(clusters, dimensions)) * scales
+    embeddings = centers[rng.integers(clusters, size=count)] + spread * rng.normal(size=(count, dimensions)) * scales
+    return (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_nodes(embeddings: np.ndarray, offset: int = 0) -> list:
+    return [
+        TextNode(
+            id_=f"node_{index}",
+            embedding=embedding.tolist(),
+            relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc_{index}")},
+        )
+        for index, embedding in enumerate(embeddings, start=offset)
+    ]
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run(name: str, load_store, nodes: list, queries: np.ndarray, expected: list, top_k: int) -> dict:
+    persist_dir = tempfile.mkdtemp(prefix="rag_compression_")
+    store = load_store(None)
+    store.add(nodes)
+    store.persist(persist_path=os.path.join(persist_dir, JSON_STORE_FILE))
+
+    # Resident memory of the store loaded back from disk, memory mapped files are not counted
+    tracemalloc.start()
+    store = load_store(persist_dir)
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    hits, latencies = 0, []
+    for query, expected_ids in zip(queries, expected):
+        started_at = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k))
+        latencies.append(time.perf_counter() - started_at)
+        hits += len(set(result.ids) & expected_ids)
+
+    return {
+        "store": name,
+        f"recall@{top_k}": hits / (len(queries) * top_k),
+        "memory_mb": memory_bytes / 2**20,
+        "disk_mb": directory_bytes(persist_dir) / 2**20,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+
+def main(args: argparse.Namespace):
+    embeddings = make_embeddings(args.nodes, args.dimensions, args.clusters, args.seed)
+    nodes = make_nodes(embeddings)
+
+    # Queries are noisy copies of stored embeddings, the expected hits are the exact float32 top k
+    rng = np.random.default_rng(args.seed + 1)
+    queries = embeddings[rng.integers(len(embeddings), size=args.queries)]
+    queries = queries + 0.5 * rng.normal(size=queries.shape).astype(np.float32) / np.sqrt(args.dimensions)
+    expected = [set(f"node_{index}" for index in np.argsort(-(embeddings @ query))[: args.top_k]) for query in queries]
+
+    results = [
+        run(
+            "json",
+            lambda persist_dir: (
+                SubsetVectorStore() if persist_dir is None else SubsetVectorStore.from_persist_dir(persist_dir)
+            ),
+            nodes,
+            queries,
+            expected,
+            args.top_k,
+        )
+    ]
+    for codec_name, dimensions, rerank in CONFIGURATIONS:
+        # The store keeps all the dimensions of embeddings shorter than the truncation
+        stored_dimensions = min(dimensions or args.dimensions, args.dimensions)
+        options = dict(
+            codec_name=codec_name,
+            dimensions=dimensions,
+            rerank=rerank,
+            rerank_oversample=args.oversample,
+            pq_subspaces=args.pq_subspaces,
+        )
+        results.append(
+            run(
+                f"{codec_name}@{stored_dimensions}{' +rerank' if rerank else ''}",
+                lambda persist_dir, options=options: (
+                    CompressedVectorStore(**options)
+                    if persist_dir is None
+                    else CompressedVectorStore.from_persist_dir(persist_dir, **options)
+                ),
+                nodes,
+                queries,
+                expected,
+                args.top_k,
+            )
+        )
+
+    table = Table(title=f"Embedding storage, {args.nodes} nodes of {args.dimensions} dimensions")
+    for column in results[0]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.3f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=2000, help="Number of stored embeddings")
+    parser.add_argument("--dimensions", type=int, default=3072, help="Embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=50, help="Number of topics the embeddings are drawn around")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Hits per query")
+    parser.add_argument("--oversample", type=int, default=4, help="Candidates re-ranked per requested hit")
+    parser.add_argument("--pq-subspaces", type=int, default=32, help="Product quantization subspaces")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    main(parser.parse_args())
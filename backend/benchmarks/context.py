@@ -0,0 +1,102 @@
+"""
+Context assembly benchmark, reporting the prompt tokens sent to the LLM per chat and the chat latency with and
+without the assembly of the retrieved nodes, with an LLM whose latency grows with the prompt.
+
+Run from the backend directory:
+    $ python -m benchmarks.context --items 500 --latency-per-prompt-token 0.0002
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import make_hubspot_items, make_notion_items
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from config import settings
+from metrics import percentile
+
+QUESTIONS = [
+    "Who are my contacts at Acme?",
+    "Show the contact John Smith",
+    "List my HubSpot contacts at Globex",
+    "Which company does Maria Garcia work for?",
+    "Compare the contacts at Acme and Initech",
+    "Summarize my Notion pages about the roadmap",
+]
+
+# (run, context assembly enabled, candidate top k)
+RUNS = [
+    ("raw", False, None),
+    ("assembled", True, None),
+    ("raw top 8", False, 8),
+    ("assembled top 8", True, 8),
+]
+
+
+async def run(args: argparse.Namespace, name: str, enabled: bool, candidate_top_k) -> dict:
+    settings.CONTEXT_ASSEMBLY_ENABLED = enabled
+    settings.CONTEXT_CANDIDATE_TOP_K = candidate_top_k
+    if candidate_top_k and not enabled:
+        settings.RAG_SIMILARITY_TOP_K = candidate_top_k
+
+    # Imported after the settings are patched, so that the engine picks them up
+    from rag import RAGEngine
+
+    engine = RAGEngine(
+        llm=FakeLLM(latency=args.llm_latency, latency_per_prompt_token=args.latency_per_prompt_token),
+        embed_model=FakeEmbedding(),
+    )
+    for integration_type, make_items in [("Hubspot", make_hubspot_items), ("Notion", make_notion_items)]:
+        await engine.add_integration_items("benchmark", "benchmark", make_items(args.items), integration_type)
+
+    latencies, prompt_tokens = [], []
+    for repeat in range(args.repeats):
+        for index, question in enumerate(QUESTIONS):
+            engine.llm.prompt_tokens = 0
+            started_at = time.perf_counter()
+            await engine.chat("benchmark", "benchmark", f"{name}_{repeat}_{index}", question)
+            latencies.append(time.perf_counter() - started_at)
+            prompt_tokens.append(engine.llm.prompt_tokens)
+
+    settings.RAG_SIMILARITY_TOP_K = args.top_k
+    return {
+        "run": name,
+        "prompt_tokens": sum(prompt_tokens) / len(prompt_tokens),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+    }
+
+
+async def main(args: argparse.Namespace):
+    settings.RAG_STORAGE_PATH = tempfile.mkdtemp(prefix="rag_context_")
+    settings.SEMANTIC_CACHE_ENABLED = False
+    settings.RAG_SIMILARITY_TOP_K = args.top_k
+
+    # Index loading and agent logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = [await run(args, name, enabled, candidate_top_k) for name, enabled, candidate_top_k in RUNS]
+
+    table = Table(title=f"Context assembly over {2 * args.items} items, top {args.top_k}")
+    for column in ["run", "prompt_tokens", "p50_ms", "p95_ms"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.1f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500, help="Items per integration in the index")
+    parser.add_argument("--top-k", type=int, default=settings.RAG_SIMILARITY_TOP_K, help="Nodes retrieved per query")
+    parser.add_argument("--repeats", type=int, default=2, help="Times every question is asked")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per LLM round trip")
+    parser.add_argument(
+        "--latency-per-prompt-token", type=float, default=0.0002, help="Seconds per prompt token of an LLM call"
+    )
+    asyncio.run(main(parser.parse_args()))
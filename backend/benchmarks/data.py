@@ -0,0 +1,89 @@
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+from schemas import IntegrationItem
+
+FIRST_NAMES = ["John", "Maria", "Wei", "Aisha", "Carlos", "Olga", "Ravi", "Emma", "Kenji", "Fatima"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Khan", "Silva", "Ivanova", "Patel", "Brown", "Sato", "Ali"]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark", "Wayne", "Wonka", "Cyberdyne", "Tyrell"]
+NOTION_TOPICS = ["Roadmap", "Onboarding", "Meeting Notes", "Sprint Plan", "Design Doc", "Retro", "Budget", "OKRs"]
+
+
+def make_hubspot_items(count: int, seed: int = 0) -> List[IntegrationItem]:
+    """HubSpot contacts of companies, shaped like HubspotService items"""
+
+    rng = random.Random(seed)
+    created = datetime(2024, 1, 1)
+    items = []
+    for index in range(count):
+        company_index = rng.randrange(len(COMPANIES))
+        items.append(
+            IntegrationItem(
+                id=str(10_000 + index),
+                type="hubspot_contacts_of_companies",
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                parent_id=str(500 + company_index),
+                parent_path_or_name=COMPANIES[company_index],
+                creation_time=created + timedelta(days=index),
+                last_modified_time=created + timedelta(days=index + 1),
+                visibility=True,
+            )
+        )
+
+    return items
+
+
+def make_airtable_items(count: int, seed: int = 0) -> List[IntegrationItem]:
+    """Airtable bases with their tables, shaped like AirtableService items"""
+
+    rng = random.Random(seed)
+    items = []
+    base_id = None
+    for index in range(count):
+        if base_id is None or rng.random() < 0.2:
+            base_id = f"app{index:08d}"
+            base_name = f"{rng.choice(COMPANIES)} {rng.choice(NOTION_TOPICS)}"
+            items.append(IntegrationItem(id=f"{base_id}_Base", name=base_name, type="Base"))
+            continue
+
+        items.append(
+            IntegrationItem(
+                id=f"tbl{index:08d}_Table",
+                name=f"{rng.choice(NOTION_TOPICS)} Table {index}",
+                type="Table",
+                parent_id=f"{base_id}_Base",
+                parent_path_or_name=base_name,
+            )
+        )
+
+    return items
+
+
+def make_notion_items(count: int, seed: int = 0) -> List[IntegrationItem]:
+    """Notion pages and databases, shaped like NotionService items"""
+
+    rng = random.Random(seed)
+    created = datetime(2024, 1, 1)
+    items = []
+    for index in range(count):
+        object_type = "database" if rng.random() < 0.1 else "page"
+        parent_id = items[rng.randrange(len(items))].id if items and rng.random() < 0.7 else None
+        items.append(
+            IntegrationItem(
+                id=f"{index:08d}-0000-0000-0000-{seed:012d}",
+                type=object_type,
+                name=f"{object_type} {rng.choice(COMPANIES)} {rng.choice(NOTION_TOPICS)} {index}",
+                parent_id=parent_id,
+                creation_time=created + timedelta(hours=index),
+                last_modified_time=created + timedelta(hours=index + 1),
+            )
+        )
+
+    return items
+
+
+def items_to_json(items: List[IntegrationItem]) -> str:
+    """Serialize the items the same way the integration services do before adding them to the RAG engine"""
+
+    return "\n".join([item.model_dump_json(indent=4) for item in items])
@@ -0,0 +1,204 @@
+"""
+End-to-end benchmark of the FastAPI app, driving /integrations/*/load and /chat at increasing concurrency with local
+stand-ins for OpenAI, the provider APIs and Redis. Reports throughput, p50/p95/p99 latency and peak RSS.
+
+Results can be saved as a baseline, later runs compared against it flag the regressions and exit with status 1.
+
+Run from the backend directory:
+    $ python -m benchmarks.e2e --save-baseline baseline.json
+    $ python -m benchmarks.e2e --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from benchmarks.providers import INTEGRATIONS, FakeRedisRepository, ProviderAPI
+from config import settings
+from metrics import percentile
+
+QUESTIONS = [
+    "Who are my contacts at Acme?",
+    "Show the contact John Smith",
+    "Which Notion pages are about the Roadmap?",
+    "List the tables of my Airtable bases",
+    "Compare the contacts at Acme and Initech",
+    "Summarize my Budget pages and explain why they changed",
+]
+
+# Compared against the baseline, relative change above the tolerance is a regression
+COMPARED_METRICS = {"throughput_rps": "higher", "p95_ms": "lower", "p99_ms": "lower"}
+
+
+def peak_rss_mb() -> float:
+    # Kilobytes on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+
+
+async def settle():
+    """Wait for the background tasks, e.g. RAG ingestion scheduled by the load endpoints"""
+
+    current_task = asyncio.current_task()
+    while tasks := [task for task in asyncio.all_tasks() if task is not current_task and not task.done()]:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, concurrency: int, args: argparse.Namespace) -> dict:
+    rng = random.Random(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def request(index: int):
+        nonlocal errors
+        user_id, org_id = f"user_{index % args.users}", f"org_{index % args.users % args.orgs}"
+        form = {"user_id": user_id, "org_id": org_id}
+        if scenario == "chat":
+            url = "/chat"
+            form.update(chat_session_id=f"session_{index}", message=rng.choice(QUESTIONS))
+        else:
+            url = f"/integrations/{scenario.removeprefix('load_')}/load"
+
+        async with semaphore:
+            started_at = time.perf_counter()
+            response = await client.post(url, data=form)
+            latencies.append(time.perf_counter() - started_at)
+        if response.status_code != 200:
+            errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[request(index) for index in range(args.requests)])
+    elapsed = time.perf_counter() - started_at
+    await settle()
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """Regressions of the results against the baseline, as readable lines"""
+
+    baseline_results = {(result["scenario"], result["concurrency"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        expected = baseline_results.get((result["scenario"], result["concurrency"]))
+        if expected is None:
+            continue
+
+        for metric, better in COMPARED_METRICS.items():
+            if not expected[metric]:
+                continue
+            change = (result[metric] - expected[metric]) / expected[metric]
+            if (better == "higher" and change < -tolerance) or (better == "lower" and change > tolerance):
+                regressions.append(
+                    f"{result['scenario']} at concurrency {result['concurrency']}: {metric} "
+                    f"{expected[metric]:.2f} -> {result[metric]:.2f} ({change:+.0%})"
+                )
+
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    from fakeredis import FakeServer
+
+    settings.RAG_STORAGE_PATH = tempfile.mkdtemp(prefix="rag_benchmark_")
+
+    # Imported after the settings are patched, so that the app picks them up
+    from dependencies import get_rag_engine, get_redis_client
+    from main import create_server
+    from rag import RAGEngine
+
+    # Request and index loading logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = RAGEngine(llm=FakeLLM(latency=args.llm_latency), embed_model=FakeEmbedding(latency=args.embed_latency))
+    redis_server = FakeServer()
+    provider_api = ProviderAPI(items=args.items, latency=args.provider_latency)
+
+    async def get_fake_redis_client():
+        redis_repository = FakeRedisRepository(redis_server)
+        try:
+            yield redis_repository
+        finally:
+            await redis_repository.close()
+
+    app = create_server()
+    app.dependency_overrides[get_redis_client] = get_fake_redis_client
+    app.dependency_overrides[get_rag_engine] = lambda: engine
+
+    redis_repository = FakeRedisRepository(redis_server)
+    for index in range(args.users):
+        await provider_api.seed_credentials(redis_repository, f"user_{index}", f"org_{index % args.orgs}")
+
+    scenarios = [f"load_{integration}" for integration in INTEGRATIONS] + ["chat"]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        with provider_api.patch():
+            for scenario in scenarios:
+                for concurrency in args.concurrency:
+                    # The integration services pretty print every item they load
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        results.append(await run_scenario(client, scenario, concurrency, args))
+
+    table = Table(title=f"End-to-end, {args.users} users in {args.orgs} orgs, {args.items} items per integration")
+    for column in results[0]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.2f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            Console().print(f"[red]Regression[/red] {regression}")
+        if regressions:
+            return 1
+        Console().print(f"[green]No regression against {args.baseline}[/green]")
+
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent requests")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per scenario and concurrency")
+    parser.add_argument("--users", type=int, default=8, help="Number of users the requests are spread over")
+    parser.add_argument("--orgs", type=int, default=2, help="Number of orgs the users belong to")
+    parser.add_argument("--items", type=int, default=30, help="Items per integration in every user workspace")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per LLM round trip")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding round trip")
+    parser.add_argument("--provider-latency", type=float, default=0.01, help="Seconds per provider API request")
+    parser.add_argument("--save-baseline", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare the results against the baseline at this path")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change tolerated against the baseline")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, List, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    CustomLLM,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.utils import get_tokenizer
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding model, hashing the words of the text into a fixed size vector.
+
+    Texts sharing words get similar vectors, which is enough for retrieval to behave sensibly.
+    Every call sleeps for `latency` seconds to stand in for the API round trip.
+    """
+
+    model_name: str = "fake-embedding"
+    dimensions: int = 256
+    latency: float = 0.0
+    calls: int = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0 if digest[4] % 2 else -1.0
+
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def _around_trip(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._round_trip()
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        await self._around_trip()
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._round_trip()
+        return self._embed(text)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        await self._around_trip()
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # A batch is a single round trip, same as the OpenAI embeddings API
+        self._round_trip()
+        return [self._embed(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await self._around_trip()
+        return [self._embed(text) for text in texts]
+
+
+class FakeLLM(CustomLLM):
+    """
+    Deterministic LLM following the ReAct protocol.
+
+    It calls the first tool once with the question and answers with the observation, any other
+    prompt is answered by echoing the tail of the prompt.
+    Every call sleeps for `latency` seconds to stand in for the API round trip, plus `latency_per_prompt_token`
+    seconds per token of the prompt to stand in for its processing, and counts the tokens in `prompt_tokens`.
+    """
+
+    latency: float = 0.0
+    latency_per_prompt_token: float = 0.0
+    calls: int = 0
+    prompt_tokens: int = 0
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=16000, num_output=512, model_name="fake-llm", is_chat_model=True)
+
+    def _delay(self, messages: Sequence[ChatMessage]) -> float:
+        """Seconds the call takes, counting the tokens of the prompt"""
+
+        prompt_tokens = sum(len(get_tokenizer()(message.content or "")) for message in messages)
+        self.prompt_tokens += prompt_tokens
+        return self.latency + self.latency_per_prompt_token * prompt_tokens
+
+    def _reply(self, messages: Sequence[ChatMessage]) -> str:
+        self.calls += 1
+
+        system_prompt = messages[0].content if messages and messages[0].role == MessageRole.SYSTEM else ""
+        last_message = messages[-1].content or ""
+        if "Action Input:" not in (system_prompt or ""):
+            return f"Answer based on: {last_message[-200:]}"
+
+        if last_message.startswith("Observation:"):
+            observation = last_message.removeprefix("Observation:").strip()
+            return f"Thought: I can answer without using any more tools.\nAnswer: {observation[:200]}"
+
+        tool_name = re.search(r"> Tool Name: (\S+)", system_prompt)
+        return (
+            "Thought: I need to use a tool to help me answer the question.\n"
+            f"Action: {tool_name.group(1) if tool_name else 'query_engine_tool'}\n"
+            f"Action Input: {json.dumps({'input': last_message})}"
+        )
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        delay = self._delay(messages)
+        if delay:
+            time.sleep(delay)
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=self._reply(messages)))
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        delay = self._delay(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=self._reply(messages)))
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        delay = self._delay([ChatMessage(role=MessageRole.USER, content=prompt)])
+        if delay:
+            time.sleep(delay)
+        return CompletionResponse(text=self._reply([ChatMessage(role=MessageRole.USER, content=prompt)]))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        delay = self._delay([ChatMessage(role=MessageRole.USER, content=prompt)])
+        if delay:
+            await asyncio.sleep(delay)
+        return CompletionResponse(text=self._reply([ChatMessage(role=MessageRole.USER, content=prompt)]))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        response = self.complete(prompt, formatted=formatted, **kwargs)
+
+        def gen():
+            yield CompletionResponse(text=response.text, delta=response.text)
+
+        return gen()
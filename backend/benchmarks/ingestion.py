@@ -0,0 +1,97 @@
+"""
+Ingestion throughput benchmark, chunking and embedding synthetic documents through the ingestion stages with an
+increasing number of worker processes, and again from the stage cache.
+
+Run from the backend directory:
+    $ python -m benchmarks.ingestion --documents 2000 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from llama_index.core import Document
+from llama_index.core import Settings as LlamaIndexSettings
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import COMPANIES, FIRST_NAMES, NOTION_TOPICS
+from benchmarks.fakes import FakeEmbedding
+from rag.ingestion import IngestionStages
+
+WORDS = FIRST_NAMES + COMPANIES + [word for topic in NOTION_TOPICS for word in topic.split()]
+
+
+def make_documents(count: int, sentences: int, seed: int = 0) -> List[Document]:
+    """Documents of `sentences` random sentences, long enough to be split into several chunks"""
+
+    rng = random.Random(seed)
+    return [
+        Document(
+            text=" ".join(f"{' '.join(rng.choices(WORDS, k=12))}." for _ in range(sentences)), doc_id=f"doc_{index}"
+        )
+        for index in range(count)
+    ]
+
+
+async def time_stages(stages: IngestionStages, documents: List[Document]) -> dict:
+    started_at = time.perf_counter()
+    nodes = await stages.parse(documents)
+    parse_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    await stages.embed(nodes)
+    embed_seconds = time.perf_counter() - started_at
+
+    return {
+        "nodes": len(nodes),
+        "parse_s": parse_seconds,
+        "embed_s": embed_seconds,
+        "documents_per_s": len(documents) / (parse_seconds + embed_seconds),
+    }
+
+
+async def main(args: argparse.Namespace):
+    # Pickling the node parser for the worker processes logs a warning per private attribute
+    logging.getLogger().setLevel(logging.ERROR)
+
+    documents = make_documents(args.documents, args.sentences)
+    embed_model = FakeEmbedding(latency=args.embed_latency)
+
+    results = []
+    for workers in args.workers:
+        stages = IngestionStages(
+            embed_model=embed_model,
+            transformations=LlamaIndexSettings.transformations,
+            workers=workers,
+            parallel_min_documents=0,
+        )
+        results.append({"run": f"workers={stages.workers}", **await time_stages(stages, documents)})
+
+    cache_path = os.path.join(tempfile.mkdtemp(prefix="ingestion_cache_"), "cache.json")
+    stages = IngestionStages(
+        embed_model=embed_model, transformations=LlamaIndexSettings.transformations, workers=1, cache_path=cache_path
+    )
+    results.append({"run": "cache miss", **await time_stages(stages, documents)})
+    results.append({"run": "cache hit", **await time_stages(stages, documents)})
+
+    table = Table(title=f"Ingestion of {args.documents} documents on {os.cpu_count()} cores")
+    for column in results[0]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.2f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000, help="Documents to ingest")
+    parser.add_argument("--sentences", type=int, default=200, help="Sentences per document")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker process counts")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per embedding round trip")
+    asyncio.run(main(parser.parse_args()))
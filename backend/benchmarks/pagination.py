@@ -0,0 +1,70 @@
+"""
+Pagination benchmark, comparing the size and serialization time of a full items response against the pages of a
+server-side result set, as the workspace grows.
+
+Run from the backend directory:
+    $ python -m benchmarks.pagination --items 1000 10000 50000 --page-size 100
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Union
+
+from fakeredis import FakeServer
+from pydantic import TypeAdapter
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import make_notion_items
+from benchmarks.providers import FakeRedisRepository
+from schemas import IntegrationItem, IntegrationItemPage
+from services.integrations.pagination import ItemResultSets
+
+ResponseAdapter = TypeAdapter(Union[List[IntegrationItem], IntegrationItemPage])
+
+
+def serialize(response) -> bytes:
+    """Response body, validated and serialized as the routes do"""
+
+    return ResponseAdapter.dump_json(ResponseAdapter.validate_python(response))
+
+
+async def main(args: argparse.Namespace):
+    result_sets = ItemResultSets(FakeRedisRepository(FakeServer()), max_page_size=args.page_size)
+
+    table = Table(title=f"Items responses, pages of {args.page_size} items")
+    for column in ["items", "full_mb", "full_ms", "create_ms", "page_kb", "next_page_ms"]:
+        table.add_column(column)
+    for count in args.items:
+        items = make_notion_items(count)
+
+        started_at = time.perf_counter()
+        full_body = serialize(items)
+        full_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        page = await result_sets.create("benchmark", items, page_size=args.page_size, sort="-last_modified_time")
+        create_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        page = await result_sets.next_page("benchmark", page.next_cursor)
+        page_body = serialize(page)
+        page_seconds = time.perf_counter() - started_at
+
+        table.add_row(
+            str(count),
+            f"{len(full_body) / 2**20:.2f}",
+            f"{full_seconds * 1000:.1f}",
+            f"{create_seconds * 1000:.1f}",
+            f"{len(page_body) / 2**10:.1f}",
+            f"{page_seconds * 1000:.2f}",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[1000, 10000, 50000], help="Items of the workspace")
+    parser.add_argument("--page-size", type=int, default=100, help="Items per page")
+    asyncio.run(main(parser.parse_args()))
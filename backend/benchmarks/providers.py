@@ -0,0 +1,315 @@
+"""
+Local stand-ins for the HubSpot, Notion and Airtable APIs and for Redis, used to drive the FastAPI app offline.
+
+Every access token gets its own deterministic workspace, generated from `benchmarks.data`.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+import httpx
+from hubspot.crm.companies.exceptions import (
+    NotFoundException as CompaniesNotFoundException,
+)
+from hubspot.crm.contacts.exceptions import (
+    NotFoundException as ContactsNotFoundException,
+)
+
+from benchmarks.data import make_airtable_items, make_hubspot_items, make_notion_items
+from config import settings
+from repositories import RedisRepository
+from schemas import IntegrationItem
+
+INTEGRATIONS = ["hubspot", "notion", "airtable"]
+
+# Bases per page of the Airtable bases listing, like the real API
+AIRTABLE_PAGE_SIZE = 100
+
+
+class FakeRedisRepository(RedisRepository):
+    """RedisRepository backed by an in-process fakeredis server"""
+
+    def __init__(self, server):
+        from fakeredis import FakeAsyncRedis
+
+        self.redis_client = FakeAsyncRedis(server=server)
+
+
+class ProviderAPI:
+    """
+    Serves the provider API responses the integration services read, after `latency` seconds per request.
+
+    `items` is the number of integration items in the workspace of every access token.
+    """
+
+    def __init__(self, items: int = 100, latency: float = 0.05):
+        self.items = items
+        self.latency = latency
+        self.requests = 0
+
+    @lru_cache(maxsize=None)
+    def workspace(self, access_token: str) -> Dict[str, List[IntegrationItem]]:
+        seed = zlib.crc32(access_token.encode("utf-8"))
+        return {
+            "hubspot": make_hubspot_items(self.items, seed=seed),
+            "notion": make_notion_items(self.items, seed=seed),
+            "airtable": make_airtable_items(self.items, seed=seed),
+        }
+
+    @staticmethod
+    def _access_token(request: httpx.Request) -> str:
+        return request.headers.get("Authorization", "").removeprefix("Bearer ")
+
+    @staticmethod
+    def _notion_object(item: IntegrationItem) -> dict:
+        return {
+            "object": item.type,
+            "id": item.id,
+            "created_time": item.creation_time.isoformat(),
+            "last_edited_time": item.last_modified_time.isoformat(),
+            "parent": (
+                {"type": "page_id", "page_id": item.parent_id}
+                if item.parent_id
+                else {"type": "workspace", "workspace": True}
+            ),
+            "properties": {"title": {"title": [{"text": {"content": item.name.split(" ", 1)[1]}}]}},
+        }
+
+    def _notion_search(self, request: httpx.Request) -> dict:
+        results = [self._notion_object(item) for item in self.workspace(self._access_token(request))["notion"]]
+        return {"object": "list", "results": results, "has_more": False}
+
+    def _notion_retrieve(self, request: httpx.Request, object_type: str, object_id: str) -> httpx.Response:
+        for item in self.workspace(self._access_token(request))["notion"]:
+            if item.id == object_id and item.type == object_type:
+                return httpx.Response(200, json=self._notion_object(item))
+
+        return httpx.Response(404, json={"object": "error", "status": 404, "code": "object_not_found"})
+
+    def _airtable_bases(self, request: httpx.Request) -> dict:
+        bases = [
+            {"id": item.id.removesuffix("_Base"), "name": item.name}
+            for item in self.workspace(self._access_token(request))["airtable"]
+            if item.type == "Base"
+        ]
+
+        offset = int(request.url.params.get("offset", 0))
+        response = {"bases": bases[offset : offset + AIRTABLE_PAGE_SIZE]}
+        if offset + AIRTABLE_PAGE_SIZE < len(bases):
+            response["offset"] = str(offset + AIRTABLE_PAGE_SIZE)
+        return response
+
+    def _airtable_tables(self, request: httpx.Request, base_id: str) -> dict:
+        tables = [
+            {"id": item.id.removesuffix("_Table"), "name": item.name}
+            for item in self.workspace(self._access_token(request))["airtable"]
+            if item.parent_id == f"{base_id}_Base"
+        ]
+        return {"tables": tables}
+
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        url = str(request.url.copy_with(query=None))
+
+        if request.method == "POST" and url == f"{settings.NOTION_API_URL}/search":
+            return httpx.Response(200, json=self._notion_search(request))
+        for object_type in ("page", "database"):
+            if request.method == "GET" and url.startswith(f"{settings.NOTION_API_URL}/{object_type}s/"):
+                object_id = url.removeprefix(f"{settings.NOTION_API_URL}/{object_type}s/")
+                return self._notion_retrieve(request, object_type, object_id)
+        if request.method == "GET" and url.startswith(f"{settings.HUBSPOT_API_URL}/oauth/v1/access-tokens/"):
+            access_token = url.removeprefix(f"{settings.HUBSPOT_API_URL}/oauth/v1/access-tokens/")
+            return httpx.Response(200, json={"hub_id": self.hubspot_portal_id(access_token), "token": access_token})
+        if request.method == "GET" and url == f"{settings.AIRTABLE_API_URL}/meta/bases":
+            return httpx.Response(200, json=self._airtable_bases(request))
+        if request.method == "GET" and url.startswith(f"{settings.AIRTABLE_API_URL}/meta/bases/"):
+            base_id = url.removeprefix(f"{settings.AIRTABLE_API_URL}/meta/bases/").removesuffix("/tables")
+            return httpx.Response(200, json=self._airtable_tables(request, base_id))
+
+        return httpx.Response(404, json={"error": f"No mock for {request.method} {url}"})
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(request)
+
+    async def ahandle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(request)
+
+    @staticmethod
+    def hubspot_portal_id(access_token: str) -> int:
+        return zlib.crc32(access_token.encode("utf-8"))
+
+    @staticmethod
+    def notion_workspace_id(access_token: str) -> str:
+        return f"workspace_{zlib.crc32(access_token.encode('utf-8'))}"
+
+    def update_item(self, integration: str, access_token: str, item_id: str, **changes) -> IntegrationItem:
+        """Change an item of a workspace, as a user editing it in the integration would"""
+
+        items = self.workspace(access_token)[integration]
+        for position, item in enumerate(items):
+            if item.id == item_id:
+                items[position] = item.model_copy(update=changes)
+                return items[position]
+
+        raise KeyError(item_id)
+
+    def delete_item(self, integration: str, access_token: str, item_id: str):
+        items = self.workspace(access_token)[integration]
+        items[:] = [item for item in items if item.id != item_id]
+
+    @staticmethod
+    def hubspot_webhook_request(events: List[dict], path: str = "/integrations/hubspot/webhooks") -> Tuple[bytes, dict]:
+        """Body and headers of a webhook request signed like HubSpot does, with the client secret"""
+
+        body = json.dumps(events).encode("utf-8")
+        timestamp = str(int(time.time() * 1000))
+        message = f"POST{settings.BACKEND_URL}{path}".encode() + body + timestamp.encode()
+        signature = base64.b64encode(
+            hmac.new(settings.HUBSPOT_CLIENT_SECRET.encode(), message, hashlib.sha256).digest()
+        ).decode()
+        return body, {
+            "Content-Type": "application/json",
+            "X-HubSpot-Signature-v3": signature,
+            "X-HubSpot-Request-Timestamp": timestamp,
+        }
+
+    @staticmethod
+    def notion_webhook_request(event: dict) -> Tuple[bytes, dict]:
+        """Body and headers of a webhook request signed like Notion does, with the verification token"""
+
+        body = json.dumps(event).encode("utf-8")
+        signature = hmac.new(settings.NOTION_WEBHOOK_VERIFICATION_TOKEN.encode(), body, hashlib.sha256).hexdigest()
+        return body, {"Content-Type": "application/json", "X-Notion-Signature": f"sha256={signature}"}
+
+    def hubspot_client(self, access_token: str) -> "FakeHubSpot":
+        return FakeHubSpot(self, access_token)
+
+    @contextmanager
+    def patch(self) -> Iterator["ProviderAPI"]:
+        """
+        Route the provider requests of the integration services to this API.
+        Clients created with an explicit transport, like the one driving the app, are left alone.
+        """
+
+        api = self
+
+        class Client(httpx.Client):
+            def __init__(self, *args, **kwargs):
+                kwargs.setdefault("transport", httpx.MockTransport(api.handle))
+                super().__init__(*args, **kwargs)
+
+        class AsyncClient(httpx.AsyncClient):
+            def __init__(self, *args, **kwargs):
+                kwargs.setdefault("transport", httpx.MockTransport(api.ahandle))
+                super().__init__(*args, **kwargs)
+
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch("httpx.Client", Client))
+            stack.enter_context(mock.patch("httpx.AsyncClient", AsyncClient))
+            stack.enter_context(mock.patch("hubspot.HubSpot", api.hubspot_client))
+            yield self
+
+    async def seed_credentials(self, redis_repository: RedisRepository, user_id: str, org_id: str):
+        """Store credentials for every integration, as if the user went through the OAuth flows"""
+
+        for integration in INTEGRATIONS:
+            access_token = f"{integration}_{org_id}_{user_id}"
+            credentials = {"access_token": access_token, "token_type": "bearer"}
+            if integration == "notion":
+                credentials["workspace_id"] = self.notion_workspace_id(access_token)
+            await redis_repository.add(f"{integration}_credentials:{org_id}:{user_id}", json.dumps(credentials))
+
+
+class _Model:
+    """Object returned by the HubSpot SDK"""
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return self._data
+
+
+class FakeHubSpot:
+    """
+    The parts of the HubSpot SDK client used by HubspotService.
+    Like the SDK, the calls are blocking.
+    """
+
+    def __init__(self, api: ProviderAPI, access_token: str):
+        self._api = api
+        self._items = api.workspace(access_token)["hubspot"]
+        self._contacts = {item.id: item for item in self._items}
+
+        self.crm = mock.Mock()
+        self.crm.companies.get_all = self._get_all_companies
+        self.crm.companies.basic_api.get_by_id = self._get_company
+        self.crm.contacts.basic_api.get_by_id = self._get_contact
+
+    def _round_trip(self):
+        self._api.requests += 1
+        if self._api.latency:
+            time.sleep(self._api.latency)
+
+    def _get_all_companies(self, associations: List[str]) -> List[_Model]:
+        self._round_trip()
+
+        companies: Dict[str, dict] = {}
+        for item in self._items:
+            company = companies.setdefault(
+                item.parent_id,
+                {
+                    "id": item.parent_id,
+                    "properties": {"name": item.parent_path_or_name},
+                    "associations": {"contacts": {"results": []}},
+                },
+            )
+            company["associations"]["contacts"]["results"].append({"id": item.id, "type": "company_to_contact"})
+
+        return [_Model(company) for company in companies.values()]
+
+    def _get_company(self, company_id: str, associations: Optional[List[str]] = None) -> _Model:
+        self._round_trip()
+
+        contacts = [item for item in self._items if item.parent_id == company_id]
+        if not contacts:
+            raise CompaniesNotFoundException(status=404, reason="Not Found")
+
+        company = {"id": company_id, "properties": {"name": contacts[0].parent_path_or_name}, "archived": False}
+        if associations and "contacts" in associations:
+            company["associations"] = {
+                "contacts": {"results": [{"id": item.id, "type": "company_to_contact"} for item in contacts]}
+            }
+        return _Model(company)
+
+    def _get_contact(self, contact_id: str, associations: Optional[List[str]] = None) -> _Model:
+        self._round_trip()
+
+        item = self._contacts.get(contact_id)
+        if item is None:
+            raise ContactsNotFoundException(status=404, reason="Not Found")
+
+        first_name, last_name = item.name.split(" ", 1)
+        contact = {
+            "id": item.id,
+            "properties": {"firstname": first_name, "lastname": last_name},
+            "created_at": item.creation_time,
+            "updated_at": item.last_modified_time,
+            "archived": False,
+        }
+        if associations and "companies" in associations:
+            contact["associations"] = {"companies": {"results": [{"id": item.parent_id, "type": "contact_to_company"}]}}
+        return _Model(contact)
@@ -0,0 +1,104 @@
+"""
+Index residency benchmark, loading tenant indexes from every tier: hot (in memory), warm (persisted directory) and
+cold (compressed archive). Reports p50/p95 load latency per tier and the archive size against the directory size.
+
+Run from the backend directory:
+    $ python -m benchmarks.residency --tenants 10 --items 500
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import zlib
+from typing import List
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import make_hubspot_items, make_notion_items
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from config import settings
+from metrics import percentile
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, file_name))
+        for directory, _, file_names in os.walk(path)
+        for file_name in file_names
+    )
+
+
+async def time_loads(engine, tenants: List[str], prepare) -> List[float]:
+    """Load latencies of the tenant indexes, `prepare` moves the index of a tenant to the measured tier"""
+
+    latencies = []
+    for user_id in tenants:
+        prepare(engine.storage_path(user_id, "org_0"))
+        started_at = time.perf_counter()
+        await engine.load_tenant_index(user_id, "org_0")
+        latencies.append(time.perf_counter() - started_at)
+
+    return latencies
+
+
+async def main(args: argparse.Namespace):
+    settings.RAG_STORAGE_PATH = tempfile.mkdtemp(prefix="rag_residency_")
+    settings.RAG_INDEX_SCOPE = "user"
+    settings.SEMANTIC_CACHE_ENABLED = False
+    # Archiving is driven by the benchmark, not by the background sweep
+    settings.INDEX_SWEEP_INTERVAL = 10**9
+
+    # Imported after the settings are patched, so that the engine picks them up
+    from rag import RAGEngine
+    from rag.residency import ARCHIVE_SUFFIX, IndexResidency
+
+    # Index loading logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = RAGEngine(llm=FakeLLM(), embed_model=FakeEmbedding())
+    tenants = [f"user_{index}" for index in range(args.tenants)]
+    for user_id in tenants:
+        seed = zlib.crc32(user_id.encode("utf-8"))
+        await engine.add_integration_items(user_id, "org_0", make_hubspot_items(args.items, seed=seed), "Hubspot")
+        await engine.add_integration_items(user_id, "org_0", make_notion_items(args.items, seed=seed), "Notion")
+
+    def to_warm(storage_path: str):
+        engine.index_residency.evict(storage_path)
+
+    def to_cold(storage_path: str):
+        engine.index_residency.evict(storage_path)
+        IndexResidency.archive(storage_path)
+
+    warm_bytes = sum(directory_bytes(engine.storage_path(user_id, "org_0")) for user_id in tenants)
+    latencies = {
+        "warm": await time_loads(engine, tenants, to_warm),
+        "hot": await time_loads(engine, tenants, lambda storage_path: None),
+        "cold": await time_loads(engine, tenants, to_cold),
+    }
+    for user_id in tenants:
+        to_cold(engine.storage_path(user_id, "org_0"))
+    cold_bytes = sum(os.path.getsize(engine.storage_path(user_id, "org_0") + ARCHIVE_SUFFIX) for user_id in tenants)
+
+    table = Table(title=f"Index residency, {args.tenants} tenants of {2 * args.items} items")
+    for column in ["tier", "p50_ms", "p95_ms", "disk_mb"]:
+        table.add_column(column)
+    for tier in ["hot", "warm", "cold"]:
+        disk_mb = {"hot": "-", "warm": f"{warm_bytes / 2**20:.2f}", "cold": f"{cold_bytes / 2**20:.2f}"}[tier]
+        table.add_row(
+            tier,
+            f"{percentile(latencies[tier], 0.50) * 1000:.3f}",
+            f"{percentile(latencies[tier], 0.95) * 1000:.3f}",
+            disk_mb,
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=10, help="Tenant indexes to load")
+    parser.add_argument("--items", type=int, default=200, help="Items per integration in every tenant index")
+    asyncio.run(main(parser.parse_args()))
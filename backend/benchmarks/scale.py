@@ -0,0 +1,191 @@
+"""
+Multi-tenant scale simulator, growing the number of (org, user) tenants and reporting the storage footprint, file
+counts, index load times and process memory at every step.
+
+Tenants get a heavy tailed number of items per integration and of chat sessions, ingestion and chat run through
+RAGEngine with the local stand-ins for the LLM and embedding models.
+
+Run from the backend directory:
+    $ python -m benchmarks.scale --steps 10 50 100 --users-per-org 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import List
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import make_airtable_items, make_hubspot_items, make_notion_items
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from config import settings
+from metrics import percentile
+
+QUESTIONS = [
+    "Who are my contacts at Acme?",
+    "Which Notion pages are about the Roadmap?",
+    "List the tables of my Airtable bases",
+    "Show the contact John Smith",
+]
+
+ITEM_FACTORIES = {"Hubspot": make_hubspot_items, "Notion": make_notion_items, "Airtable": make_airtable_items}
+
+
+@dataclass
+class Tenant:
+    org_id: str
+    user_id: str
+    items: dict
+    sessions: int
+
+
+def make_tenants(start: int, count: int, args: argparse.Namespace) -> List[Tenant]:
+    """Tenants with log-normally distributed item volumes and geometrically distributed session counts"""
+
+    tenants = []
+    for index in range(start, start + count):
+        rng = random.Random(args.seed + index)
+        items = {
+            integration_type: int(min(args.max_items, rng.lognormvariate(args.median_items_log, 1.0)))
+            for integration_type in ITEM_FACTORIES
+            if rng.random() < 0.7
+        }
+        sessions = 0
+        while rng.random() < args.session_probability:
+            sessions += 1
+        tenants.append(
+            Tenant(org_id=f"org_{index // args.users_per_org}", user_id=f"user_{index}", items=items, sessions=sessions)
+        )
+
+    return tenants
+
+
+def current_rss_mb() -> float:
+    """Resident memory of the process, the peak where /proc is not available"""
+
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+
+
+def storage_footprint(path: str) -> dict:
+    """Bytes and number of files under the storage path, grouped by kind of file"""
+
+    total_bytes, files = 0, Counter()
+    for directory, _, file_names in os.walk(path):
+        for file_name in file_names:
+            total_bytes += os.path.getsize(os.path.join(directory, file_name))
+            files["chat_sessions" if file_name.startswith("chat_session_") else "index_files"] += 1
+
+    return {"disk_mb": total_bytes / 2**20, "index_files": files["index_files"], "chat_files": files["chat_sessions"]}
+
+
+async def simulate(engine, tenants: List[Tenant]) -> dict:
+    """Ingest the items of the tenants and run their chat sessions"""
+
+    nodes, started_at = 0, time.perf_counter()
+    for tenant in tenants:
+        for integration_type, count in tenant.items.items():
+            seed = zlib.crc32(f"{tenant.user_id}:{integration_type}".encode("utf-8"))
+            items = ITEM_FACTORIES[integration_type](count, seed=seed)
+            await engine.add_integration_items(tenant.user_id, tenant.org_id, items, integration_type)
+            nodes += count
+    ingestion_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    chats = 0
+    for tenant in tenants:
+        for session in range(tenant.sessions):
+            for question in QUESTIONS[: 1 + session % len(QUESTIONS)]:
+                await engine.chat(tenant.user_id, tenant.org_id, f"session_{session}", question)
+                chats += 1
+    chat_seconds = time.perf_counter() - started_at
+
+    return {"items": nodes, "ingestion_s": ingestion_seconds, "chats": chats, "chat_s": chat_seconds}
+
+
+async def measure_load_times(engine, tenants: List[Tenant], samples: int, seed: int) -> dict:
+    """Time loading the indexes of a sample of the tenants from disk"""
+
+    latencies = []
+    for tenant in random.Random(seed).sample(tenants, min(samples, len(tenants))):
+        started_at = time.perf_counter()
+        await engine.load_tenant_index(tenant.user_id, tenant.org_id)
+        latencies.append(time.perf_counter() - started_at)
+
+    return {"load_p50_ms": percentile(latencies, 0.50) * 1000, "load_p95_ms": percentile(latencies, 0.95) * 1000}
+
+
+async def main(args: argparse.Namespace):
+    settings.RAG_STORAGE_PATH = args.storage_path or tempfile.mkdtemp(prefix="rag_scale_")
+    settings.RAG_INDEX_SCOPE = args.index_scope
+    settings.SEMANTIC_CACHE_ENABLED = False
+
+    # Imported after the settings are patched, so that the engine picks them up
+    from rag import RAGEngine
+
+    # Index loading logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = RAGEngine(llm=FakeLLM(), embed_model=FakeEmbedding())
+    tenants: List[Tenant] = []
+    results = []
+    for step in sorted(args.steps):
+        new_tenants = make_tenants(len(tenants), step - len(tenants), args)
+        tenants.extend(new_tenants)
+
+        simulation = await simulate(engine, new_tenants)
+        results.append(
+            {
+                "tenants": len(tenants),
+                "orgs": len({tenant.org_id for tenant in tenants}),
+                **simulation,
+                **storage_footprint(settings.RAG_STORAGE_PATH),
+                **await measure_load_times(engine, tenants, args.load_samples, args.seed),
+                "rss_mb": current_rss_mb(),
+            }
+        )
+
+    table = Table(title=f"Scale simulation, RAG_INDEX_SCOPE={args.index_scope}, storage in {settings.RAG_STORAGE_PATH}")
+    for column in results[0]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(*[f"{value:.2f}" if isinstance(value, float) else str(value) for value in result.values()])
+    Console().print(table)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[5, 10, 20], help="Tenant counts to report at")
+    parser.add_argument("--users-per-org", type=int, default=5, help="Users of every org")
+    parser.add_argument("--index-scope", choices=["org", "user"], default=settings.RAG_INDEX_SCOPE)
+    parser.add_argument(
+        "--median-items-log", type=float, default=4.0, help="Log of the median items per integration, 4 is about 55"
+    )
+    parser.add_argument("--max-items", type=int, default=2000, help="Cap on the items per integration")
+    parser.add_argument(
+        "--session-probability", type=float, default=0.7, help="Chance of every additional chat session of a tenant"
+    )
+    parser.add_argument("--load-samples", type=int, default=10, help="Indexes loaded to time index loads per step")
+    parser.add_argument("--storage-path", help="RAG storage path to fill, a temporary directory by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""
+Snapshot benchmark, exporting a tenant index to an archive, importing it on a fresh storage root as a replica would,
+and comparing the index load time from the imported snapshot against the load from the original JSON files.
+
+Run from the backend directory:
+    $ python -m benchmarks.snapshots --items 2000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import List
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.data import make_airtable_items, make_hubspot_items, make_notion_items
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from config import settings
+from metrics import percentile
+
+USER_ID, ORG_ID = "user_0", "org_0"
+
+
+async def time_loads(engine, samples: int) -> List[float]:
+    """Load latencies of the tenant index from disk"""
+
+    latencies = []
+    for _ in range(samples):
+        engine.index_residency.evict(engine.storage_path(USER_ID, ORG_ID))
+        started_at = time.perf_counter()
+        await engine.load_tenant_index(USER_ID, ORG_ID)
+        latencies.append(time.perf_counter() - started_at)
+
+    return latencies
+
+
+async def main(args: argparse.Namespace):
+    source_root = tempfile.mkdtemp(prefix="rag_snapshot_source_")
+    replica_root = tempfile.mkdtemp(prefix="rag_snapshot_replica_")
+    settings.RAG_STORAGE_PATH = source_root
+    settings.SEMANTIC_CACHE_ENABLED = False
+    # Archiving is not measured here
+    settings.INDEX_SWEEP_INTERVAL = 10**9
+
+    # Imported after the settings are patched, so that the engine picks them up
+    from rag import RAGEngine
+
+    # Index loading logs would drown the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = RAGEngine(llm=FakeLLM(), embed_model=FakeEmbedding())
+    for integration_type, make_items in [
+        ("Hubspot", make_hubspot_items),
+        ("Notion", make_notion_items),
+        ("Airtable", make_airtable_items),
+    ]:
+        await engine.add_integration_items(USER_ID, ORG_ID, make_items(args.items), integration_type)
+    for session in range(args.sessions):
+        await engine.chat(USER_ID, ORG_ID, f"session_{session}", "Who are my contacts at Acme?")
+
+    json_latencies = await time_loads(engine, args.samples)
+
+    archive_path = os.path.join(tempfile.mkdtemp(prefix="rag_snapshot_"), "snapshot.tar.gz")
+    started_at = time.perf_counter()
+    await engine.export_snapshot(USER_ID, ORG_ID, archive_path)
+    export_seconds = time.perf_counter() - started_at
+
+    # A replica with its own storage root
+    settings.RAG_STORAGE_PATH = replica_root
+    replica = RAGEngine(llm=FakeLLM(), embed_model=FakeEmbedding())
+    started_at = time.perf_counter()
+    await replica.import_snapshot(USER_ID, ORG_ID, archive_path)
+    import_seconds = time.perf_counter() - started_at
+    snapshot_latencies = await time_loads(replica, args.samples)
+
+    json_p50 = percentile(json_latencies, 0.50)
+    snapshot_p50 = percentile(snapshot_latencies, 0.50)
+    table = Table(title=f"Snapshot of an index of {3 * args.items} items and {args.sessions} chat sessions")
+    for column in ["metric", "value"]:
+        table.add_column(column)
+    for metric, value in [
+        ("archive_mb", os.path.getsize(archive_path) / 2**20),
+        ("export_s", export_seconds),
+        ("import_s", import_seconds),
+        ("json_load_p50_ms", json_p50 * 1000),
+        ("json_load_p95_ms", percentile(json_latencies, 0.95) * 1000),
+        ("snapshot_load_p50_ms", snapshot_p50 * 1000),
+        ("snapshot_load_p95_ms", percentile(snapshot_latencies, 0.95) * 1000),
+        ("load_speedup", json_p50 / snapshot_p50),
+        ("import_and_load_speedup", json_p50 / (import_seconds + snapshot_p50)),
+    ]:
+        table.add_row(metric, f"{value:.2f}")
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000, help="Items per integration in the index")
+    parser.add_argument("--sessions", type=int, default=5, help="Chat sessions of the user")
+    parser.add_argument("--samples", type=int, default=5, help="Index loads timed per storage")
+    asyncio.run(main(parser.parse_args()))
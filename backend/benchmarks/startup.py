@@ -0,0 +1,172 @@
+"""
+Cold start benchmark of a worker, reporting the import time profile of the app, the time from spawning a uvicorn
+worker to its first healthy response, its baseline RSS, and the latency of its first request using the RAG engine
+with the engine imported lazily or preloaded (RAG_PRELOAD).
+
+The RSS is read from /proc, so it is only reported on Linux. The first RAG request fails without Redis, it is only
+timed up to the response.
+
+Run from the backend directory:
+    $ python -m benchmarks.startup --repeats 5
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+from rich.console import Console
+from rich.table import Table
+
+from metrics import percentile
+
+# (run, RAG_PRELOAD)
+RUNS = [
+    ("lazy", False),
+    ("preload", True),
+]
+
+
+def worker_env(preload: bool) -> dict:
+    # The benchmarks package sets placeholder integration credentials, the engine only needs a placeholder API key
+    # Without admission control the first load reaches the RAG engine dependency before it needs Redis
+    env = {**os.environ, "RAG_PRELOAD": str(preload).lower(), "ADMISSION_CONTROL_ENABLED": "false"}
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    return env
+
+
+def import_profile(top: int) -> List[dict]:
+    """Modules imported by `import main`, by cumulative import time, from `python -X importtime`"""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=worker_env(preload=False),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # e.g. "import time:       250 |     601645 |   fastapi", indented by import depth
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            }
+        )
+
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def cold_start(preload: bool, timeout: float) -> dict:
+    """Spawn a worker, wait for its first healthy response, then send it the first request using the RAG engine"""
+
+    port = free_port()
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=worker_env(preload),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                if time.perf_counter() - started_at > timeout:
+                    raise TimeoutError(f"The worker was not healthy after {timeout} seconds")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+
+            healthy_seconds = time.perf_counter() - started_at
+            healthy_rss_mb = rss_mb(process.pid)
+
+            request_started_at = time.perf_counter()
+            client.post(
+                "/integrations/airtable/load", data={"user_id": "benchmark", "org_id": "benchmark"}, timeout=timeout
+            )
+            first_rag_request_seconds = time.perf_counter() - request_started_at
+
+        return {
+            "healthy_seconds": healthy_seconds,
+            "healthy_rss_mb": healthy_rss_mb,
+            "first_rag_request_seconds": first_rag_request_seconds,
+            "rag_rss_mb": rss_mb(process.pid),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(args: argparse.Namespace):
+    console = Console()
+
+    table = Table(title="Import time of `import main`, by cumulative time")
+    for column in ["module", "self_ms", "cumulative_ms"]:
+        table.add_column(column)
+    for module in import_profile(args.top):
+        table.add_row(
+            "  " * module["depth"] + module["module"], f"{module['self_ms']:.1f}", f"{module['cumulative_ms']:.1f}"
+        )
+    console.print(table)
+
+    table = Table(title=f"Cold start of a worker, {args.repeats} starts per run")
+    for column in [
+        "run",
+        "p50_healthy_ms",
+        "p95_healthy_ms",
+        "healthy_rss_mb",
+        "p50_first_rag_request_ms",
+        "rag_rss_mb",
+    ]:
+        table.add_column(column)
+    for name, preload in RUNS:
+        starts = [cold_start(preload, args.timeout) for _ in range(args.repeats)]
+        rss = [start["healthy_rss_mb"] for start in starts if start["healthy_rss_mb"] is not None]
+        rag_rss = [start["rag_rss_mb"] for start in starts if start["rag_rss_mb"] is not None]
+        table.add_row(
+            name,
+            f"{percentile([start['healthy_seconds'] for start in starts], 0.50) * 1000:.0f}",
+            f"{percentile([start['healthy_seconds'] for start in starts], 0.95) * 1000:.0f}",
+            f"{percentile(rss, 0.50):.1f}" if rss else "n/a",
+            f"{percentile([start['first_rag_request_seconds'] for start in starts], 0.50) * 1000:.0f}",
+            f"{percentile(rag_rss, 0.50):.1f}" if rag_rss else "n/a",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3, help="Worker starts per run")
+    parser.add_argument("--top", type=int, default=25, help="Modules of the import time profile")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a worker")
+    main(parser.parse_args())
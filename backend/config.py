@@ -14,11 +14,62 @@ class Settings(BaseSettings):
     FRONTEND_URL: str = "http://localhost:3000"
     BACKEND_URL: str = "http://localhost:8000"
 
+    # Key expected in the X-Admin-Key header of the /admin routes, which are disabled if it is not set
+    ADMIN_API_KEY: Optional[str] = None
+
+    # Profiling of the requests sent with the X-Profile header and the admin key, and of a PROFILING_SAMPLE_RATE
+    # fraction of the others, sampling the stack every PROFILING_INTERVAL seconds. The profiles are kept in Redis for
+    # PROFILING_TTL seconds. Disabled requests do not go through the profiling middleware at all
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL: float = 0.005
+    PROFILING_TTL: int = 86400
+
+    # The RAG engine, with llama_index and the OpenAI clients, is imported by the first request using it, which takes
+    # seconds. Preloaded, it is imported before the worker serves requests instead, at the cost of a slower start
+    RAG_PRELOAD: bool = False
+
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
 
+    # Concurrent identical loads share one in-flight result, "memory" within a worker process, "redis" also across
+    # the workers sharing the Redis server, "none" runs every request
+    SINGLE_FLIGHT: str = "memory"
+    SINGLE_FLIGHT_LOCK_TTL: int = 120
+
+    # Loads given a page size materialize the items in Redis for ITEMS_RESULT_SET_TTL seconds, the following pages are
+    # read from there by cursor, at most ITEMS_MAX_PAGE_SIZE items per page
+    ITEMS_RESULT_SET_TTL: int = 900
+    ITEMS_MAX_PAGE_SIZE: int = 500
+
+    # Change events pushed by the HubSpot and Notion webhooks are coalesced for WEBHOOK_COALESCE_SECONDS per account
+    # before the changed objects are fetched and re-ingested, events signed more than WEBHOOK_SIGNATURE_MAX_AGE seconds
+    # ago are rejected
+    WEBHOOK_COALESCE_SECONDS: float = 5
+    WEBHOOK_SIGNATURE_MAX_AGE: int = 300
+
+    # Credentials of the integrations are cached in each worker for CREDENTIALS_CACHE_TTL seconds in front of Redis.
+    # Access tokens with a refresh token are refreshed CREDENTIALS_REFRESH_MARGIN seconds before they expire, in the
+    # background while the credentials were used in the last CREDENTIALS_REFRESH_IDLE seconds, otherwise by the next
+    # load. Credentials without a refresh token lifetime are kept in Redis for CREDENTIALS_TTL seconds
+    CREDENTIALS_CACHE_TTL: float = 60
+    CREDENTIALS_REFRESH_MARGIN: float = 300
+    CREDENTIALS_REFRESH_IDLE: float = 86400
+    CREDENTIALS_TTL: int = 90 * 86400
+
+    # Admission control of the chat and load requests, at most ADMISSION_USER_CONCURRENCY requests of a kind per user
+    # and ADMISSION_ORG_CONCURRENCY per org run at a time, up to ADMISSION_QUEUE_SIZE more per org wait for at most
+    # ADMISSION_MAX_WAIT seconds, the others are rejected with 429
+    # Slots are leased for ADMISSION_LEASE seconds, so that the slots of crashed workers are reclaimed
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_ORG_CONCURRENCY: int = 16
+    ADMISSION_USER_CONCURRENCY: int = 4
+    ADMISSION_QUEUE_SIZE: int = 32
+    ADMISSION_MAX_WAIT: float = 10
+    ADMISSION_LEASE: int = 300
+
     # Airtable Integration Credentials
     AIRTABLE_CLIENT_ID: str
     AIRTABLE_CLIENT_SECRET: str
@@ -47,6 +98,8 @@ class Settings(BaseSettings):
     NOTION_OAUTH_URL: str = f"{NOTION_API_URL}/oauth"
 
     NOTION_VERSION: str = "2022-06-28"
+    # Token Notion sends to the webhook endpoint when the subscription is created, it signs the events
+    NOTION_WEBHOOK_VERIFICATION_TOKEN: Optional[str] = None
 
     # RAG
     OPENAI_API_KEY: Optional[str] = None
@@ -54,7 +107,85 @@ class Settings(BaseSettings):
     OPENAI_CHAT_MODEL: str = "gpt-4o"
     CHAT_MEMORY_TOKEN_LIMIT: int = 5000
 
+    # Chat mode, one of "auto", "react", "context" or "condense_plus_context"
+    # "auto" sends simple lookups to CHAT_FAST_MODE and keeps "react" for multi-step questions
+    CHAT_MODE: str = "auto"
+    CHAT_FAST_MODE: str = "context"
+    CHAT_ROUTER_MAX_SIMPLE_WORDS: int = 20
+    # Answers generated at a time by the batch chat endpoint
+    CHAT_BATCH_CONCURRENCY: int = 8
+    CHAT_BATCH_MAX_MESSAGES: int = 100
+
     RAG_STORAGE_PATH: str = "./rag_storage"
+    # "user" keeps a separate index per user, "org" keeps one index per org shared by its users, with per-node access
+    # lists so that users only retrieve the items they loaded. The org indexes start empty, the users reload their
+    # integrations after switching
+    RAG_INDEX_SCOPE: str = "user"
+    RAG_SIMILARITY_TOP_K: int = 2
+
+    # Ingestion, batches of at least INGESTION_PARALLEL_MIN_DOCUMENTS documents are chunked in a pool of
+    # INGESTION_WORKERS processes, one per core by default
+    # The chunks and embeddings of a batch are cached at INGESTION_CACHE_PATH if set
+    INGESTION_WORKERS: Optional[int] = None
+    INGESTION_PARALLEL_MIN_DOCUMENTS: int = 500
+    INGESTION_CACHE_PATH: Optional[str] = None
+
+    # Embedding storage, "json" keeps the full embeddings as JSON floats, "float32", "int8" or "pq" (product
+    # quantization) store them compressed, truncated to EMBEDDING_DIMENSIONS if set (Matryoshka truncation)
+    # Compressed stores re-rank EMBEDDING_RERANK_OVERSAMPLE times the requested candidates with float16 embeddings
+    EMBEDDING_STORAGE: str = "json"
+    EMBEDDING_DIMENSIONS: Optional[int] = None
+    EMBEDDING_RERANK: bool = True
+    EMBEDDING_RERANK_OVERSAMPLE: int = 4
+    EMBEDDING_PQ_SUBSPACES: int = 16
+
+    # Approximate nearest neighbour search, "ivf" searches indexes of at least ANN_MIN_NODES embeddings through an
+    # inverted file index scanning the ANN_PROBES closest clusters, "none" always scores every embedding
+    ANN_INDEX: str = "ivf"
+    ANN_MIN_NODES: int = 50000
+    ANN_PROBES: int = 32
+
+    # Index residency, loaded indexes stay in memory for INDEX_CACHE_TTL seconds after their last access, least
+    # recently used first evicted once they hold more than INDEX_CACHE_MAX_NODES nodes
+    # Index directories idle for INDEX_ARCHIVE_AFTER seconds are compressed into an archive, checked every
+    # INDEX_SWEEP_INTERVAL seconds and restored on the next access
+    INDEX_CACHE_ENABLED: bool = True
+    INDEX_CACHE_TTL: Optional[int] = 900
+    INDEX_CACHE_MAX_NODES: Optional[int] = 200000
+    INDEX_ARCHIVE_AFTER: Optional[int] = 7 * 86400
+    INDEX_SWEEP_INTERVAL: int = 60
+
+    # Hybrid retrieval, fusing BM25 keyword hits with the vector hits by reciprocal rank fusion
+    # Queries of at most HYBRID_KEYWORD_ONLY_MAX_TERMS terms fully matched by a keyword hit skip the vector search
+    HYBRID_RETRIEVAL_ENABLED: bool = True
+    HYBRID_RRF_K: int = 60
+    HYBRID_KEYWORD_ONLY_MAX_TERMS: int = 3
+
+    # Context assembly of the retrieved nodes before they are sent to the LLM, see rag/context.py
+    # CONTEXT_CANDIDATE_TOP_K nodes are retrieved, RAG_SIMILARITY_TOP_K if unset, the ones scoring below
+    # CONTEXT_RELATIVE_CUTOFF times the best score are dropped, and at most RAG_SIMILARITY_TOP_K of the rest are packed
+    # within CONTEXT_TOKEN_BUDGET tokens
+    CONTEXT_ASSEMBLY_ENABLED: bool = True
+    CONTEXT_CANDIDATE_TOP_K: Optional[int] = 8
+    CONTEXT_RELATIVE_CUTOFF: float = 0.75
+    CONTEXT_MIN_NODES: int = 1
+    CONTEXT_TOKEN_BUDGET: int = 3000
+
+    # Token accounting of the LLM and embedding calls, aggregated in Redis per org and user over a USAGE_PERIOD, "day"
+    # or "month" (UTC). Chats of an org or user over its soft budget of tokens in the period are answered in
+    # CHAT_FAST_MODE only, over its hard budget they are rejected with 429 until the next period. No budget if unset
+    USAGE_ACCOUNTING_ENABLED: bool = True
+    USAGE_PERIOD: str = "month"
+    USAGE_ORG_SOFT_BUDGET: Optional[int] = None
+    USAGE_ORG_HARD_BUDGET: Optional[int] = None
+    USAGE_USER_SOFT_BUDGET: Optional[int] = None
+    USAGE_USER_HARD_BUDGET: Optional[int] = None
+
+    # Semantic answer cache, entries are matched by cosine similarity of the query embeddings
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 256
+    SEMANTIC_CACHE_TTL: Optional[int] = 3600
 
 
 settings = Settings()
@@ -1,11 +1,15 @@
 from fastapi import APIRouter
 
+from controllers.admin import router as admin_router
 from controllers.chat import router as chat_router
 from controllers.integrations import router as integrations_router
+from controllers.metrics import router as metrics_router
 
 router = APIRouter()
 router.include_router(integrations_router)
 router.include_router(chat_router)
+router.include_router(metrics_router)
+router.include_router(admin_router)
 
 
 @router.get("/", tags=["Home"])
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, UploadFile
+
+from dependencies import (
+    AdminDependency,
+    ProfileServiceDependency,
+    SnapshotServiceDependency,
+    UsageServiceDependency,
+)
+
+router = APIRouter(prefix="/admin", tags=["Admin Routes"], dependencies=[AdminDependency])
+
+
+@router.post("/snapshots/export")
+async def export_snapshot(
+    snapshot_service: SnapshotServiceDependency, user_id: str = Form(...), org_id: str = Form(...)
+):
+    return await snapshot_service.export_snapshot(user_id=user_id, org_id=org_id)
+
+
+@router.post("/snapshots/import")
+async def import_snapshot(
+    snapshot_service: SnapshotServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    archive: UploadFile = File(...),
+    # Load the index in memory right away, to warm up a replica
+    warm: bool = Form(False),
+):
+    return await snapshot_service.import_snapshot(user_id=user_id, org_id=org_id, archive=archive, warm=warm)
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_service: ProfileServiceDependency,
+    profile_id: str,
+    # Stacks in the collapsed format of the flame graph tools instead of the whole profile
+    collapsed: bool = False,
+):
+    return await profile_service.get_profile(profile_id=profile_id, collapsed=collapsed)
+
+
+@router.get("/usage/{org_id}")
+async def get_usage(
+    usage_service: UsageServiceDependency,
+    org_id: str,
+    # Usage of a user of the org as well
+    user_id: Optional[str] = None,
+):
+    return await usage_service.get_usage(org_id=org_id, user_id=user_id)
@@ -1,17 +1,66 @@
-from fastapi import APIRouter, Form
+from typing import List, Optional
 
-from dependencies import AIServiceDependency
-from schemas import ChatMessage
+from fastapi import APIRouter, Form, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from config import settings
+from dependencies import (
+    AIServiceDependency,
+    ChatAdmissionDependency,
+    ChatStreamAdmissionDependency,
+)
+from schemas import ChatMessage, ChatScope
 
 router = APIRouter(prefix="/chat", tags=["Chat Routes"])
 
 
-@router.post("", response_model=ChatMessage)
+@router.post("", response_model=ChatMessage, dependencies=[ChatAdmissionDependency])
 async def chat(
     ai_service: AIServiceDependency,
     user_id: str = Form(...),
     org_id: str = Form(...),
     chat_session_id: str = Form(...),
     message: str = Form(...),
+    # Optional scope filters, e.g. integration_type=Hubspot or parent_id of an Airtable base
+    integration_type: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+    item_type: Optional[str] = Form(None),
+):
+    scope = ChatScope(integration_type=integration_type, parent_id=parent_id, type=item_type)
+    return await ai_service.chat(
+        user_id=user_id, org_id=org_id, chat_session_id=chat_session_id, message=message, scope=scope
+    )
+
+
+@router.post("/batch")
+async def chat_batch(
+    ai_service: AIServiceDependency,
+    admission: ChatStreamAdmissionDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    # Independent questions, answered without chat history
+    messages: List[str] = Form(...),
+    integration_type: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+    item_type: Optional[str] = Form(None),
 ):
-    return await ai_service.chat(user_id=user_id, org_id=org_id, chat_session_id=chat_session_id, message=message)
+    try:
+        if len(messages) > settings.CHAT_BATCH_MAX_MESSAGES:
+            raise HTTPException(
+                status_code=400, detail=f"At most {settings.CHAT_BATCH_MAX_MESSAGES} messages are answered per batch."
+            )
+
+        scope = ChatScope(integration_type=integration_type, parent_id=parent_id, type=item_type)
+        results = await ai_service.chat_batch(user_id=user_id, org_id=org_id, messages=messages, scope=scope)
+    except BaseException:
+        await admission.aclose()
+        raise
+
+    # One BatchChatResult JSON per line, streamed as the answers complete, the admission slot is held until the last
+    # is sent. It is released by a background task rather than by the body, which a disconnect cancels or never starts
+    async def stream():
+        async for result in results:
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(admission.aclose))
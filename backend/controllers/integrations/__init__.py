@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from .airtable import router as airtable_router
+from .combined import router as combined_router
 from .hubspot import router as hubspot_router
 from .notion import router as notion_router
 
@@ -9,3 +10,4 @@ router = APIRouter(prefix="/integrations")
 router.include_router(airtable_router)
 router.include_router(hubspot_router)
 router.include_router(notion_router)
+router.include_router(combined_router)
@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Form, Request
 
-from dependencies import AirtableServiceDependency
-from schemas import IntegrationItem
+from dependencies import AirtableServiceDependency, LoadAdmissionDependency
+from schemas import IntegrationItem, IntegrationItemPage
 
 router = APIRouter(prefix="/airtable", tags=["Airtable Integration Routes"])
 
@@ -29,8 +29,34 @@ async def get_airtable_credentials_integration(
     return len(await airtable_service.get_credentials(user_id=user_id, org_id=org_id)) > 0
 
 
-@router.post("/load", response_model=List[IntegrationItem])
+@router.post(
+    "/load",
+    response_model=Union[List[IntegrationItem], IntegrationItemPage],
+    dependencies=[LoadAdmissionDependency],
+)
 async def get_airtable_items(
-    airtable_service: AirtableServiceDependency, user_id: str = Form(...), org_id: str = Form(...)
+    airtable_service: AirtableServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    # Without a page size all the items are returned at once
+    page_size: Optional[int] = Form(None),
+    sort: Optional[str] = Form(None),
+    item_type: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+):
+    if page_size is None:
+        return await airtable_service.load_items(user_id=user_id, org_id=org_id)
+
+    return await airtable_service.load_items_page(
+        user_id=user_id, org_id=org_id, page_size=page_size, sort=sort, item_type=item_type, parent_id=parent_id
+    )
+
+
+@router.post("/items", response_model=IntegrationItemPage)
+async def get_airtable_items_page(
+    airtable_service: AirtableServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    cursor: str = Form(...),
 ):
-    return await airtable_service.get_items(user_id=user_id, org_id=org_id)
+    return await airtable_service.get_items_page(user_id=user_id, org_id=org_id, cursor=cursor)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Form
+
+from dependencies import CombinedIntegrationServiceDependency, LoadAdmissionDependency
+from schemas import AllIntegrationsItems
+
+router = APIRouter(tags=["Integrations Routes"])
+
+
+# Every connected integration
+@router.post("/load", response_model=AllIntegrationsItems, dependencies=[LoadAdmissionDependency])
+async def load_all_integrations(
+    combined_integration_service: CombinedIntegrationServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+):
+    return await combined_integration_service.load_all_items(user_id=user_id, org_id=org_id)
@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Form, Request
 
-from dependencies import HubspotServiceDependency
-from schemas import IntegrationItem
+from dependencies import HubspotServiceDependency, LoadAdmissionDependency
+from schemas import IntegrationItem, IntegrationItemPage
 
 router = APIRouter(prefix="/hubspot", tags=["HubSpot Integration Routes"])
 
@@ -29,8 +29,54 @@ async def get_hubspot_credentials_integration(
     return len(await hubspot_service.get_credentials(user_id, org_id)) > 0
 
 
-@router.post("/load", response_model=List[IntegrationItem])
+@router.post(
+    "/load",
+    response_model=Union[List[IntegrationItem], IntegrationItemPage],
+    dependencies=[LoadAdmissionDependency],
+)
 async def load_slack_data_integration(
+    hubspot_service: HubspotServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    # Without a page size all the items are returned at once
+    page_size: Optional[int] = Form(None),
+    sort: Optional[str] = Form(None),
+    item_type: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+):
+    if page_size is None:
+        return await hubspot_service.load_items(user_id=user_id, org_id=org_id)
+
+    return await hubspot_service.load_items_page(
+        user_id=user_id, org_id=org_id, page_size=page_size, sort=sort, item_type=item_type, parent_id=parent_id
+    )
+
+
+@router.post("/items", response_model=IntegrationItemPage)
+async def get_hubspot_items_page(
+    hubspot_service: HubspotServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    cursor: str = Form(...),
+):
+    return await hubspot_service.get_items_page(user_id=user_id, org_id=org_id, cursor=cursor)
+
+
+# Webhooks, pushing the changes of the HubSpot account into the index of the subscribed users
+@router.post("/webhooks")
+async def receive_hubspot_webhook(request: Request, hubspot_service: HubspotServiceDependency):
+    return await hubspot_service.receive_webhook(request)
+
+
+@router.post("/webhooks/subscribe")
+async def subscribe_hubspot_webhooks(
+    hubspot_service: HubspotServiceDependency, user_id: str = Form(...), org_id: str = Form(...)
+):
+    return await hubspot_service.subscribe_webhooks(user_id=user_id, org_id=org_id)
+
+
+@router.post("/webhooks/unsubscribe")
+async def unsubscribe_hubspot_webhooks(
     hubspot_service: HubspotServiceDependency, user_id: str = Form(...), org_id: str = Form(...)
 ):
-    return await hubspot_service.get_items(user_id=user_id, org_id=org_id)
+    return await hubspot_service.unsubscribe_webhooks(user_id=user_id, org_id=org_id)
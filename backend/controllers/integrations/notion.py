@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Form, Request
 
-from dependencies import NotionServiceDependency
-from schemas import IntegrationItem
+from dependencies import LoadAdmissionDependency, NotionServiceDependency
+from schemas import IntegrationItem, IntegrationItemPage
 
 router = APIRouter(prefix="/notion", tags=["Notion Integration Routes"])
 
@@ -29,6 +29,51 @@ async def get_notion_credentials_integration(
     return len(await notion_service.get_credentials(user_id, org_id)) > 0
 
 
-@router.post("/load", response_model=List[IntegrationItem])
-async def get_notion_items(notion_service: NotionServiceDependency, user_id: str = Form(...), org_id: str = Form(...)):
-    return await notion_service.get_items(user_id=user_id, org_id=org_id)
+@router.post(
+    "/load",
+    response_model=Union[List[IntegrationItem], IntegrationItemPage],
+    dependencies=[LoadAdmissionDependency],
+)
+async def get_notion_items(
+    notion_service: NotionServiceDependency,
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    # Without a page size all the items are returned at once
+    page_size: Optional[int] = Form(None),
+    sort: Optional[str] = Form(None),
+    item_type: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+):
+    if page_size is None:
+        return await notion_service.load_items(user_id=user_id, org_id=org_id)
+
+    return await notion_service.load_items_page(
+        user_id=user_id, org_id=org_id, page_size=page_size, sort=sort, item_type=item_type, parent_id=parent_id
+    )
+
+
+@router.post("/items", response_model=IntegrationItemPage)
+async def get_notion_items_page(
+    notion_service: NotionServiceDependency, user_id: str = Form(...), org_id: str = Form(...), cursor: str = Form(...)
+):
+    return await notion_service.get_items_page(user_id=user_id, org_id=org_id, cursor=cursor)
+
+
+# Webhooks, pushing the changes of the Notion account into the index of the subscribed users
+@router.post("/webhooks")
+async def receive_notion_webhook(request: Request, notion_service: NotionServiceDependency):
+    return await notion_service.receive_webhook(request)
+
+
+@router.post("/webhooks/subscribe")
+async def subscribe_notion_webhooks(
+    notion_service: NotionServiceDependency, user_id: str = Form(...), org_id: str = Form(...)
+):
+    return await notion_service.subscribe_webhooks(user_id=user_id, org_id=org_id)
+
+
+@router.post("/webhooks/unsubscribe")
+async def unsubscribe_notion_webhooks(
+    notion_service: NotionServiceDependency, user_id: str = Form(...), org_id: str = Form(...)
+):
+    return await notion_service.unsubscribe_webhooks(user_id=user_id, org_id=org_id)
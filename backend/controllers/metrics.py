@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from metrics import metrics
+
+router = APIRouter(prefix="/metrics", tags=["Metrics Routes"])
+
+
+@router.get("")
+async def get_metrics():
+    return metrics.snapshot()
@@ -1,12 +1,28 @@
-from typing import Annotated, Optional
+import asyncio
+import importlib
+import secrets
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Annotated, Optional
 
 from dotenv import load_dotenv
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Form, Header, HTTPException
 
+from admission import admission_controller
 from config import settings
-from rag import RAGEngine
 from repositories import RedisRepository
-from services import AirtableService, AIService, HubspotService, NotionService
+from services import (
+    AirtableService,
+    AIService,
+    CombinedIntegrationService,
+    HubspotService,
+    NotionService,
+    ProfileService,
+    SnapshotService,
+    UsageService,
+)
+
+if TYPE_CHECKING:
+    from rag import RAGEngine
 
 load_dotenv()
 
@@ -23,20 +39,95 @@ async def get_redis_client():
 RedisRepositoryDependency = Annotated[RedisRepository, Depends(get_redis_client)]
 
 
-# RAG Dependency
-async def get_rag_engine():
+# Admission Control Dependencies, holding a slot of the user and org while the request runs
+async def admit_chat(redis_repository: RedisRepositoryDependency, user_id: str = Form(...), org_id: str = Form(...)):
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        yield
+        return
+
+    async with admission_controller(redis_repository).admit("chat", org_id=org_id, user_id=user_id):
+        yield
+
+
+ChatAdmissionDependency = Depends(admit_chat)
+
+
+# Streamed chats hold their slot until the body is sent, yield dependencies are torn down before a StreamingResponse
+# body runs. The slot is taken before the response, with a Redis connection of its own, and released when the
+# background task of the response closes the returned exit stack, which runs once the body is sent or the client
+# disconnected
+async def admit_chat_stream(user_id: str = Form(...), org_id: str = Form(...)) -> AsyncExitStack:
+    admission = AsyncExitStack()
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        return admission
+
+    redis_repository = RedisRepository(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+    admission.push_async_callback(redis_repository.close)
     try:
-        yield RAGEngine()
-    except Exception as e:
-        print(f"---------- Failed to initialize RAG engine. Please add OPENAI_API_KEY in .env file: {e} ----------")
-        yield None  # Return None if RAG engine is not initialized
+        await admission.enter_async_context(
+            admission_controller(redis_repository).admit("chat", org_id=org_id, user_id=user_id)
+        )
+    except BaseException:
+        await admission.aclose()
+        raise
+
+    return admission
+
+
+ChatStreamAdmissionDependency = Annotated[AsyncExitStack, Depends(admit_chat_stream)]
+
+
+async def admit_load(redis_repository: RedisRepositoryDependency, user_id: str = Form(...), org_id: str = Form(...)):
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        yield
+        return
+
+    async with admission_controller(redis_repository).admit("load", org_id=org_id, user_id=user_id):
+        yield
+
+
+LoadAdmissionDependency = Depends(admit_load)
+
+
+# RAG Dependency, shared by every request so that its caches outlive a single request
+rag_engine: Optional["RAGEngine"] = None
+
+
+async def get_rag_engine():
+    global rag_engine
+
+    if rag_engine is None:
+        # Imported by the first request using it, in a thread so that the other requests are served meanwhile
+        engine_module = await asyncio.to_thread(importlib.import_module, "rag.engine")
+
+    # Checked again, another request may have created it during the import
+    if rag_engine is None:
+        try:
+            rag_engine = engine_module.RAGEngine()
+        except Exception as e:
+            print(f"---------- Failed to initialize RAG engine. Please add OPENAI_API_KEY in .env file: {e} ----------")
 
+    yield rag_engine  # None if RAG engine is not initialized
 
-RAGEngineDependency = Annotated[Optional[RAGEngine], Depends(get_rag_engine)]
+
+RAGEngineDependency = Annotated[Optional["RAGEngine"], Depends(get_rag_engine)]
+
+
+# Usage Service Dependency
+async def get_usage_service(redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency):
+    # Without a RAG engine there is no usage recorded in the process, the usage in Redis is still readable
+    yield UsageService(
+        redis_repository=redis_repository, usage_handler=rag_engine.usage_handler if rag_engine is not None else None
+    )
+
+
+UsageServiceDependency = Annotated[UsageService, Depends(get_usage_service)]
 
 
 # Airtable Service Dependency
-async def get_airtable_service(redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency):
+async def get_airtable_service(
+    redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency, usage_service: UsageServiceDependency
+):
     try:
         yield AirtableService(
             redis_repository=redis_repository,
@@ -46,7 +137,11 @@ async def get_airtable_service(redis_repository: RedisRepositoryDependency, rag_
             redirect_uri=settings.AIRTABLE_REDIRECT_URI,
             scopes=settings.AIRTABLE_SCOPES,
             rag_engine=rag_engine,
+            usage_service=usage_service,
         )
+    # Errors of the route, e.g. an invalid cursor, keep their status
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get airtable integration service: {e}")
 
@@ -55,7 +150,9 @@ AirtableServiceDependency = Annotated[AirtableService, Depends(get_airtable_serv
 
 
 # Hubspot Service Dependency
-async def get_hubspot_service(redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency):
+async def get_hubspot_service(
+    redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency, usage_service: UsageServiceDependency
+):
     try:
         yield HubspotService(
             redis_repository=redis_repository,
@@ -65,7 +162,11 @@ async def get_hubspot_service(redis_repository: RedisRepositoryDependency, rag_e
             redirect_uri=settings.HUBSPOT_REDIRECT_URI,
             scopes=settings.HUBSPOT_SCOPES,
             rag_engine=rag_engine,
+            usage_service=usage_service,
         )
+    # Errors of the route, e.g. an invalid cursor, keep their status
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get hubspot integration service: {e}")
 
@@ -74,7 +175,9 @@ HubspotServiceDependency = Annotated[HubspotService, Depends(get_hubspot_service
 
 
 # Notion Service Dependency
-async def get_notion_service(redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency):
+async def get_notion_service(
+    redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency, usage_service: UsageServiceDependency
+):
     try:
         yield NotionService(
             redis_repository=redis_repository,
@@ -83,7 +186,11 @@ async def get_notion_service(redis_repository: RedisRepositoryDependency, rag_en
             client_secret=settings.NOTION_CLIENT_SECRET,
             redirect_uri=settings.NOTION_REDIRECT_URI,
             rag_engine=rag_engine,
+            usage_service=usage_service,
         )
+    # Errors of the route, e.g. an invalid cursor, keep their status
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get notion integration service: {e}")
 
@@ -91,13 +198,37 @@ async def get_notion_service(redis_repository: RedisRepositoryDependency, rag_en
 NotionServiceDependency = Annotated[NotionService, Depends(get_notion_service)]
 
 
+# Combined Integration Service Dependency, over every integration
+async def get_combined_integration_service(
+    airtable_service: AirtableServiceDependency,
+    hubspot_service: HubspotServiceDependency,
+    notion_service: NotionServiceDependency,
+    rag_engine: RAGEngineDependency,
+    usage_service: UsageServiceDependency,
+):
+    yield CombinedIntegrationService(
+        integration_services=[airtable_service, hubspot_service, notion_service],
+        rag_engine=rag_engine,
+        usage_service=usage_service,
+    )
+
+
+CombinedIntegrationServiceDependency = Annotated[CombinedIntegrationService, Depends(get_combined_integration_service)]
+
+
 # AI Service Dependency
-async def get_ai_service(rag_engine: RAGEngineDependency):
+async def get_ai_service(redis_repository: RedisRepositoryDependency, rag_engine: RAGEngineDependency):
     try:
         # Ensure that the RAG engine is initialized
         assert rag_engine is not None
 
-        yield AIService(rag_engine=rag_engine)
+        yield AIService(
+            rag_engine=rag_engine,
+            usage_service=UsageService(redis_repository=redis_repository, usage_handler=rag_engine.usage_handler),
+        )
+    # Errors of the route, e.g. a used up token budget, keep their status
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get ai service: {e}")
 
@@ -105,9 +236,48 @@ async def get_ai_service(rag_engine: RAGEngineDependency):
 AIServiceDependency = Annotated[AIService, Depends(get_ai_service)]
 
 
+# Profile Service Dependency
+async def get_profile_service(redis_repository: RedisRepositoryDependency):
+    yield ProfileService(redis_repository=redis_repository)
+
+
+ProfileServiceDependency = Annotated[ProfileService, Depends(get_profile_service)]
+
+
+# Snapshot Service Dependency
+async def get_snapshot_service(rag_engine: RAGEngineDependency):
+    # Checked before yielding, so that the errors of the routes keep their status code
+    if rag_engine is None:
+        raise HTTPException(status_code=500, detail="Failed to get snapshot service: RAG engine is not initialized")
+
+    yield SnapshotService(rag_engine=rag_engine)
+
+
+SnapshotServiceDependency = Annotated[SnapshotService, Depends(get_snapshot_service)]
+
+
+# Admin Dependency, guarding the admin routes
+async def verify_admin_key(x_admin_key: Annotated[Optional[str], Header()] = None):
+    if settings.ADMIN_API_KEY is None:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled, set ADMIN_API_KEY to enable them.")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key.")
+
+
+AdminDependency = Depends(verify_admin_key)
+
+
 __all__ = [
+    "AdminDependency",
     "AirtableServiceDependency",
+    "ChatAdmissionDependency",
+    "ChatStreamAdmissionDependency",
+    "CombinedIntegrationServiceDependency",
     "HubspotServiceDependency",
+    "LoadAdmissionDependency",
     "NotionServiceDependency",
+    "ProfileServiceDependency",
     "RedisRepositoryDependency",
+    "SnapshotServiceDependency",
+    "UsageServiceDependency",
 ]
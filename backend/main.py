@@ -1,11 +1,18 @@
+import importlib
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
 from controllers import router
+from profiling import ProfilingMiddleware
 
 
 def create_server():
+    # Imported before serving rather than by the first request using it, see RAG_PRELOAD
+    if settings.RAG_PRELOAD:
+        importlib.import_module("rag.engine")
+
     app = FastAPI()
     app.include_router(router)
 
@@ -20,6 +27,15 @@ def create_server():
         allow_headers=["*"],
     )
 
+    # Opt-in, so that requests are not wrapped when profiling is disabled
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(
+            ProfilingMiddleware,
+            sample_rate=settings.PROFILING_SAMPLE_RATE,
+            interval=settings.PROFILING_INTERVAL,
+            ttl=settings.PROFILING_TTL,
+        )
+
     return app
 
 
@@ -0,0 +1,103 @@
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_name(name: str, label_key: LabelKey) -> str:
+    if not label_key:
+        return name
+    labels = ",".join(f'{key}="{value}"' for key, value in label_key)
+    return f"{name}{{{labels}}}"
+
+
+def percentile(values: list, quantile: float) -> float:
+    """Nearest-rank percentile of the values, 0.0 if there are none"""
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(quantile * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters, gauges and summaries.
+
+    Summaries keep a bounded window of recent observations to report percentiles.
+    """
+
+    def __init__(self, summary_window: int = 1024):
+        self._lock = threading.Lock()
+        self._summary_window = summary_window
+        self._counters: Dict[Tuple[str, LabelKey], float] = defaultdict(float)
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._summaries: Dict[Tuple[str, LabelKey], Deque[float]] = {}
+        self._summary_totals: Dict[Tuple[str, LabelKey], Tuple[int, float]] = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        """Increment a counter"""
+
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to the given value"""
+
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record an observation in a summary"""
+
+        key = (name, _label_key(labels))
+        with self._lock:
+            window = self._summaries.setdefault(key, deque(maxlen=self._summary_window))
+            window.append(value)
+            count, total = self._summary_totals.get(key, (0, 0.0))
+            self._summary_totals[key] = (count + 1, total + value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Current value of a counter"""
+
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0.0)
+
+    def snapshot(self) -> dict:
+        """Snapshot of every metric, keyed by name with labels"""
+
+        with self._lock:
+            counters = {_format_name(name, labels): value for (name, labels), value in self._counters.items()}
+            gauges = {_format_name(name, labels): value for (name, labels), value in self._gauges.items()}
+            summaries = {}
+            for (name, labels), window in self._summaries.items():
+                count, total = self._summary_totals[(name, labels)]
+                values = list(window)
+                summaries[_format_name(name, labels)] = {
+                    "count": count,
+                    "sum": total,
+                    "p50": percentile(values, 0.50),
+                    "p95": percentile(values, 0.95),
+                    "p99": percentile(values, 0.99),
+                }
+
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+    def reset(self):
+        """Drop every recorded metric"""
+
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+            self._summary_totals.clear()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,256 @@
+import asyncio
+import contextvars
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from typing import List, Optional
+
+from config import settings
+from metrics import metrics
+from repositories import RedisRepository
+
+PROFILE_KEY_PREFIX = "profile"
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+MAX_STACK_DEPTH = 128
+
+# Profile of the request running in the current context, inherited by the tasks it creates
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "active_profile", default=None
+)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapsed_stack(frame) -> str:
+    """Stack of the frame from its root, in the collapsed format of the flame graph tools"""
+
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfile:
+    """
+    Sampling profile and task timeline of one request.
+
+    A thread samples the stack of the event loop thread every `interval` seconds, a sample is attributed to the
+    request when the coroutine of one of its tasks is on the stack. The tasks created while the request runs are
+    recorded with their start and end times.
+    """
+
+    def __init__(self, profile_id: str, request_id: Optional[str], method: str, path: str, interval: float):
+        self.profile_id = profile_id
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.root_task = asyncio.current_task()
+
+        self.stacks: Counter = Counter()
+        self.samples = {"request": 0, "other_requests": 0, "idle": 0}
+        self.tasks: List[dict] = []
+        self._task_refs: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet([self.root_task])
+        # The tasks are added on the loop while the sampler thread reads them
+        self._tasks_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{profile_id}", daemon=True)
+        self._loop_thread_id = threading.get_ident()
+        self.started_at = time.time()
+        self._started_at = time.perf_counter()
+        self.duration = 0.0
+
+    def add_task(self, task: asyncio.Task):
+        parent = asyncio.current_task()
+        entry = {
+            "name": task.get_name(),
+            "coroutine": getattr(task.get_coro(), "__qualname__", repr(task.get_coro())),
+            "parent": parent.get_name() if parent is not None else None,
+            "start": time.perf_counter() - self._started_at,
+            "end": None,
+        }
+        self.tasks.append(entry)
+        with self._tasks_lock:
+            self._task_refs.add(task)
+        task.add_done_callback(lambda _: entry.update(end=time.perf_counter() - self._started_at))
+
+    def _task_frames(self) -> set:
+        """Outermost frames of the running tasks of the request"""
+
+        with self._tasks_lock:
+            tasks = list(self._task_refs)
+        frames = {getattr(task.get_coro(), "cr_frame", None) for task in tasks}
+        frames.discard(None)
+        return frames
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._loop_thread_id)
+            # Every task runs a coroutine, a stack without one is the loop waiting for events or running callbacks
+            stack = []
+            while frame is not None:
+                stack.append(frame)
+                frame = frame.f_back
+            if not any(frame.f_code.co_flags & inspect.CO_COROUTINE for frame in stack):
+                self.samples["idle"] += 1
+            elif self._task_frames().intersection(stack):
+                self.samples["request"] += 1
+                self.stacks[_collapsed_stack(stack[0])] += 1
+            else:
+                self.samples["other_requests"] += 1
+
+    def start(self):
+        self._thread.start()
+
+    async def stop(self):
+        self.duration = time.perf_counter() - self._started_at
+        self._stopped.set()
+        # The sampler may be sleeping for an interval, it is waited for without blocking the loop
+        await asyncio.to_thread(self._thread.join)
+
+    def to_dict(self, top: int = 50) -> dict:
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+
+        return {
+            "profile_id": self.profile_id,
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration,
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "top_functions": [
+                {"function": function, "self": count, "total": total_counts[function]}
+                for function, count in self_counts.most_common(top)
+            ],
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.stacks.most_common()],
+            "tasks": self.tasks,
+        }
+
+
+class TaskRecorder:
+    """Task factory of the event loop recording the tasks created by profiled requests, installed while one runs"""
+
+    def __init__(self):
+        self.profiles = 0
+        self.previous_factory = None
+
+    def _factory(self, loop, coro, **kwargs):
+        if self.previous_factory is not None:
+            task = self.previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.add_task(task)
+        return task
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        if self.profiles == 0:
+            self.previous_factory = loop.get_task_factory()
+            loop.set_task_factory(self._factory)
+        self.profiles += 1
+
+    def uninstall(self, loop: asyncio.AbstractEventLoop):
+        self.profiles -= 1
+        if self.profiles == 0:
+            loop.set_task_factory(self.previous_factory)
+            self.previous_factory = None
+
+
+_task_recorder = TaskRecorder()
+
+
+def profile_key(profile_id: str) -> str:
+    return f"{PROFILE_KEY_PREFIX}:{profile_id}"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests sent with the `X-Profile` header and a valid `X-Admin-Key`, and a `sample_rate` fraction of
+    the other requests. The profile is stored in Redis under an id generated for it, prefixed with the `X-Request-ID`
+    header if given so that a client cannot overwrite another profile, which is returned in the `X-Profile-ID`
+    response header.
+    Only installed when PROFILING_ENABLED is set, so that unprofiled requests run without it.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, interval: float = 0.005, ttl: int = 86400):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.ttl = ttl
+
+    @staticmethod
+    def _requested(headers: dict) -> bool:
+        if headers.get(b"x-profile", b"").lower() not in (b"1", b"true"):
+            return False
+
+        admin_key = headers.get(b"x-admin-key", b"").decode("latin-1")
+        return settings.ADMIN_API_KEY is not None and secrets.compare_digest(admin_key, settings.ADMIN_API_KEY)
+
+    async def _store(self, profile: RequestProfile):
+        redis_repository = RedisRepository(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+        try:
+            await redis_repository.add(profile_key(profile.profile_id), json.dumps(profile.to_dict()), expire=self.ttl)
+        finally:
+            await redis_repository.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        requested = self._requested(headers)
+        if not requested and not (self.sample_rate and random.random() < self.sample_rate):
+            return await self.app(scope, receive, send)
+
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = None
+        profile_id = f"{request_id}-{uuid.uuid4().hex}" if request_id else uuid.uuid4().hex
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        loop = asyncio.get_running_loop()
+        profile = RequestProfile(profile_id, request_id, scope["method"], scope["path"], self.interval)
+        _task_recorder.install(loop)
+        token = _active_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            await profile.stop()
+            _active_profile.reset(token)
+            _task_recorder.uninstall(loop)
+
+            metrics.increment("profiles_total", trigger="header" if requested else "sampled")
+            metrics.observe("profile_duration_seconds", profile.duration)
+            try:
+                await self._store(profile)
+            except Exception:
+                # The response is sent already, a lost profile must not fail the request
+                logging.exception(f"Failed to store the profile {profile_id}")
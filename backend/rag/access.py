@@ -0,0 +1,91 @@
+import json
+import os
+from typing import Dict, Iterable, Set
+
+
+class AccessIndex:
+    """
+    Per-node access lists of a shared index.
+
+    Nodes are visible to the users they were granted to, and can be dropped once no user is left.
+    """
+
+    def __init__(self):
+        # node id -> users the node is visible to
+        self.node_users: Dict[str, Set[str]] = {}
+        # user id -> nodes visible to the user
+        self.user_nodes: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.node_users)
+
+    def grant(self, user_id: str, node_ids: Iterable[str]):
+        """Make the nodes visible to the user"""
+
+        visible_nodes = self.user_nodes.setdefault(user_id, set())
+        for node_id in node_ids:
+            self.node_users.setdefault(node_id, set()).add(user_id)
+            visible_nodes.add(node_id)
+
+    def revoke(self, user_id: str, node_ids: Iterable[str]) -> Set[str]:
+        """Hide the nodes from the user, returns the nodes no user has access to anymore"""
+
+        orphaned_node_ids = set()
+        visible_nodes = self.user_nodes.get(user_id, set())
+        for node_id in node_ids:
+            visible_nodes.discard(node_id)
+            users = self.node_users.get(node_id)
+            if users is None:
+                continue
+
+            users.discard(user_id)
+            if not users:
+                del self.node_users[node_id]
+                orphaned_node_ids.add(node_id)
+
+        if not visible_nodes:
+            self.user_nodes.pop(user_id, None)
+
+        return orphaned_node_ids
+
+    def remove(self, node_id: str):
+        """Remove the node from every access list"""
+
+        for user_id in self.node_users.pop(node_id, set()):
+            visible_nodes = self.user_nodes.get(user_id)
+            if visible_nodes is not None:
+                visible_nodes.discard(node_id)
+                if not visible_nodes:
+                    del self.user_nodes[user_id]
+
+    def users(self, node_id: str) -> Set[str]:
+        """Users the node is visible to"""
+
+        return self.node_users.get(node_id, set())
+
+    def nodes(self, user_id: str) -> Set[str]:
+        """Nodes visible to the user"""
+
+        return self.user_nodes.get(user_id, set())
+
+    def persist(self, persist_path: str):
+        """Save the access lists as JSON"""
+
+        os.makedirs(os.path.dirname(persist_path), exist_ok=True)
+        with open(persist_path, "w") as file:
+            json.dump({node_id: sorted(users) for node_id, users in self.node_users.items()}, file)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str) -> "AccessIndex":
+        """Load the access lists, or empty ones if they were never persisted"""
+
+        access_index = cls()
+        if not os.path.exists(persist_path):
+            return access_index
+
+        with open(persist_path) as file:
+            for node_id, users in json.load(file).items():
+                for user_id in users:
+                    access_index.grant(user_id, [node_id])
+
+        return access_index
@@ -0,0 +1,96 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from .quantization import normalize
+
+
+class IVFIndex:
+    """
+    Inverted file index for approximate nearest neighbour search over unit length vectors.
+
+    The vectors are clustered by spherical k-means, a query only scans the rows of the few clusters whose centroids
+    are the closest to it. Rows are positions in the vector store, new rows are assigned to the nearest
+    existing centroid.
+    """
+
+    def __init__(self, iterations: int = 10, seed: int = 0):
+        self.iterations = iterations
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        # row -> cluster of the row
+        self.assignments = np.zeros(0, dtype=np.int32)
+        # Number of rows the centroids were trained on
+        self.trained_count = 0
+
+        # Rows sorted by cluster and the offsets of the clusters, rebuilt after rows are added
+        self._sorted_rows: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return (vectors @ self.centroids.T).argmax(axis=1).astype(np.int32)
+
+    def train(self, sample: np.ndarray, count: int):
+        """
+        Cluster a sample of the vectors in about sqrt(`count`) lists, `count` being the number of vectors sampled from
+        Every row is dropped, they are added back with `add`
+        """
+
+        rng = np.random.default_rng(self.seed)
+        lists = max(1, min(int(np.sqrt(count)), len(sample)))
+
+        centroids = np.array(sample[rng.choice(len(sample), lists, replace=False)], dtype=np.float32)
+        for _ in range(self.iterations):
+            assignments = (sample @ centroids.T).argmax(axis=1)
+            members = np.zeros((lists, len(sample)), dtype=np.float32)
+            members[assignments, np.arange(len(sample))] = 1.0
+            # Empty clusters keep their previous centroid
+            counts = np.bincount(assignments, minlength=lists)
+            centroids = np.where(counts[:, None] > 0, normalize(members @ sample), centroids)
+
+        self.centroids = centroids
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_count = count
+        self._sorted_rows = None
+
+    def add(self, vectors: np.ndarray):
+        """Append rows for the vectors"""
+
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._sorted_rows = None
+
+    def compact(self, rows: np.ndarray):
+        """Keep only the given rows, renumbered in their order"""
+
+        self.assignments = self.assignments[rows]
+        self._sorted_rows = None
+
+    def search(self, query: np.ndarray, probes: int) -> np.ndarray:
+        """Rows of the `probes` clusters closest to the query"""
+
+        if self._sorted_rows is None:
+            self._sorted_rows = np.argsort(self.assignments, kind="stable")
+            self._offsets = np.searchsorted(self.assignments[self._sorted_rows], np.arange(len(self.centroids) + 1))
+
+        probes = min(probes, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return np.concatenate(
+            [self._sorted_rows[self._offsets[cluster] : self._offsets[cluster + 1]] for cluster in clusters]
+        )
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {
+            "centroids": self.centroids,
+            "assignments": self.assignments,
+            "trained_count": np.array(self.trained_count),
+        }
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.centroids = state["centroids"]
+        self.assignments = state["assignments"]
+        self.trained_count = int(state["trained_count"])
+        self._sorted_rows = None
@@ -0,0 +1,128 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CacheKey = Tuple[str, ...]
+
+
+@dataclass
+class SemanticCacheEntry:
+    query: str
+    embedding: np.ndarray
+    response: str
+    latency: float
+    created_at: float
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by query embedding similarity, partitioned per index.
+
+    Every partition carries a generation number which is bumped on invalidation, so answers
+    computed while the index was being changed are never stored.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 256, ttl: Optional[int] = None):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: Dict[CacheKey, List[SemanticCacheEntry]] = {}
+        self._matrices: Dict[CacheKey, np.ndarray] = {}
+        self._generations: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def generation(self, org_id: str, user_id: str) -> int:
+        """Current generation of the (org, user) partition"""
+
+        with self._lock:
+            return self._generations.setdefault((org_id, user_id), 0)
+
+    def lookup(self, key: CacheKey, embedding: List[float]) -> Optional[Tuple[SemanticCacheEntry, float]]:
+        """Return the most similar live entry and its similarity if it clears the threshold"""
+
+        query = self._normalize(embedding)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+
+            if self.ttl is not None:
+                now = time.time()
+                live_entries = [entry for entry in entries if now - entry.created_at < self.ttl]
+                if len(live_entries) != len(entries):
+                    self._set_entries(key, live_entries)
+                    entries = live_entries
+                if not entries:
+                    return None
+
+            matrix = self._matrices.get(key)
+            if matrix is None:
+                matrix = self._matrices[key] = np.stack([entry.embedding for entry in entries])
+
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+        if similarity < self.similarity_threshold:
+            return None
+
+        return entries[best], similarity
+
+    def put(
+        self,
+        key: CacheKey,
+        org_id: str,
+        user_id: str,
+        generation: int,
+        query: str,
+        embedding: List[float],
+        response: str,
+        latency: float,
+    ):
+        """Store an answer unless the partition was invalidated after `generation` was read"""
+
+        entry = SemanticCacheEntry(
+            query=query,
+            embedding=self._normalize(embedding),
+            response=response,
+            latency=latency,
+            created_at=time.time(),
+        )
+        with self._lock:
+            if self._generations.get((org_id, user_id), 0) != generation:
+                return
+
+            entries = [*self._entries.get(key, []), entry][-self.max_entries :]
+            self._set_entries(key, entries)
+
+    def invalidate(self, org_id: str, user_id: Optional[str] = None):
+        """Drop every entry of the user, or of the whole org if no user is given"""
+
+        with self._lock:
+            if user_id is None:
+                for generation_key in self._generations:
+                    if generation_key[0] == org_id:
+                        self._generations[generation_key] += 1
+            else:
+                self._generations[(org_id, user_id)] = self._generations.get((org_id, user_id), 0) + 1
+
+            for key in list(self._entries):
+                if key[0] == org_id and user_id in (None, key[1]):
+                    self._set_entries(key, [])
+
+    def _set_entries(self, key: CacheKey, entries: List[SemanticCacheEntry]):
+        self._matrices.pop(key, None)
+        if entries:
+            self._entries[key] = entries
+        else:
+            self._entries.pop(key, None)
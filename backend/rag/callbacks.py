@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.callbacks.token_counting import get_llm_token_counts
+from llama_index.core.utilities.token_counting import TokenCounter
+from llama_index.core.utils import get_tokenizer
+
+from metrics import metrics
+
+from .usage import current_usage_tenant
+
+
+class UsageHandler(BaseCallbackHandler):
+    """
+    Callback handler accounting the tokens and latency of the LLM and embedding calls.
+
+    The usage is recorded in the metrics, and aggregated per tenant of the usage scope the call was made in until it
+    is drained, e.g. to be written to Redis. The tokens are read from the response usage when the provider returns it,
+    and counted with the tokenizer otherwise.
+    """
+
+    def __init__(self, tokenizer: Optional[Callable[[str], List]] = None):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self._tokenizer = tokenizer
+        self._token_counter: Optional[TokenCounter] = None
+
+        self._lock = threading.Lock()
+        self._started_at: Dict[str, float] = {}
+        self._pending: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        # Created on the first call, loading the tokenizer is slow
+        if self._token_counter is None:
+            self._token_counter = TokenCounter(tokenizer=self._tokenizer or get_tokenizer())
+        return self._token_counter
+
+    def start_trace(self, trace_id: Optional[str] = None):
+        return
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[Dict[str, List[str]]] = None):
+        return
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        if event_type in (CBEventType.LLM, CBEventType.EMBEDDING):
+            self._started_at[event_id] = time.perf_counter()
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ):
+        if event_type not in (CBEventType.LLM, CBEventType.EMBEDDING):
+            return
+
+        started_at = self._started_at.pop(event_id, None)
+        seconds = time.perf_counter() - started_at if started_at is not None else 0.0
+        if event_type == CBEventType.LLM:
+            counts = get_llm_token_counts(self.token_counter, payload or {}, event_id)
+            usage = {
+                "llm_calls": 1,
+                "llm_prompt_tokens": counts.prompt_token_count,
+                "llm_completion_tokens": counts.completion_token_count,
+                "llm_seconds": seconds,
+            }
+            metrics.increment("llm_tokens_total", counts.prompt_token_count, kind="prompt")
+            metrics.increment("llm_tokens_total", counts.completion_token_count, kind="completion")
+            metrics.observe("llm_call_seconds", seconds)
+        else:
+            tokens = sum(
+                self.token_counter.get_string_tokens(chunk) for chunk in (payload or {}).get(EventPayload.CHUNKS, [])
+            )
+            usage = {"embedding_calls": 1, "embedding_tokens": tokens, "embedding_seconds": seconds}
+            metrics.increment("embedding_tokens_total", tokens)
+            metrics.observe("embedding_call_seconds", seconds)
+
+        tenant = current_usage_tenant()
+        if tenant is None:
+            metrics.increment("usage_unattributed_calls_total", kind=event_type.value)
+            return
+
+        with self._lock:
+            self._pending[tenant].update(usage)
+
+    def drain(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """Usage per (org id, user id) recorded since the last drain"""
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+        return {tenant: dict(usage) for tenant, usage in pending.items()}
+
+    def restore(self, usage_by_tenant: Dict[Tuple[str, str], Dict[str, float]]):
+        """Put back drained usage which could not be written, so that the next drain returns it"""
+
+        with self._lock:
+            for tenant, usage in usage_by_tenant.items():
+                self._pending[tenant].update(usage)
+
+
+# Shared by the RAG engines of the process, registered once on the global callback manager
+usage_handler = UsageHandler()
@@ -0,0 +1,174 @@
+import json
+import re
+import time
+from typing import Any, Callable, List, Optional
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from metrics import metrics
+
+# Null and empty fields of an item JSON, in chunks of an item which are not valid JSON on their own
+EMPTY_FIELD_PATTERN = re.compile(r'"[^"\n]+":\s*(?:null|""|\[\]|\{\})\s*,?\s*')
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Shortest overlap between consecutive chunks of a document worth trimming, and longest one searched for
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 2000
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def compact_text(text: str) -> str:
+    """Item JSON without its null and empty fields nor indentation"""
+
+    try:
+        item = json.loads(text)
+    except ValueError:
+        return WHITESPACE_PATTERN.sub(" ", EMPTY_FIELD_PATTERN.sub("", text)).strip()
+
+    if isinstance(item, dict):
+        item = {key: value for key, value in item.items() if not _is_empty(value)}
+    return json.dumps(item, separators=(",", ":"), ensure_ascii=False)
+
+
+def _overlap(previous_text: str, text: str) -> int:
+    """Length of the longest suffix of `previous_text` which `text` starts with"""
+
+    for length in range(min(len(previous_text), len(text), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if previous_text.endswith(text[:length]):
+            return length
+    return 0
+
+
+class ContextAssembler(BaseNodePostprocessor):
+    """
+    Assembles the retrieved nodes into the smallest context worth sending to the LLM.
+
+    - cutoff: nodes scoring below `relative_cutoff` times the best score are dropped, keeping at least `min_nodes`
+    - compaction: item JSONs lose their null and empty fields and their indentation
+    - deduplication: identical nodes are dropped, and the overlap of chunks of the same document is trimmed
+    - packing: at most `max_nodes` nodes are added in score order until `token_budget` tokens, the first one is
+      truncated to fit
+    The nodes are copies, the ones in the docstore are left as they were.
+    """
+
+    token_budget: int = Field(default=3000, description="Tokens of context sent to the LLM at most")
+    relative_cutoff: float = Field(default=0.0, description="Fraction of the best score a node must reach")
+    min_nodes: int = Field(default=1, description="Nodes kept whatever their score")
+    max_nodes: Optional[int] = Field(default=None, description="Nodes sent to the LLM at most")
+
+    _tokenizer: Callable[[str], List] = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._tokenizer = get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextAssembler"
+
+    def _count_tokens(self, node: TextNode) -> int:
+        return len(self._tokenizer(node.get_content(metadata_mode=MetadataMode.LLM)))
+
+    def _cutoff(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        nodes = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+        best_score = nodes[0].score if nodes else None
+        if not self.relative_cutoff or not best_score or best_score <= 0:
+            return nodes
+
+        return [
+            node
+            for position, node in enumerate(nodes)
+            if position < self.min_nodes or (node.score or 0.0) >= self.relative_cutoff * best_score
+        ]
+
+    def _compact_and_deduplicate(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        assembled = []
+        seen_texts = set()
+        last_text_by_doc_id = {}
+        for node_with_score in nodes:
+            node = node_with_score.node
+            if not isinstance(node, TextNode):
+                assembled.append(node_with_score)
+                continue
+
+            text = compact_text(node.text)
+            if node.ref_doc_id in last_text_by_doc_id:
+                previous_text = last_text_by_doc_id[node.ref_doc_id]
+                # A chunk within the previous one adds nothing, otherwise only its part after the overlap is new
+                text = "" if text in previous_text else text[_overlap(previous_text, text) :]
+            if not text or text in seen_texts:
+                metrics.increment("rag_context_nodes_dropped_total", reason="duplicate")
+                continue
+
+            seen_texts.add(text)
+            last_text_by_doc_id[node.ref_doc_id] = text
+            assembled.append(NodeWithScore(node=node.model_copy(update={"text": text}), score=node_with_score.score))
+
+        return assembled
+
+    def _truncate(self, node: TextNode, token_budget: int) -> Optional[TextNode]:
+        """Copy of the node with the longest start of its text fitting in `token_budget` tokens with its metadata"""
+
+        if self._count_tokens(node.model_copy(update={"text": ""})) > token_budget:
+            return None
+
+        # Longest prefix by bisection, the token count grows with the prefix
+        low, high = 0, len(node.text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._count_tokens(node.model_copy(update={"text": node.text[:middle]})) <= token_budget:
+                low = middle
+            else:
+                high = middle - 1
+
+        return node.model_copy(update={"text": node.text[:low]}) if low else None
+
+    def _pack(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        packed = []
+        tokens = 0
+        for position, node_with_score in enumerate(nodes):
+            if self.max_nodes is not None and len(packed) >= self.max_nodes:
+                metrics.increment("rag_context_nodes_dropped_total", reason="max_nodes")
+                continue
+
+            node_tokens = self._count_tokens(node_with_score.node)
+            if tokens + node_tokens <= self.token_budget:
+                packed.append(node_with_score)
+                tokens += node_tokens
+                continue
+
+            # The best node alone is over the budget, its start is kept rather than sending no context, and uses up
+            # the budget
+            node = node_with_score.node
+            if not packed and isinstance(node, TextNode):
+                truncated = self._truncate(node, self.token_budget)
+                if truncated is not None:
+                    packed.append(NodeWithScore(node=truncated, score=node_with_score.score))
+                metrics.increment("rag_context_nodes_dropped_total", len(nodes) - position - 1, reason="budget")
+                break
+
+            metrics.increment("rag_context_nodes_dropped_total", reason="budget")
+
+        return packed
+
+    def _postprocess_nodes(
+        self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        started_at = time.perf_counter()
+        retrieved_tokens = sum(self._count_tokens(node.node) for node in nodes)
+
+        kept_nodes = self._cutoff(nodes)
+        metrics.increment("rag_context_nodes_dropped_total", len(nodes) - len(kept_nodes), reason="cutoff")
+        assembled_nodes = self._pack(self._compact_and_deduplicate(kept_nodes))
+
+        context_tokens = sum(self._count_tokens(node.node) for node in assembled_nodes)
+        metrics.observe("rag_context_tokens", context_tokens)
+        metrics.observe("rag_context_tokens_saved", retrieved_tokens - context_tokens)
+        metrics.observe("rag_context_assembly_seconds", time.perf_counter() - started_at)
+        return assembled_nodes
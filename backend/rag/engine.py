@@ -0,0 +1,816 @@
+# Uncomment to see debug logs
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from llama_index.core import Document
+from llama_index.core import Settings as LlamaIndexSettings
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.agent import AgentRunner
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.chat_engine import (
+    CondensePlusContextChatEngine,
+    ContextChatEngine,
+)
+from llama_index.core.chat_engine.types import (
+    AgentChatResponse,
+    BaseChatEngine,
+    ChatMode,
+)
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.storage.chat_store import SimpleChatStore
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.tools import QueryEngineTool
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.llms.openai import OpenAI
+
+from config import settings
+from metrics import metrics
+from schemas import IntegrationItem
+from singleflight import single_flight
+
+from .cache import SemanticCache
+from .callbacks import usage_handler
+from .context import ContextAssembler
+from .ingestion import IngestionStages
+from .residency import IndexResidency
+from .retrievers import HybridRetriever
+from .router import ChatModeRouter
+from .tenant import TenantIndex
+from .usage import usage_scope
+from .vector_stores import CompressedVectorStore, SubsetVectorStore
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+CUSTOM_CHAT_HISTORY = [
+    ChatMessage(
+        role=MessageRole.USER,
+        content=(
+            "You should always run the tool before giving any response. "
+            "Always be descriptive and give formatted response to me."
+            "Do not tell me about the tool you are using."
+        ),
+    ),
+]
+
+# Chat history for the fast path modes, which retrieve the context up front instead of using a tool
+FAST_PATH_CHAT_HISTORY = [
+    ChatMessage(
+        role=MessageRole.USER,
+        content="Always be descriptive and give formatted response to me.",
+    ),
+]
+
+FAST_PATH_SYSTEM_PROMPT = (
+    "You are a helpful assistant answering questions about the user's data loaded from their integrations. "
+    "Answer only from the given context and say so if the context does not contain the answer."
+)
+
+
+# https://docs.llamaindex.ai/en/stable/examples/vector_stores/SimpleIndexDemo/
+class RAGEngine:
+    def __init__(self, llm: Optional[LLM] = None, embed_model: Optional[BaseEmbedding] = None):
+        # The models can be injected, e.g. local stand-ins for benchmarks, otherwise OpenAI is used
+        if (llm is None or embed_model is None) and settings.OPENAI_API_KEY is None:
+            raise ValueError("Please set OPENAI_API_KEY in .env file, for AI service to work")
+
+        self.llm = llm or OpenAI(api_key=settings.OPENAI_API_KEY, model=settings.OPENAI_CHAT_MODEL)
+        self.embed_model = embed_model or OpenAIEmbedding(
+            api_key=settings.OPENAI_API_KEY, model=settings.OPENAI_EMBEDDING_MODEL
+        )
+
+        # Tokens and latency of the model calls, attributed to the user and org of the usage scope they are made in
+        # The handler is on the global callback manager, which the indexes and chat engines set on the models anyway
+        self.usage_handler = usage_handler
+        if settings.USAGE_ACCOUNTING_ENABLED:
+            callback_manager = LlamaIndexSettings.callback_manager
+            if usage_handler not in callback_manager.handlers:
+                callback_manager.add_handler(usage_handler)
+            self.llm.callback_manager = callback_manager
+            self.embed_model.callback_manager = callback_manager
+
+        self.chat_mode_router = ChatModeRouter(
+            fast_mode=ChatMode(settings.CHAT_FAST_MODE), max_simple_words=settings.CHAT_ROUTER_MAX_SIMPLE_WORDS
+        )
+
+        # Retrieved nodes are deduplicated, compacted and packed within a token budget before reaching the LLM
+        self.node_postprocessors = []
+        if settings.CONTEXT_ASSEMBLY_ENABLED:
+            self.node_postprocessors.append(
+                ContextAssembler(
+                    token_budget=settings.CONTEXT_TOKEN_BUDGET,
+                    relative_cutoff=settings.CONTEXT_RELATIVE_CUTOFF,
+                    min_nodes=settings.CONTEXT_MIN_NODES,
+                    max_nodes=settings.RAG_SIMILARITY_TOP_K,
+                )
+            )
+
+        self.semantic_cache = SemanticCache(
+            similarity_threshold=settings.SEMANTIC_CACHE_SIMILARITY_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl=settings.SEMANTIC_CACHE_TTL,
+        )
+
+        self.ingestion = IngestionStages(
+            embed_model=self.embed_model,
+            transformations=LlamaIndexSettings.transformations,
+            workers=settings.INGESTION_WORKERS,
+            parallel_min_documents=settings.INGESTION_PARALLEL_MIN_DOCUMENTS,
+            cache_path=settings.INGESTION_CACHE_PATH,
+        )
+
+        # Serializes the writes to an index, which may be shared by several users of the org
+        self._index_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+        # Indexes are kept in memory while active, and archived once idle for long
+        self.index_residency = IndexResidency(
+            ttl=settings.INDEX_CACHE_TTL,
+            max_nodes=settings.INDEX_CACHE_MAX_NODES,
+            archive_after=settings.INDEX_ARCHIVE_AFTER,
+            enabled=settings.INDEX_CACHE_ENABLED,
+        )
+        # Serializes loading, archiving and restoring a storage directory
+        self._residency_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._last_residency_sweep = time.monotonic()
+
+    async def add_data(self, user_id: str, org_id: str, data: str, metadata: dict = {}):
+        document = Document(text=data, metadata=metadata)
+        await self.add_documents(user_id=user_id, org_id=org_id, documents=[document])
+
+    async def add_integration_items(
+        self, user_id: str, org_id: str, items: List[IntegrationItem], integration_type: str
+    ):
+        """
+        Add the items of an integration, one document per item
+        Items no longer returned by the integration are removed from the index
+        """
+
+        documents = [self._integration_item_document(item, integration_type) for item in items]
+        await self.add_documents(
+            user_id=user_id,
+            org_id=org_id,
+            documents=documents,
+            replace_filters={"integration_type": integration_type},
+        )
+
+    async def add_integrations_items(
+        self, user_id: str, org_id: str, items_by_integration_type: Dict[str, List[IntegrationItem]]
+    ):
+        """
+        Add the items of several integrations at once, embedded in one batch and persisted once
+        Items no longer returned by one of the integrations are removed from the index
+        """
+
+        documents = [
+            self._integration_item_document(item, integration_type)
+            for integration_type, items in items_by_integration_type.items()
+            for item in items
+        ]
+        await self.add_documents(
+            user_id=user_id,
+            org_id=org_id,
+            documents=documents,
+            replace_filters=[{"integration_type": integration_type} for integration_type in items_by_integration_type],
+        )
+
+    async def sync_integration_items(
+        self,
+        user_id: str,
+        org_id: str,
+        items: List[IntegrationItem],
+        integration_type: str,
+        replace_filters: List[dict],
+    ):
+        """
+        Upsert the changed items of an integration, e.g. pushed by its webhooks
+        The items of the user matching any of `replace_filters` which are not upserted are removed, e.g. the previous
+        versions of the items or the deleted ones
+        """
+
+        await self.add_documents(
+            user_id=user_id,
+            org_id=org_id,
+            documents=[self._integration_item_document(item, integration_type) for item in items],
+            replace_filters=[{"integration_type": integration_type, **filters} for filters in replace_filters],
+        )
+
+    async def add_documents(
+        self,
+        user_id: str,
+        org_id: str,
+        documents: List[Document],
+        replace_filters: Optional[Union[dict, List[dict]]] = None,
+    ):
+        """
+        Upsert the documents into the index of the user and org, and make them visible to the user
+        Documents already in the index, e.g. loaded by another user of the org, are shared instead of embedded again
+        If `replace_filters` is given, the documents of the user matching them, or any of them if it is a list, which
+        are not upserted are hidden from the user, and deleted once no user has access to them
+        """
+
+        if isinstance(replace_filters, dict):
+            replace_filters = [replace_filters]
+
+        storage_path = self.storage_path(user_id, org_id)
+        async with self._index_locks[storage_path]:
+            tenant_index = await self.load_tenant_index(user_id, org_id)
+            try:
+                with usage_scope(org_id=org_id, user_id=user_id):
+                    await self._upsert_documents(tenant_index, user_id, documents, replace_filters)
+            except BaseException:
+                # The index in memory may be half updated, the next access reloads it from disk
+                self.index_residency.evict(storage_path, reason="error")
+                raise
+            self.index_residency.put(storage_path, tenant_index)
+
+        # The index of the user changed, so the cached answers for it may be stale
+        self.semantic_cache.invalidate(org_id=org_id, user_id=user_id)
+
+    async def _upsert_documents(
+        self,
+        tenant_index: TenantIndex,
+        user_id: str,
+        documents: List[Document],
+        replace_filters: Optional[List[dict]],
+    ):
+        """Upsert the documents into the tenant index and persist it, see `add_documents`"""
+
+        index = tenant_index.index
+        documents = list({document.doc_id: document for document in documents}.values())
+        new_documents = []
+        for document in documents:
+            stored_hash = index.docstore.get_document_hash(document.doc_id)
+            if stored_hash == document.hash:
+                tenant_index.access_index.grant(user_id, tenant_index.document_node_ids(document.doc_id))
+                continue
+            new_documents.append(document)
+
+        # Chunk and embed the new documents before touching the index, so that concurrent chats keep searching the
+        # previous versions meanwhile
+        started_at = time.perf_counter()
+        nodes = await self.ingestion.run(new_documents)
+        if new_documents:
+            metrics.observe("rag_ingestion_seconds", time.perf_counter() - started_at)
+            metrics.increment("rag_ingestion_documents_total", len(new_documents))
+
+        # The content changed under the same id, replace the previous version
+        for document in new_documents:
+            if index.docstore.get_document_hash(document.doc_id) is not None:
+                tenant_index.delete_document(document.doc_id)
+
+        removed_doc_ids = set()
+        if replace_filters:
+            upserted_doc_ids = {document.doc_id for document in documents}
+            candidate_node_ids = set().union(
+                *(tenant_index.metadata_index.lookup(filters) or set() for filters in replace_filters)
+            ) & tenant_index.access_index.nodes(user_id)
+            stale_nodes = [
+                node
+                for node in index.docstore.get_nodes(list(candidate_node_ids))
+                if node.ref_doc_id not in upserted_doc_ids
+            ]
+            orphaned_node_ids = tenant_index.access_index.revoke(user_id, [node.node_id for node in stale_nodes])
+            removed_doc_ids = {node.ref_doc_id for node in stale_nodes if node.node_id in orphaned_node_ids}
+            for doc_id in removed_doc_ids:
+                tenant_index.delete_document(doc_id)
+
+        # Insert the embedded nodes in one go
+        index.insert_nodes(nodes)
+        for document in new_documents:
+            index.docstore.set_document_hash(document.doc_id, document.hash)
+
+        tenant_index.add_nodes(nodes)
+        tenant_index.access_index.grant(user_id, [node.node_id for node in nodes])
+        tenant_index.persist()
+        self.ingestion.persist_cache()
+
+    @staticmethod
+    def _integration_item_document(item: IntegrationItem, integration_type: str) -> Document:
+        # The document id is derived from the content, so identical items loaded by several users of the org
+        # are stored once, and a changed item becomes a new document
+        text = item.model_dump_json(indent=4)
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+        # The ids are only kept for filtering, the item JSON already contains them
+        filter_keys = ["item_id", "parent_id", "type"]
+        return Document(
+            id_=f"{integration_type}:{item.id or item.name}:{content_hash}",
+            text=text,
+            metadata={
+                "integration_type": integration_type,
+                "item_id": item.id,
+                "parent_id": item.parent_id,
+                "type": item.type,
+            },
+            excluded_embed_metadata_keys=filter_keys,
+            excluded_llm_metadata_keys=filter_keys,
+        )
+
+    @staticmethod
+    def storage_path(user_id: str, org_id: str) -> str:
+        """Directory of the index used by the user, shared by the whole org if RAG_INDEX_SCOPE is org"""
+
+        if settings.RAG_INDEX_SCOPE == "org":
+            return f"{settings.RAG_STORAGE_PATH}/org_{org_id}/shared"
+
+        return f"{settings.RAG_STORAGE_PATH}/org_{org_id}/user_{user_id}"
+
+    @staticmethod
+    def chat_sessions_path(user_id: str, org_id: str) -> str:
+        """Chat sessions are always stored per user"""
+
+        return f"{settings.RAG_STORAGE_PATH}/org_{org_id}/user_{user_id}"
+
+    def chat_session_path(self, user_id: str, org_id: str, chat_session_id: str) -> str:
+        return f"{self.chat_sessions_path(user_id, org_id)}/chat_session_{chat_session_id}.json"
+
+    def load_vector_store(self, persist_dir: Optional[str] = None) -> BasePydanticVectorStore:
+        """
+        Vector store configured by EMBEDDING_STORAGE, loaded from `persist_dir` if given
+        Stores persisted compressed stay compressed, JSON stores are converted when compression is enabled or when
+        they reach ANN_MIN_NODES embeddings
+        """
+
+        ann_min_nodes = settings.ANN_MIN_NODES if settings.ANN_INDEX == "ivf" else None
+        options = dict(
+            rerank=settings.EMBEDDING_RERANK,
+            rerank_oversample=settings.EMBEDDING_RERANK_OVERSAMPLE,
+            pq_subspaces=settings.EMBEDDING_PQ_SUBSPACES,
+            ann_min_nodes=ann_min_nodes,
+            ann_probes=settings.ANN_PROBES,
+        )
+
+        if settings.EMBEDDING_STORAGE == "json" and (
+            persist_dir is None or not CompressedVectorStore.exists(persist_dir)
+        ):
+            if persist_dir is None:
+                return SubsetVectorStore()
+
+            vector_store = SubsetVectorStore.from_persist_dir(persist_dir)
+            if ann_min_nodes is None or len(vector_store.data.embedding_dict) < ann_min_nodes:
+                return vector_store
+
+            # Large stores move to lossless float32 codes, which the ANN index is built over
+            compressed_store = CompressedVectorStore(codec_name="float32", **options)
+            compressed_store.add_from_simple_store(vector_store)
+            return compressed_store
+
+        # Compressed stores found on disk keep their codec while EMBEDDING_STORAGE is "json"
+        codec_name = None if settings.EMBEDDING_STORAGE == "json" else settings.EMBEDDING_STORAGE
+        if persist_dir is None:
+            return CompressedVectorStore(codec_name=codec_name, dimensions=settings.EMBEDDING_DIMENSIONS, **options)
+        return CompressedVectorStore.from_persist_dir(
+            persist_dir, codec_name=codec_name, dimensions=settings.EMBEDDING_DIMENSIONS, **options
+        )
+
+    async def load_index(self, user_id: str, org_id: str) -> VectorStoreIndex:
+        """
+        Load the index for the user and org
+        If the index is not found, create a new index with the user and org id
+        """
+
+        if settings.RAG_INDEX_SCOPE == "org":
+            index_id = f"vector_index_org:{org_id}"
+        else:
+            index_id = f"vector_index_org:{org_id}_user:{user_id}"
+        user_storage_path = self.storage_path(user_id, org_id)
+
+        if not os.path.exists(os.path.join(user_storage_path, "docstore.json")):
+            # Create a new index for the user if it doesn't exist
+            storage_context = StorageContext.from_defaults(
+                docstore=SimpleDocumentStore(),
+                vector_store=self.load_vector_store(),
+                index_store=SimpleIndexStore(),
+            )
+            index = VectorStoreIndex.from_documents(
+                documents=[], storage_context=storage_context, embed_model=self.embed_model, verbose=True
+            )
+            index.set_index_id(index_id)
+            # Persist the index to the local storage
+            index.storage_context.persist(persist_dir=user_storage_path)
+        else:
+            # Load the existing index for the user
+            storage_context = StorageContext.from_defaults(
+                persist_dir=user_storage_path,
+                vector_store=self.load_vector_store(persist_dir=user_storage_path),
+            )
+            index = load_index_from_storage(storage_context, index_id=index_id, embed_model=self.embed_model)
+
+        return index
+
+    async def load_tenant_index(self, user_id: str, org_id: str) -> TenantIndex:
+        """
+        Load the index for the user and org with its keyword, metadata and access indexes
+        Served from memory while hot, archived indexes are restored first
+        """
+
+        started_at = time.perf_counter()
+        storage_path = self.storage_path(user_id, org_id)
+        if time.monotonic() - self._last_residency_sweep > settings.INDEX_SWEEP_INTERVAL:
+            self._last_residency_sweep = time.monotonic()
+            asyncio.create_task(self.sweep_index_residency())
+
+        tenant_index = self.index_residency.get(storage_path)
+        if tenant_index is not None:
+            metrics.observe("rag_index_load_seconds", time.perf_counter() - started_at, tier="hot")
+            return tenant_index
+
+        # Concurrent requests for the same index, e.g. several chats of the user, share one load
+        tenant_index, tier = await single_flight.do(
+            (id(self), storage_path),
+            lambda: self._load_tenant_index_from_storage(user_id, org_id, storage_path),
+            kind="tenant_index",
+        )
+
+        metrics.observe("rag_index_load_seconds", time.perf_counter() - started_at, tier=tier)
+        return tenant_index
+
+    async def _load_tenant_index_from_storage(
+        self, user_id: str, org_id: str, storage_path: str
+    ) -> Tuple[TenantIndex, str]:
+        """Load the tenant index from its directory, restored first if archived, returns it with its tier"""
+
+        async with self._residency_locks[storage_path]:
+            # Loaded by a request which completed while waiting for the lock
+            tenant_index = self.index_residency.get(storage_path)
+            if tenant_index is not None:
+                return tenant_index, "hot"
+
+            tier = "warm"
+            if self.index_residency.is_archived(storage_path):
+                tier = "cold"
+                await asyncio.to_thread(IndexResidency.restore, storage_path)
+
+            index = await self.load_index(user_id=user_id, org_id=org_id)
+
+            # Indexes of a single user predate the access lists, all of their nodes belong to the user
+            tenant_index = TenantIndex.load(
+                index=index,
+                persist_dir=storage_path,
+                owner_user_id=user_id if settings.RAG_INDEX_SCOPE == "user" else None,
+            )
+            self.index_residency.put(storage_path, tenant_index)
+
+        return tenant_index, tier
+
+    async def sweep_index_residency(self):
+        """Evict the expired hot indexes and archive the index directories idle for longer than INDEX_ARCHIVE_AFTER"""
+
+        self.index_residency.evict_expired()
+
+        idle_paths = await asyncio.to_thread(self.index_residency.idle_storage_paths, settings.RAG_STORAGE_PATH)
+        for storage_path in idle_paths:
+            # Same lock order as add_documents, so that no write or load runs while the directory is archived
+            async with self._index_locks[storage_path], self._residency_locks[storage_path]:
+                # Accessed while waiting for the locks
+                if not self.index_residency.is_idle(storage_path):
+                    continue
+                try:
+                    await asyncio.to_thread(IndexResidency.archive, storage_path)
+                except OSError:
+                    logging.exception(f"Failed to archive the index at {storage_path}")
+
+    async def export_snapshot(self, user_id: str, org_id: str, output_path: str) -> dict:
+        """Write the index of the user and org and the chat sessions of the user to a snapshot archive"""
+
+        # Imported here, so that `python -m rag.snapshots` does not import the module twice
+        from .snapshots import export_snapshot, snapshot_metadata
+
+        storage_path = self.storage_path(user_id, org_id)
+        chat_sessions_path = self.chat_sessions_path(user_id, org_id)
+        # No write to the index while it is copied
+        async with self._index_locks[storage_path], self._residency_locks[storage_path]:
+            await asyncio.to_thread(IndexResidency.restore, storage_path)
+            await asyncio.to_thread(IndexResidency.restore, chat_sessions_path)
+
+            started_at = time.perf_counter()
+            manifest = await asyncio.to_thread(
+                export_snapshot,
+                storage_path,
+                chat_sessions_path,
+                output_path,
+                metadata=snapshot_metadata(user_id, org_id),
+            )
+
+        metrics.observe("rag_snapshot_export_seconds", time.perf_counter() - started_at)
+        return manifest
+
+    async def import_snapshot(self, user_id: str, org_id: str, archive_path: str, warm: bool = False) -> dict:
+        """
+        Replace the index of the user and org with the snapshot, and add its chat sessions to the ones of the user
+        If `warm`, the index is loaded in memory right away
+        """
+
+        from .snapshots import import_snapshot, snapshot_metadata
+
+        storage_path = self.storage_path(user_id, org_id)
+        chat_sessions_path = self.chat_sessions_path(user_id, org_id)
+        async with self._index_locks[storage_path], self._residency_locks[storage_path]:
+            await asyncio.to_thread(IndexResidency.restore, storage_path)
+            await asyncio.to_thread(IndexResidency.restore, chat_sessions_path)
+
+            started_at = time.perf_counter()
+            manifest = await asyncio.to_thread(
+                import_snapshot,
+                archive_path,
+                storage_path,
+                chat_sessions_path,
+                expected_metadata=snapshot_metadata(user_id, org_id),
+            )
+            self.index_residency.evict(storage_path, reason="snapshot")
+
+        metrics.observe("rag_snapshot_import_seconds", time.perf_counter() - started_at)
+        self.semantic_cache.invalidate(org_id=org_id, user_id=user_id)
+        if warm:
+            await self.load_tenant_index(user_id, org_id)
+        return manifest
+
+    async def load_retriever(
+        self,
+        tenant_index: TenantIndex,
+        user_id: str,
+        query_embeddings: Optional[dict] = None,
+        filters: Optional[dict] = None,
+    ) -> BaseRetriever:
+        # Pre-filter the nodes with the metadata index, the search then only runs over the matching nodes
+        node_ids = tenant_index.metadata_index.lookup(filters)
+
+        # Only the nodes the user has access to are searched in the index shared by the org
+        if settings.RAG_INDEX_SCOPE == "org":
+            visible_node_ids = tenant_index.access_index.nodes(user_id)
+            node_ids = visible_node_ids if node_ids is None else node_ids & visible_node_ids
+
+        # The context assembly then keeps the candidates close enough to the best one
+        similarity_top_k = settings.RAG_SIMILARITY_TOP_K
+        if settings.CONTEXT_ASSEMBLY_ENABLED and settings.CONTEXT_CANDIDATE_TOP_K:
+            similarity_top_k = settings.CONTEXT_CANDIDATE_TOP_K
+
+        if not settings.HYBRID_RETRIEVAL_ENABLED:
+            return tenant_index.index.as_retriever(
+                similarity_top_k=similarity_top_k, node_ids=None if node_ids is None else list(node_ids)
+            )
+
+        # Vector hits fused with the BM25 keyword hits, exact names and ids are matched by the keywords
+        return HybridRetriever(
+            index=tenant_index.index,
+            keyword_index=tenant_index.keyword_index,
+            similarity_top_k=similarity_top_k,
+            rrf_k=settings.HYBRID_RRF_K,
+            keyword_only_max_terms=settings.HYBRID_KEYWORD_ONLY_MAX_TERMS,
+            query_embeddings=query_embeddings,
+            node_ids=node_ids,
+        )
+
+    async def load_chat_engine(
+        self, retriever: BaseRetriever, chat_memory: ChatMemoryBuffer, chat_mode: ChatMode = ChatMode.REACT
+    ) -> BaseChatEngine:
+        if chat_mode == ChatMode.REACT:
+            # Agent with the retriever as a query engine tool and memory from the local chat store
+            # Same as the index chat engine with mode REACT
+            query_engine = RetrieverQueryEngine.from_args(
+                retriever=retriever, llm=self.llm, node_postprocessors=self.node_postprocessors
+            )
+            return AgentRunner.from_llm(
+                tools=[QueryEngineTool.from_defaults(query_engine=query_engine)],
+                llm=self.llm,
+                memory=chat_memory,
+                verbose=True,
+            )
+
+        # Fast path, retrieve the context once and answer it in a single LLM call
+        if chat_mode == ChatMode.CONDENSE_PLUS_CONTEXT:
+            # Condenses the question with the chat history first
+            return CondensePlusContextChatEngine.from_defaults(
+                retriever=retriever,
+                llm=self.llm,
+                memory=chat_memory,
+                system_prompt=FAST_PATH_SYSTEM_PROMPT,
+                node_postprocessors=self.node_postprocessors,
+                verbose=True,
+            )
+
+        return ContextChatEngine.from_defaults(
+            retriever=retriever,
+            llm=self.llm,
+            memory=chat_memory,
+            system_prompt=FAST_PATH_SYSTEM_PROMPT,
+            node_postprocessors=self.node_postprocessors,
+        )
+
+    def resolve_chat_mode(self, message: str) -> ChatMode:
+        """Chat mode from the settings, routed on the message if set to auto"""
+
+        if settings.CHAT_MODE == "auto":
+            return self.chat_mode_router.route(message)
+
+        return ChatMode(settings.CHAT_MODE)
+
+    async def load_chat_memory(
+        self, chat_store: SimpleChatStore, chat_store_key: str, chat_history: List[ChatMessage] = CUSTOM_CHAT_HISTORY
+    ) -> ChatMemoryBuffer:
+        # Load the chat memory from the local storage
+        return ChatMemoryBuffer.from_defaults(
+            chat_history=chat_history,
+            llm=self.llm,
+            chat_store=chat_store,
+            chat_store_key=chat_store_key,
+            token_limit=settings.CHAT_MEMORY_TOKEN_LIMIT,
+        )
+
+    async def chat(
+        self,
+        user_id: str,
+        org_id: str,
+        chat_session_id: str,
+        message: str,
+        chat_mode: Optional[ChatMode] = None,
+        filters: Optional[dict] = None,
+    ) -> AgentChatResponse:
+        """
+        Chat with the index of the user and org
+        If `filters` on the indexed metadata fields are given, only the matching nodes are searched
+        """
+
+        # The model calls of the chat are accounted to the user and org
+        with usage_scope(org_id=org_id, user_id=user_id):
+            started_at = time.perf_counter()
+            chat_mode = chat_mode or self.resolve_chat_mode(message)
+            chat_session_path = self.chat_session_path(user_id, org_id, chat_session_id)
+
+            # The chat sessions are archived along with the index of the user
+            chat_session_dir = os.path.dirname(chat_session_path)
+            if self.index_residency.is_archived(chat_session_dir):
+                async with self._residency_locks[chat_session_dir]:
+                    await asyncio.to_thread(IndexResidency.restore, chat_session_dir)
+
+            # Fetch chat store from the local storage
+            chat_store = SimpleChatStore.from_persist_path(persist_path=chat_session_path)
+
+            # Load the chat memory from the local storage
+            chat_memory = await self.load_chat_memory(
+                chat_store=chat_store,
+                chat_store_key=f"org:{org_id}_user:{user_id}_session:{chat_session_id}",
+                chat_history=CUSTOM_CHAT_HISTORY if chat_mode == ChatMode.REACT else FAST_PATH_CHAT_HISTORY,
+            )
+
+            # Answer from the semantic cache if a near-identical question was asked against the same index
+            cache_key = (org_id, user_id, *[f"{field}={value}" for field, value in sorted((filters or {}).items())])
+            query_embeddings = {}
+            if settings.SEMANTIC_CACHE_ENABLED:
+                cache_generation = self.semantic_cache.generation(org_id=org_id, user_id=user_id)
+                query_embedding = await self.embed_model.aget_query_embedding(message)
+                cache_hit = self.semantic_cache.lookup(cache_key, query_embedding)
+                if cache_hit is not None:
+                    entry, _ = cache_hit
+                    chat_memory.put(ChatMessage(role=MessageRole.USER, content=message))
+                    chat_memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=entry.response))
+                    chat_store.persist(persist_path=chat_session_path)
+
+                    latency = time.perf_counter() - started_at
+                    self._record_semantic_cache_metrics(hit=True, latency_saved=max(entry.latency - latency, 0.0))
+                    return AgentChatResponse(response=entry.response)
+
+                self._record_semantic_cache_metrics(hit=False)
+                query_embeddings[message] = query_embedding
+
+            # Load the index
+            tenant_index = await self.load_tenant_index(user_id=user_id, org_id=org_id)
+
+            # Fetch or create the chat engine with the index and the chat memory
+            retriever = await self.load_retriever(
+                tenant_index=tenant_index, user_id=user_id, query_embeddings=query_embeddings, filters=filters
+            )
+            chat_engine = await self.load_chat_engine(retriever=retriever, chat_memory=chat_memory, chat_mode=chat_mode)
+
+            # Chat with the engine
+            response = chat_engine.chat(message)
+
+            # Save the chat history to the local storage
+            # The index is not persisted, chatting does not change it and it may be shared with concurrent ingestions
+            chat_store.persist(persist_path=chat_session_path)
+
+            latency = time.perf_counter() - started_at
+            metrics.increment("rag_chat_requests_total", mode=chat_mode.value)
+            metrics.observe("rag_chat_latency_seconds", latency, mode=chat_mode.value)
+
+            if settings.SEMANTIC_CACHE_ENABLED:
+                self.semantic_cache.put(
+                    cache_key,
+                    org_id=org_id,
+                    user_id=user_id,
+                    generation=cache_generation,
+                    query=message,
+                    embedding=query_embedding,
+                    response=str(response),
+                    latency=latency,
+                )
+
+            return response
+
+    async def chat_batch(
+        self,
+        user_id: str,
+        org_id: str,
+        messages: List[str],
+        filters: Optional[dict] = None,
+        concurrency: Optional[int] = None,
+        chat_mode: Optional[ChatMode] = None,
+    ) -> AsyncIterator[Tuple[int, Union[AgentChatResponse, Exception]]]:
+        """
+        Answer independent questions against the index of the user and org, without chat history
+        The index is loaded once and the questions are embedded in one batch, at most `concurrency` answers are
+        generated at a time and they are yielded with the position of their question as they complete, a failed
+        answer is yielded as its exception
+        Every question is answered in `chat_mode` if given, otherwise in the mode it is routed to
+        """
+
+        started_at = time.perf_counter()
+        tenant_index = await self.load_tenant_index(user_id=user_id, org_id=org_id)
+
+        # Query and text embeddings are the same for the OpenAI embedding models
+        with usage_scope(org_id=org_id, user_id=user_id):
+            embeddings = await self.embed_model.aget_text_embedding_batch(messages)
+        query_embeddings = dict(zip(messages, embeddings))
+
+        cache_key = (org_id, user_id, *[f"{field}={value}" for field, value in sorted((filters or {}).items())])
+        cache_generation = self.semantic_cache.generation(org_id=org_id, user_id=user_id)
+        semaphore = asyncio.Semaphore(concurrency or settings.CHAT_BATCH_CONCURRENCY)
+
+        async def answer(position: int, message: str) -> Tuple[int, Union[AgentChatResponse, Exception]]:
+            try:
+                with usage_scope(org_id=org_id, user_id=user_id):
+                    return position, await generate(position, message)
+            except Exception as e:
+                logging.exception(f"Failed to answer the question {position} of the batch")
+                return position, e
+
+        async def generate(position: int, message: str) -> AgentChatResponse:
+            if settings.SEMANTIC_CACHE_ENABLED:
+                cache_hit = self.semantic_cache.lookup(cache_key, query_embeddings[message])
+                self._record_semantic_cache_metrics(hit=cache_hit is not None)
+                if cache_hit is not None:
+                    return AgentChatResponse(response=cache_hit[0].response)
+
+            async with semaphore:
+                answer_started_at = time.perf_counter()
+                message_chat_mode = chat_mode or self.resolve_chat_mode(message)
+                chat_memory = await self.load_chat_memory(
+                    chat_store=SimpleChatStore(),
+                    chat_store_key=f"org:{org_id}_user:{user_id}_batch:{position}",
+                    chat_history=CUSTOM_CHAT_HISTORY if message_chat_mode == ChatMode.REACT else FAST_PATH_CHAT_HISTORY,
+                )
+                retriever = await self.load_retriever(
+                    tenant_index=tenant_index, user_id=user_id, query_embeddings=query_embeddings, filters=filters
+                )
+                chat_engine = await self.load_chat_engine(
+                    retriever=retriever, chat_memory=chat_memory, chat_mode=message_chat_mode
+                )
+                response = await chat_engine.achat(message)
+
+            latency = time.perf_counter() - answer_started_at
+            metrics.increment("rag_chat_requests_total", mode=message_chat_mode.value)
+            metrics.observe("rag_chat_latency_seconds", latency, mode=message_chat_mode.value)
+
+            if settings.SEMANTIC_CACHE_ENABLED:
+                self.semantic_cache.put(
+                    cache_key,
+                    org_id=org_id,
+                    user_id=user_id,
+                    generation=cache_generation,
+                    query=message,
+                    embedding=query_embeddings[message],
+                    response=str(response),
+                    latency=latency,
+                )
+
+            return response
+
+        tasks = [asyncio.ensure_future(answer(position, message)) for position, message in enumerate(messages)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # The client went away, stop the answers still pending
+            for task in tasks:
+                task.cancel()
+            metrics.observe("rag_chat_batch_seconds", time.perf_counter() - started_at)
+            metrics.observe("rag_chat_batch_size", len(messages))
+
+    def _record_semantic_cache_metrics(self, hit: bool, latency_saved: float = 0.0):
+        metrics.increment("rag_semantic_cache_requests_total", result="hit" if hit else "miss")
+        if hit:
+            metrics.increment("rag_semantic_cache_latency_saved_seconds_total", latency_saved)
+
+        hits = metrics.counter_value("rag_semantic_cache_requests_total", result="hit")
+        misses = metrics.counter_value("rag_semantic_cache_requests_total", result="miss")
+        metrics.set_gauge("rag_semantic_cache_hit_rate", hits / (hits + misses))
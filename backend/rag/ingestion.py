@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import os
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.ingestion import (
+    IngestionCache,
+    IngestionPipeline,
+    run_transformations,
+)
+from llama_index.core.schema import BaseNode, Document, TransformComponent
+
+from metrics import metrics
+
+
+class IngestionStages:
+    """
+    Staged ingestion of documents, the caller inserts the embedded nodes into the index in bulk.
+
+    - parse: node parsing and transformations, CPU bound, in a process pool of `workers` for batches of at least
+      `parallel_min_documents` documents and in a thread otherwise
+    - embed: batched embedding of the nodes, on the event loop
+    The output of every stage is cached per input node by its hash, if `cache_path` is set the cache is persisted there.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        transformations: List[TransformComponent],
+        workers: Optional[int] = None,
+        parallel_min_documents: int = 500,
+        cache_path: Optional[str] = None,
+    ):
+        self.embed_model = embed_model
+        self.transformations = transformations
+        # More processes than cores only add overhead
+        self.workers = min(workers or os.cpu_count() or 1, os.cpu_count() or 1)
+        self.parallel_min_documents = parallel_min_documents
+
+        self.cache_path = cache_path
+        self.cache: Optional[IngestionCache] = None
+        if cache_path is not None:
+            self.cache = (
+                IngestionCache.from_persist_path(cache_path) if os.path.exists(cache_path) else IngestionCache()
+            )
+
+    @staticmethod
+    def _cache_key(node: BaseNode, stage_id: str) -> str:
+        # The output nodes refer to the id of their input, a node with the same content under another id is not a hit
+        return hashlib.sha256(f"{stage_id}:{node.node_id}:{node.hash}".encode("utf-8")).hexdigest()
+
+    async def _run_stage(
+        self,
+        stage: str,
+        nodes: Sequence[BaseNode],
+        stage_id: str,
+        run: Callable[[Sequence[BaseNode]], Awaitable[List[BaseNode]]],
+        input_id: Callable[[BaseNode], Optional[str]],
+    ) -> List[BaseNode]:
+        """
+        Run the stage on the nodes missing from the cache, cached per input node under the id and hash of the node,
+        so that a batch changing a few documents only runs the stage on those. `input_id` is the id of the input node
+        an output node of the stage was made from
+        """
+
+        if not nodes:
+            return []
+        if self.cache is None:
+            return await run(nodes)
+
+        keys = [self._cache_key(node, stage_id) for node in nodes]
+        outputs_by_key = {}
+        for key in set(keys):
+            cached_nodes = self.cache.get(key, collection=stage)
+            if cached_nodes is not None:
+                outputs_by_key[key] = cached_nodes
+        missing = {key: node for key, node in zip(keys, nodes) if key not in outputs_by_key}
+        metrics.increment("rag_ingestion_cache_requests_total", len(nodes) - len(missing), stage=stage, result="hit")
+        metrics.increment("rag_ingestion_cache_requests_total", len(missing), stage=stage, result="miss")
+
+        if missing:
+            output_nodes = await run(list(missing.values()))
+            outputs_by_input_id: Dict[Optional[str], List[BaseNode]] = defaultdict(list)
+            for output_node in output_nodes:
+                outputs_by_input_id[input_id(output_node)].append(output_node)
+
+            missing_ids = [node.node_id for node in missing.values()]
+            attributed = sum(len(outputs_by_input_id.get(node_id, [])) for node_id in set(missing_ids))
+            # Outputs which cannot be told apart per input node are returned uncached
+            if len(set(missing_ids)) < len(missing_ids) or attributed < len(output_nodes):
+                cached_outputs = [node for key in keys if key in outputs_by_key for node in outputs_by_key[key]]
+                return cached_outputs + output_nodes
+
+            for key, node in missing.items():
+                outputs_by_key[key] = outputs_by_input_id.get(node.node_id, [])
+                self.cache.put(key, outputs_by_key[key], collection=stage)
+
+        return [output_node for key in keys for output_node in outputs_by_key[key]]
+
+    async def parse(self, documents: List[Document]) -> List[BaseNode]:
+        """Split the documents into nodes, every integration item is a document kept whole unless it is too long"""
+
+        async def run(documents: Sequence[BaseNode]) -> List[BaseNode]:
+            if self.workers > 1 and len(documents) >= self.parallel_min_documents:
+                # The pipeline splits the documents into one batch per worker process
+                pipeline = IngestionPipeline(transformations=self.transformations, disable_cache=True)
+                return list(await pipeline.arun(documents=documents, num_workers=self.workers))
+
+            return await asyncio.to_thread(run_transformations, documents, self.transformations)
+
+        # The configuration of the transformations, so that changing e.g. the chunk size invalidates the cache
+        stage_id = "".join(str(transformation.to_dict()) for transformation in self.transformations)
+        return await self._run_stage("parse", documents, stage_id, run, input_id=lambda node: node.ref_doc_id)
+
+    async def embed(self, nodes: List[BaseNode]) -> List[BaseNode]:
+        """Embed the nodes in batches of the embed model batch size"""
+
+        async def run(nodes: Sequence[BaseNode]) -> List[BaseNode]:
+            return list(await self.embed_model.acall(nodes))
+
+        stage_id = f"{self.embed_model.class_name()}:{self.embed_model.model_name}"
+        return await self._run_stage("embed", nodes, stage_id, run, input_id=lambda node: node.node_id)
+
+    async def run(self, documents: List[Document]) -> List[BaseNode]:
+        """Parse and embed the documents"""
+
+        return await self.embed(await self.parse(documents))
+
+    def persist_cache(self):
+        if self.cache is not None:
+            self.cache.persist(self.cache_path)
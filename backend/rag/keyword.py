@@ -0,0 +1,131 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by do for from has have i in is it me my of on or our show the their them to "
+    "what which who with all any list find get give tell about".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and id tokens of the text without stopwords"""
+
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted keyword index over the nodes of an index, scored with BM25.
+
+    Nodes are added and removed incrementally, so the index is maintained alongside the vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        # term -> node id -> term frequency
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # node id -> number of tokens
+        self.node_lengths: Dict[str, int] = {}
+        # node id -> distinct terms, to remove a node without scanning every posting list
+        self.node_terms: Dict[str, List[str]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.node_lengths)
+
+    def add(self, node_id: str, text: str):
+        """Add a node, replacing it if it is already indexed"""
+
+        if node_id in self.node_lengths:
+            self.remove(node_id)
+
+        tokens = tokenize(text)
+        frequencies = Counter(tokens)
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[node_id] = frequency
+
+        self.node_lengths[node_id] = len(tokens)
+        self.node_terms[node_id] = list(frequencies)
+        self.total_length += len(tokens)
+
+    def remove(self, node_id: str):
+        """Remove a node if it is indexed"""
+
+        length = self.node_lengths.pop(node_id, None)
+        if length is None:
+            return
+
+        self.total_length -= length
+        for term in self.node_terms.pop(node_id, []):
+            nodes = self.postings.get(term, {})
+            nodes.pop(node_id, None)
+            if not nodes:
+                self.postings.pop(term, None)
+
+    def search(self, query: str, top_k: int, node_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float, int]]:
+        """
+        Top nodes for the query as (node id, BM25 score, number of matched query terms).
+
+        If `node_ids` is given, only those nodes are scored.
+        """
+
+        if not self.node_lengths:
+            return []
+
+        allowed_ids = None if node_ids is None else set(node_ids)
+        average_length = self.total_length / len(self.node_lengths)
+        scores: Dict[str, float] = {}
+        matched_terms: Dict[str, int] = {}
+
+        for term in set(tokenize(query)):
+            nodes = self.postings.get(term)
+            if not nodes:
+                continue
+
+            idf = math.log(1 + (len(self.node_lengths) - len(nodes) + 0.5) / (len(nodes) + 0.5))
+            for node_id, frequency in nodes.items():
+                if allowed_ids is not None and node_id not in allowed_ids:
+                    continue
+
+                length_norm = 1 - self.b + self.b * self.node_lengths[node_id] / average_length
+                scores[node_id] = scores.get(node_id, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * length_norm
+                )
+                matched_terms[node_id] = matched_terms.get(node_id, 0) + 1
+
+        top_nodes = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(node_id, score, matched_terms[node_id]) for node_id, score in top_nodes]
+
+    def persist(self, persist_path: str):
+        """Save the index as JSON"""
+
+        os.makedirs(os.path.dirname(persist_path), exist_ok=True)
+        with open(persist_path, "w") as file:
+            json.dump({"k1": self.k1, "b": self.b, "postings": self.postings, "node_lengths": self.node_lengths}, file)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str) -> "BM25Index":
+        """Load the index, or an empty one if it was never persisted"""
+
+        if not os.path.exists(persist_path):
+            return cls()
+
+        with open(persist_path) as file:
+            data = json.load(file)
+
+        keyword_index = cls(k1=data["k1"], b=data["b"])
+        keyword_index.postings = data["postings"]
+        keyword_index.node_lengths = data["node_lengths"]
+        keyword_index.total_length = sum(keyword_index.node_lengths.values())
+        for term, nodes in keyword_index.postings.items():
+            for node_id in nodes:
+                keyword_index.node_terms.setdefault(node_id, []).append(term)
+        return keyword_index
@@ -0,0 +1,97 @@
+import json
+import os
+from typing import Dict, Iterable, Optional, Set
+
+# Node metadata fields kept in the secondary index
+INDEXED_METADATA_FIELDS = ("integration_type", "item_id", "parent_id", "type")
+
+
+class MetadataIndex:
+    """
+    Secondary index from node metadata values to node ids.
+
+    Used to pre-filter the nodes a query is run over, instead of scanning the whole index.
+    """
+
+    def __init__(self, fields: Iterable[str] = INDEXED_METADATA_FIELDS):
+        self.fields = tuple(fields)
+
+        # field -> value -> node ids
+        self.postings: Dict[str, Dict[str, Set[str]]] = {field: {} for field in self.fields}
+        # node id -> indexed field values of the node
+        self.node_values: Dict[str, Dict[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.node_values)
+
+    def add(self, node_id: str, metadata: dict):
+        """Index the metadata of a node, replacing it if the node is already indexed"""
+
+        if node_id in self.node_values:
+            self.remove(node_id)
+
+        values = {field: str(metadata[field]) for field in self.fields if metadata.get(field) is not None}
+        for field, value in values.items():
+            self.postings[field].setdefault(value, set()).add(node_id)
+
+        self.node_values[node_id] = values
+
+    def remove(self, node_id: str):
+        """Remove a node if it is indexed"""
+
+        for field, value in self.node_values.pop(node_id, {}).items():
+            node_ids = self.postings[field].get(value)
+            if node_ids is None:
+                continue
+
+            node_ids.discard(node_id)
+            if not node_ids:
+                del self.postings[field][value]
+
+    def lookup(self, filters: Optional[dict]) -> Optional[Set[str]]:
+        """
+        Ids of the nodes matching every filter, or None if there are no filters.
+
+        Filters on fields which are not indexed raise a ValueError.
+        """
+
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        if not filters:
+            return None
+
+        unknown_fields = set(filters) - set(self.fields)
+        if unknown_fields:
+            raise ValueError(f"Metadata fields {sorted(unknown_fields)} are not indexed")
+
+        # Intersect starting from the smallest posting list
+        posting_lists = sorted(
+            (self.postings[field].get(str(value), set()) for field, value in filters.items()), key=len
+        )
+        node_ids = set(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            node_ids &= posting_list
+
+        return node_ids
+
+    def persist(self, persist_path: str):
+        """Save the index as JSON"""
+
+        os.makedirs(os.path.dirname(persist_path), exist_ok=True)
+        with open(persist_path, "w") as file:
+            json.dump({"fields": self.fields, "node_values": self.node_values}, file)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str) -> "MetadataIndex":
+        """Load the index, or an empty one if it was never persisted"""
+
+        if not os.path.exists(persist_path):
+            return cls()
+
+        with open(persist_path) as file:
+            data = json.load(file)
+
+        metadata_index = cls(fields=data["fields"])
+        for node_id, values in data["node_values"].items():
+            metadata_index.add(node_id, values)
+
+        return metadata_index
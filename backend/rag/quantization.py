@@ -0,0 +1,184 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale the rows to unit length, so that dot products are cosine similarities"""
+
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def truncate(vectors: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """
+    Matryoshka-style dimension reduction, keeps the leading dimensions and renormalizes.
+    Embeddings trained for it, e.g. OpenAI text-embedding-3, keep most of their quality.
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions is not None and vectors.shape[-1] > dimensions:
+        vectors = vectors[..., :dimensions]
+
+    return normalize(vectors)
+
+
+class EmbeddingCodec:
+    """Encodes unit length float vectors into compact codes and scores queries against the codes"""
+
+    name = "float32"
+    code_dtype = np.float32
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @property
+    def is_fitted(self) -> bool:
+        return True
+
+    def fit(self, vectors: np.ndarray):
+        """Learn the codec parameters from sample vectors"""
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=self.code_dtype)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate dot products of the query with the encoded vectors"""
+
+        return codes @ query
+
+    def code_bytes(self) -> int:
+        """Bytes stored per vector"""
+
+        return self.dimensions * np.dtype(self.code_dtype).itemsize
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        pass
+
+
+class Int8Codec(EmbeddingCodec):
+    """
+    Scalar quantization to int8 with a symmetric scale per dimension.
+
+    The query is multiplied by the scales once, so scoring is a single int8 by float matrix product.
+    """
+
+    name = "int8"
+    code_dtype = np.int8
+
+    def __init__(self, dimensions: int):
+        super().__init__(dimensions)
+        self.scales: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scales is not None
+
+    def fit(self, vectors: np.ndarray):
+        max_values = np.abs(vectors).max(axis=0)
+        self.scales = (np.where(max_values > 0, max_values, 1.0) / 127.0).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return codes @ (query * self.scales)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"scales": self.scales}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.scales = state["scales"]
+
+
+class ProductQuantizationCodec(EmbeddingCodec):
+    """
+    Product quantization, every vector is split in `subspaces` chunks each encoded as one byte,
+    the index of the nearest of up to 256 centroids learnt by k-means for that chunk.
+
+    Queries are scored with a lookup table of the query chunk dot products with every centroid.
+    """
+
+    name = "pq"
+    code_dtype = np.uint8
+
+    def __init__(self, dimensions: int, subspaces: int = 16, iterations: int = 15, seed: int = 0):
+        super().__init__(dimensions)
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.seed = seed
+        # Padded so that every subspace has the same number of dimensions
+        self.subspace_dimensions = -(-dimensions // subspaces)
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        padding = self.subspace_dimensions * self.subspaces - vectors.shape[-1]
+        if padding:
+            vectors = np.pad(vectors, [(0, 0), (0, padding)])
+        return vectors.reshape(len(vectors), self.subspaces, self.subspace_dimensions)
+
+    def fit(self, vectors: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        chunks = self._split(np.asarray(vectors, dtype=np.float32))
+        centroids_count = min(256, len(vectors))
+
+        codebooks = np.zeros((self.subspaces, centroids_count, self.subspace_dimensions), dtype=np.float32)
+        for subspace in range(self.subspaces):
+            data = chunks[:, subspace, :]
+            centroids = data[rng.choice(len(data), centroids_count, replace=False)]
+            for _ in range(self.iterations):
+                assignments = self._nearest(data, centroids)
+                for centroid in range(centroids_count):
+                    members = data[assignments == centroid]
+                    if len(members):
+                        centroids[centroid] = members.mean(axis=0)
+            codebooks[subspace] = centroids
+
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (data**2).sum(axis=1, keepdims=True) - 2 * data @ centroids.T + (centroids**2).sum(axis=1)
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        chunks = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for subspace in range(self.subspaces):
+            codes[:, subspace] = self._nearest(chunks[:, subspace, :], self.codebooks[subspace])
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        query_chunks = self._split(query[None, :])[0]
+        # subspace -> centroid -> dot product with the query chunk
+        table = np.einsum("sd,scd->sc", query_chunks, self.codebooks)
+        return table[np.arange(self.subspaces), codes].sum(axis=1)
+
+    def code_bytes(self) -> int:
+        return self.subspaces
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.codebooks = state["codebooks"]
+
+
+def make_codec(name: str, dimensions: int, pq_subspaces: int = 16) -> EmbeddingCodec:
+    """Codec by name, one of float32, int8 or pq"""
+
+    if name == "float32":
+        return EmbeddingCodec(dimensions)
+    if name == "int8":
+        return Int8Codec(dimensions)
+    if name == "pq":
+        return ProductQuantizationCodec(dimensions, subspaces=pq_subspaces)
+
+    raise ValueError(f"Unknown embedding codec: {name}")
@@ -0,0 +1,199 @@
+import os
+import shutil
+import tarfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+from metrics import metrics
+
+from .tenant import TenantIndex
+
+ARCHIVE_SUFFIX = ".tar.gz"
+# Touched when an index leaves memory, so that idleness survives restarts
+LAST_ACCESS_FILE = ".last_access"
+PERSISTED_FILE = "docstore.json"
+
+
+@dataclass
+class HotIndex:
+    tenant_index: TenantIndex
+    nodes: int
+    last_access: float
+    # Modification time of the persisted index when it was loaded, to notice writes from other processes
+    persisted_mtime: Optional[int]
+
+
+class IndexResidency:
+    """
+    Residency tiers of the indexes.
+
+    - hot: loaded in memory, evicted after `ttl` seconds without access or least recently used first once the hot
+      indexes hold more than `max_nodes` nodes
+    - warm: persisted directory, loaded on the next access
+    - cold: directory idle for `archive_after` seconds, compacted into a single compressed archive which is expanded
+      on the next access
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = 900,
+        max_nodes: Optional[int] = 200_000,
+        archive_after: Optional[float] = None,
+        enabled: bool = True,
+    ):
+        self.ttl = ttl
+        self.max_nodes = max_nodes
+        self.archive_after = archive_after
+        self.enabled = enabled
+
+        # storage path -> hot index, least recently used first
+        self.hot: OrderedDict[str, HotIndex] = OrderedDict()
+
+    @staticmethod
+    def persisted_mtime(storage_path: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(storage_path, PERSISTED_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self, storage_path: str) -> Optional[TenantIndex]:
+        """The hot index of the storage path, None if it is not in memory or went stale"""
+
+        entry = self.hot.get(storage_path)
+        if entry is None:
+            return None
+
+        now = time.monotonic()
+        if self.ttl is not None and now - entry.last_access > self.ttl:
+            self.evict(storage_path, reason="ttl")
+            return None
+        if self.persisted_mtime(storage_path) != entry.persisted_mtime:
+            self.evict(storage_path, reason="stale")
+            return None
+
+        entry.last_access = now
+        self.hot.move_to_end(storage_path)
+        return entry.tenant_index
+
+    def put(self, storage_path: str, tenant_index: TenantIndex):
+        """Keep the index in memory, or refresh it after it was persisted"""
+
+        if not self.enabled:
+            return
+
+        self.hot[storage_path] = HotIndex(
+            tenant_index=tenant_index,
+            nodes=len(tenant_index.index.docstore.docs),
+            last_access=time.monotonic(),
+            persisted_mtime=self.persisted_mtime(storage_path),
+        )
+        self.hot.move_to_end(storage_path)
+
+        # Memory pressure, the index just put is kept even if it is larger than the budget on its own
+        while self.max_nodes is not None and len(self.hot) > 1 and self.hot_nodes() > self.max_nodes:
+            self.evict(next(iter(self.hot)), reason="memory")
+
+        metrics.set_gauge("rag_index_hot_nodes", self.hot_nodes())
+
+    def evict(self, storage_path: str, reason: str = "manual"):
+        """Drop the index from memory, it stays warm on disk"""
+
+        if self.hot.pop(storage_path, None) is None:
+            return
+
+        self.touch(storage_path)
+        metrics.increment("rag_index_evictions_total", reason=reason)
+        metrics.set_gauge("rag_index_hot_nodes", self.hot_nodes())
+
+    def evict_expired(self) -> List[str]:
+        """Evict the hot indexes idle for longer than the ttl, returns their storage paths"""
+
+        if self.ttl is None:
+            return []
+
+        now = time.monotonic()
+        expired = [path for path, entry in self.hot.items() if now - entry.last_access > self.ttl]
+        for storage_path in expired:
+            self.evict(storage_path, reason="ttl")
+        return expired
+
+    def hot_nodes(self) -> int:
+        return sum(entry.nodes for entry in self.hot.values())
+
+    @staticmethod
+    def touch(storage_path: str):
+        if os.path.isdir(storage_path):
+            with open(os.path.join(storage_path, LAST_ACCESS_FILE), "w"):
+                pass
+
+    @staticmethod
+    def last_access(storage_path: str) -> float:
+        """Wall clock time of the last access of a warm index"""
+
+        times = [
+            os.path.getmtime(path)
+            for path in (os.path.join(storage_path, LAST_ACCESS_FILE), os.path.join(storage_path, PERSISTED_FILE))
+            if os.path.exists(path)
+        ]
+        return max(times, default=0.0)
+
+    @staticmethod
+    def is_archived(storage_path: str) -> bool:
+        return os.path.exists(storage_path + ARCHIVE_SUFFIX)
+
+    def idle_storage_paths(self, storage_root: str) -> List[str]:
+        """Warm index directories under the storage root idle for longer than `archive_after`"""
+
+        if self.archive_after is None or not os.path.isdir(storage_root):
+            return []
+
+        return [
+            directory
+            for directory, _, file_names in os.walk(storage_root)
+            if PERSISTED_FILE in file_names and self.is_idle(directory)
+        ]
+
+    def is_idle(self, storage_path: str) -> bool:
+        """Whether the directory is not in memory and was not accessed for `archive_after` seconds"""
+
+        if self.archive_after is None or storage_path in self.hot or not os.path.isdir(storage_path):
+            return False
+        return time.time() - self.last_access(storage_path) > self.archive_after
+
+    @staticmethod
+    def archive(storage_path: str):
+        """Compact the directory into a single compressed archive next to it and remove the directory"""
+
+        with tarfile.open(f"{storage_path}{ARCHIVE_SUFFIX}.tmp", "w:gz") as archive:
+            archive.add(storage_path, arcname=".")
+        os.replace(f"{storage_path}{ARCHIVE_SUFFIX}.tmp", f"{storage_path}{ARCHIVE_SUFFIX}")
+        shutil.rmtree(storage_path)
+
+        metrics.increment("rag_index_archives_total")
+
+    @staticmethod
+    def restore(storage_path: str):
+        """Expand the archive of the directory, if it was archived"""
+
+        archive_path = storage_path + ARCHIVE_SUFFIX
+        if not os.path.exists(archive_path):
+            return
+
+        shutil.rmtree(f"{storage_path}.tmp", ignore_errors=True)
+        with tarfile.open(archive_path, "r:gz") as archive:
+            # The data filter rejects paths escaping the directory, on Pythons which have it
+            if hasattr(tarfile, "data_filter"):
+                archive.extractall(f"{storage_path}.tmp", filter="data")
+            else:
+                archive.extractall(f"{storage_path}.tmp")
+        # Files written since the archive was made, e.g. a new chat session, win over the archived ones
+        if os.path.isdir(storage_path):
+            shutil.copytree(storage_path, f"{storage_path}.tmp", dirs_exist_ok=True)
+            shutil.rmtree(storage_path)
+        os.replace(f"{storage_path}.tmp", storage_path)
+        os.remove(archive_path)
+
+        IndexResidency.touch(storage_path)
+        metrics.increment("rag_index_restores_total")
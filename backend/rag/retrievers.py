@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional, Set
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from .keyword import BM25Index, tokenize
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing the vector hits with the BM25 keyword hits by reciprocal rank fusion.
+
+    Short queries whose terms are all matched by the best keyword hit, e.g. a contact or table name,
+    are answered from the keyword index alone, skipping the query embedding round trip.
+    If `node_ids` is given, both searches only run over those nodes.
+    """
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        keyword_index: BM25Index,
+        similarity_top_k: int = 2,
+        rrf_k: int = 60,
+        keyword_only_max_terms: int = 3,
+        query_embeddings: Optional[Dict[str, List[float]]] = None,
+        node_ids: Optional[Set[str]] = None,
+    ):
+        self._index = index
+        self._keyword_index = keyword_index
+        self._similarity_top_k = similarity_top_k
+        self._rrf_k = rrf_k
+        self._keyword_only_max_terms = keyword_only_max_terms
+        # Query embeddings already computed by the caller, e.g. for the semantic cache lookup
+        self._query_embeddings = query_embeddings or {}
+        self._node_ids = node_ids
+
+        self._vector_retriever = VectorIndexRetriever(
+            index=index,
+            similarity_top_k=similarity_top_k,
+            node_ids=None if node_ids is None else list(node_ids),
+        )
+        super().__init__()
+
+    def _keyword_retrieve(self, query_bundle: QueryBundle):
+        return self._keyword_index.search(query_bundle.query_str, top_k=self._similarity_top_k, node_ids=self._node_ids)
+
+    def _is_keyword_only(self, query_bundle: QueryBundle, keyword_hits: list) -> bool:
+        terms = set(tokenize(query_bundle.query_str))
+        if not keyword_hits or not terms or len(terms) > self._keyword_only_max_terms:
+            return False
+
+        _, _, matched_terms = keyword_hits[0]
+        return matched_terms == len(terms)
+
+    def _prepare_query_bundle(self, query_bundle: QueryBundle):
+        if query_bundle.embedding is None and query_bundle.query_str in self._query_embeddings:
+            query_bundle.embedding = self._query_embeddings[query_bundle.query_str]
+
+    def _keyword_nodes(self, keyword_hits: list) -> List[NodeWithScore]:
+        nodes = self._index.docstore.get_nodes([node_id for node_id, _, _ in keyword_hits])
+        return [NodeWithScore(node=node, score=score) for node, (_, score, _) in zip(nodes, keyword_hits)]
+
+    def _fuse(self, vector_nodes: List[NodeWithScore], keyword_hits: list) -> List[NodeWithScore]:
+        """Reciprocal rank fusion of both result lists"""
+
+        fused_scores: Dict[str, float] = {}
+        nodes_by_id = {}
+        for rank, node_with_score in enumerate(vector_nodes):
+            node_id = node_with_score.node.node_id
+            nodes_by_id[node_id] = node_with_score.node
+            fused_scores[node_id] = fused_scores.get(node_id, 0.0) + 1 / (self._rrf_k + rank + 1)
+
+        keyword_only_ids = [node_id for node_id, _, _ in keyword_hits if node_id not in nodes_by_id]
+        for node in self._index.docstore.get_nodes(keyword_only_ids):
+            nodes_by_id[node.node_id] = node
+        for rank, (node_id, _, _) in enumerate(keyword_hits):
+            fused_scores[node_id] = fused_scores.get(node_id, 0.0) + 1 / (self._rrf_k + rank + 1)
+
+        top_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[: self._similarity_top_k]
+        return [NodeWithScore(node=nodes_by_id[node_id], score=fused_scores[node_id]) for node_id in top_ids]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if self._node_ids is not None and not self._node_ids:
+            return []
+
+        keyword_hits = self._keyword_retrieve(query_bundle)
+        if self._is_keyword_only(query_bundle, keyword_hits):
+            return self._keyword_nodes(keyword_hits)
+
+        self._prepare_query_bundle(query_bundle)
+        vector_nodes = self._vector_retriever.retrieve(query_bundle)
+        return self._fuse(vector_nodes, keyword_hits)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if self._node_ids is not None and not self._node_ids:
+            return []
+
+        keyword_hits = self._keyword_retrieve(query_bundle)
+        if self._is_keyword_only(query_bundle, keyword_hits):
+            return self._keyword_nodes(keyword_hits)
+
+        self._prepare_query_bundle(query_bundle)
+        vector_nodes = await self._vector_retriever.aretrieve(query_bundle)
+        return self._fuse(vector_nodes, keyword_hits)
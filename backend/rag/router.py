@@ -0,0 +1,40 @@
+import re
+
+from llama_index.core.chat_engine.types import ChatMode
+
+# Words that usually mean the question needs several retrieval steps or some reasoning over the results
+MULTI_STEP_PATTERN = re.compile(
+    r"\b("
+    r"compare|comparison|difference|differences|versus|vs|why|how many|count|total|"
+    r"summari[sz]e|analy[sz]e|trend|trends|steps?|then|after that|both|each|across|relationship|explain"
+    r")\b",
+    re.IGNORECASE,
+)
+
+
+class ChatModeRouter:
+    """
+    Cheap rule based router choosing the chat mode for a question.
+
+    Simple lookups go to the fast single-shot mode, multi-step questions keep the ReAct agent.
+    """
+
+    def __init__(self, fast_mode: ChatMode = ChatMode.CONTEXT, max_simple_words: int = 20):
+        self.fast_mode = fast_mode
+        self.max_simple_words = max_simple_words
+
+    def is_multi_step(self, message: str) -> bool:
+        """Whether the question looks like it needs more than one retrieval step"""
+
+        if len(message.split()) > self.max_simple_words:
+            return True
+
+        if message.count("?") > 1:
+            return True
+
+        return MULTI_STEP_PATTERN.search(message) is not None
+
+    def route(self, message: str) -> ChatMode:
+        """Chat mode to answer the question with"""
+
+        return ChatMode.REACT if self.is_multi_step(message) else self.fast_mode
@@ -0,0 +1,204 @@
+"""
+Portable snapshots of a tenant index and of the chat sessions of its user, as a single checksummed archive.
+
+The embeddings are stored as float32 arrays instead of JSON floats, which a replica loads without parsing.
+
+Run from the backend directory, with the server stopped or the tenant idle:
+    $ python -m rag.snapshots export --org-id org_1 --user-id user_1 --output snapshot.tar.gz
+    $ python -m rag.snapshots import snapshot.tar.gz --org-id org_1 --user-id user_1
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zlib
+from typing import Optional
+
+from config import settings
+
+from .residency import LAST_ACCESS_FILE, IndexResidency
+from .vector_stores import JSON_STORE_FILE, CompressedVectorStore
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CHAT_SESSION_PREFIX = "chat_session_"
+
+
+class SnapshotError(Exception):
+    """Invalid or corrupted snapshot archive"""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_files(source_dir: str, target_dir: str, chat_sessions: bool):
+    """Copy the index files, or the chat sessions, of a storage directory"""
+
+    os.makedirs(target_dir, exist_ok=True)
+    if not os.path.isdir(source_dir):
+        return
+
+    for file_name in os.listdir(source_dir):
+        path = os.path.join(source_dir, file_name)
+        if not os.path.isfile(path) or file_name == LAST_ACCESS_FILE:
+            continue
+        if file_name.startswith(CHAT_SESSION_PREFIX) == chat_sessions:
+            shutil.copy2(path, os.path.join(target_dir, file_name))
+
+
+def export_snapshot(storage_path: str, chat_sessions_path: str, output_path: str, metadata: Optional[dict] = None):
+    """
+    Write the index at `storage_path` and the chat sessions at `chat_sessions_path` to a compressed archive
+    Returns the manifest, with the checksum of every file
+    """
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as staging_dir:
+        index_dir = os.path.join(staging_dir, "index")
+        chats_dir = os.path.join(staging_dir, "chats")
+        _copy_files(storage_path, index_dir, chat_sessions=False)
+        _copy_files(chat_sessions_path, chats_dir, chat_sessions=True)
+        # Copies keep their modification time, the staged index must not look idle to the archiving sweep
+        IndexResidency.touch(index_dir)
+
+        # Embeddings persisted as JSON are converted to float32 arrays, lossless for the OpenAI embeddings
+        if os.path.exists(os.path.join(index_dir, JSON_STORE_FILE)):
+            vector_store = CompressedVectorStore.from_persist_dir(index_dir, codec_name="float32")
+            vector_store.persist(os.path.join(index_dir, JSON_STORE_FILE))
+
+        files = {}
+        for directory, _, file_names in os.walk(staging_dir):
+            for file_name in sorted(file_names):
+                path = os.path.join(directory, file_name)
+                files[os.path.relpath(path, staging_dir)] = {
+                    "sha256": file_sha256(path),
+                    "bytes": os.path.getsize(path),
+                }
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": time.time(),
+            **(metadata or {}),
+            "files": files,
+        }
+        with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as file:
+            json.dump(manifest, file, indent=4)
+
+        # Fast compression, the float arrays barely compress and the JSON files compress well at any level
+        with tarfile.open(f"{output_path}.tmp", "w:gz", compresslevel=1) as archive:
+            archive.add(os.path.join(staging_dir, MANIFEST_FILE), arcname=MANIFEST_FILE)
+            for relative_path in files:
+                archive.add(os.path.join(staging_dir, relative_path), arcname=relative_path)
+        os.replace(f"{output_path}.tmp", output_path)
+
+    return manifest
+
+
+def import_snapshot(
+    archive_path: str, storage_path: str, chat_sessions_path: str, expected_metadata: Optional[dict] = None
+) -> dict:
+    """
+    Verify the archive and replace the index at `storage_path` with its index, its chat sessions are added to the ones
+    at `chat_sessions_path`
+    The metadata of the snapshot must match `expected_metadata`, the index ids are derived from the org and user ids
+    Returns the manifest of the archive
+    """
+
+    os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(storage_path)) as staging_dir:
+        try:
+            with tarfile.open(archive_path, "r:gz") as archive:
+                # The data filter rejects paths escaping the directory, on Pythons which have it
+                if hasattr(tarfile, "data_filter"):
+                    archive.extractall(staging_dir, filter="data")
+                else:
+                    archive.extractall(staging_dir)
+        except (tarfile.TarError, EOFError, zlib.error, gzip.BadGzipFile) as e:
+            raise SnapshotError(f"Corrupted archive: {e}")
+        IndexResidency.touch(os.path.join(staging_dir, "index"))
+
+        try:
+            with open(os.path.join(staging_dir, MANIFEST_FILE)) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Missing or invalid manifest: {e}")
+
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {manifest.get('format_version')}")
+        for key, value in (expected_metadata or {}).items():
+            if manifest.get(key) != value:
+                raise SnapshotError(f"Snapshot {key} is {manifest.get(key)}, expected {value}")
+        for relative_path, file_info in manifest["files"].items():
+            path = os.path.join(staging_dir, relative_path)
+            if not os.path.isfile(path) or file_sha256(path) != file_info["sha256"]:
+                raise SnapshotError(f"Checksum mismatch for {relative_path}")
+
+        # Swap the index directory, the chat sessions of a per-user index live in the same directory
+        index_dir = os.path.join(staging_dir, "index")
+        _copy_files(storage_path, index_dir, chat_sessions=True)
+        previous_dir = f"{storage_path}.previous"
+        shutil.rmtree(previous_dir, ignore_errors=True)
+        if os.path.isdir(storage_path):
+            os.replace(storage_path, previous_dir)
+        os.replace(index_dir, storage_path)
+        shutil.rmtree(previous_dir, ignore_errors=True)
+
+        _copy_files(os.path.join(staging_dir, "chats"), chat_sessions_path, chat_sessions=True)
+
+    return manifest
+
+
+def snapshot_metadata(user_id: str, org_id: str) -> dict:
+    """Identity of a snapshot, the index ids and the chat store keys depend on it"""
+
+    return {"org_id": org_id, "user_id": user_id, "index_scope": settings.RAG_INDEX_SCOPE}
+
+
+def main(args: argparse.Namespace):
+    # Imported here, the package imports this module
+    from rag import RAGEngine
+
+    storage_path = RAGEngine.storage_path(args.user_id, args.org_id)
+    chat_sessions_path = RAGEngine.chat_sessions_path(args.user_id, args.org_id)
+    IndexResidency.restore(storage_path)
+    IndexResidency.restore(chat_sessions_path)
+
+    if args.command == "export":
+        manifest = export_snapshot(
+            storage_path,
+            chat_sessions_path,
+            args.output,
+            metadata=snapshot_metadata(args.user_id, args.org_id),
+        )
+        print(f"Exported {len(manifest['files'])} files to {args.output}, sha256 {file_sha256(args.output)}")
+    else:
+        manifest = import_snapshot(
+            args.archive,
+            storage_path,
+            chat_sessions_path,
+            expected_metadata=snapshot_metadata(args.user_id, args.org_id),
+        )
+        print(f"Imported {len(manifest['files'])} files into {storage_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export the index and chat sessions of a user")
+    export_parser.add_argument("--output", required=True, help="Path of the archive to write")
+    import_parser = subparsers.add_parser("import", help="Replace the index of a user with a snapshot")
+    import_parser.add_argument("archive", help="Path of the archive to import")
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument("--org-id", required=True)
+        subparser.add_argument("--user-id", required=True)
+    main(parser.parse_args())
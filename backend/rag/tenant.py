@@ -0,0 +1,92 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import BaseNode, MetadataMode
+
+from .access import AccessIndex
+from .keyword import BM25Index
+from .metadata import INDEXED_METADATA_FIELDS, MetadataIndex
+
+KEYWORD_INDEX_FILE = "keyword_index.json"
+METADATA_INDEX_FILE = "metadata_index.json"
+ACCESS_INDEX_FILE = "access_index.json"
+
+
+@dataclass
+class TenantIndex:
+    """Vector index of a tenant together with the side indexes kept in step with its nodes"""
+
+    index: VectorStoreIndex
+    keyword_index: BM25Index
+    metadata_index: MetadataIndex
+    access_index: AccessIndex
+    persist_dir: str
+
+    @classmethod
+    def load(cls, index: VectorStoreIndex, persist_dir: str, owner_user_id: Optional[str] = None) -> "TenantIndex":
+        """
+        Load the side indexes persisted next to the index
+        Side indexes persisted before they existed are backfilled from the docstore, nodes without an access list
+        are granted to `owner_user_id` if given
+        """
+
+        tenant_index = cls(
+            index=index,
+            keyword_index=BM25Index.from_persist_path(os.path.join(persist_dir, KEYWORD_INDEX_FILE)),
+            metadata_index=MetadataIndex.from_persist_path(os.path.join(persist_dir, METADATA_INDEX_FILE)),
+            access_index=AccessIndex.from_persist_path(os.path.join(persist_dir, ACCESS_INDEX_FILE)),
+            persist_dir=persist_dir,
+        )
+
+        nodes = list(index.docstore.docs.values())
+        if nodes and len(tenant_index.keyword_index) == 0:
+            for node in nodes:
+                tenant_index.keyword_index.add(node.node_id, node.get_content(metadata_mode=MetadataMode.EMBED))
+        # Also rebuilt when fields were added to the indexed ones since it was persisted
+        if nodes and (
+            len(tenant_index.metadata_index) == 0
+            or set(tenant_index.metadata_index.fields) != set(INDEXED_METADATA_FIELDS)
+        ):
+            tenant_index.metadata_index = MetadataIndex()
+            for node in nodes:
+                tenant_index.metadata_index.add(node.node_id, node.metadata)
+        if nodes and len(tenant_index.access_index) == 0 and owner_user_id is not None:
+            tenant_index.access_index.grant(owner_user_id, [node.node_id for node in nodes])
+
+        return tenant_index
+
+    def document_node_ids(self, doc_id: str) -> List[str]:
+        """Ids of the nodes of a document, empty if the document is not in the index"""
+
+        ref_doc_info = self.index.docstore.get_ref_doc_info(doc_id)
+        return [] if ref_doc_info is None else list(ref_doc_info.node_ids)
+
+    def add_nodes(self, nodes: Sequence[BaseNode]):
+        """Index the nodes just inserted into the vector index"""
+
+        for node in nodes:
+            self.keyword_index.add(node.node_id, node.get_content(metadata_mode=MetadataMode.EMBED))
+            self.metadata_index.add(node.node_id, node.metadata)
+
+    def delete_document(self, doc_id: str):
+        """Delete a document and its nodes from the vector index and every side index"""
+
+        node_ids = self.document_node_ids(doc_id)
+        if not node_ids:
+            return
+
+        for node_id in node_ids:
+            self.keyword_index.remove(node_id)
+            self.metadata_index.remove(node_id)
+            self.access_index.remove(node_id)
+        self.index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+    def persist(self):
+        """Save the index and the side indexes to the persist dir"""
+
+        self.index.storage_context.persist(persist_dir=self.persist_dir)
+        self.keyword_index.persist(os.path.join(self.persist_dir, KEYWORD_INDEX_FILE))
+        self.metadata_index.persist(os.path.join(self.persist_dir, METADATA_INDEX_FILE))
+        self.access_index.persist(os.path.join(self.persist_dir, ACCESS_INDEX_FILE))
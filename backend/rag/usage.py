@@ -0,0 +1,40 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Usage fields aggregated per tenant
+USAGE_FIELDS = (
+    "llm_calls",
+    "llm_prompt_tokens",
+    "llm_completion_tokens",
+    "llm_seconds",
+    "embedding_calls",
+    "embedding_tokens",
+    "embedding_seconds",
+)
+
+# (org id, user id) the LLM and embedding calls of the current context are attributed to
+_usage_tenant: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar("usage_tenant", default=None)
+
+
+@contextmanager
+def usage_scope(org_id: str, user_id: str) -> Iterator[None]:
+    """Attribute the LLM and embedding calls made within, and in the tasks created within, to the user and org"""
+
+    token = _usage_tenant.set((org_id, user_id))
+    try:
+        yield
+    finally:
+        _usage_tenant.reset(token)
+
+
+def current_usage_tenant() -> Optional[Tuple[str, str]]:
+    """(org id, user id) of the usage scope of the current context, None outside of any"""
+
+    return _usage_tenant.get()
+
+
+def total_tokens(usage: Dict[str, float]) -> float:
+    """Tokens counted against the budgets, of the LLM prompts and completions and of the embedded texts"""
+
+    return usage.get("llm_prompt_tokens", 0) + usage.get("llm_completion_tokens", 0) + usage.get("embedding_tokens", 0)
@@ -0,0 +1,414 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.indices.query.embedding_utils import get_top_k_embeddings
+from llama_index.core.schema import (
+    BaseNode,
+    NodeRelationship,
+    RelatedNodeInfo,
+    TextNode,
+)
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    DEFAULT_PERSIST_DIR,
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+from .ann import IVFIndex
+from .quantization import EmbeddingCodec, make_codec, truncate
+
+# File SimpleVectorStore persists to, the compressed store files are named after it
+JSON_STORE_FILE = "default__vector_store.json"
+COMPRESSED_STORE_PREFIX = "default__vector_store"
+
+# Embeddings sampled to train the IVF index, and read at once when assigning all the rows
+ANN_TRAINING_ROWS = 50000
+ANN_BATCH_ROWS = 10000
+
+
+class SubsetVectorStore(SimpleVectorStore):
+    """
+    SimpleVectorStore which scores only the requested nodes when a query is restricted to node ids.
+
+    The simple store walks every embedding to apply the restriction, here the embeddings are looked up
+    by id so the cost of a scoped query is proportional to the size of the subset.
+    """
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.node_ids is None or query.filters is not None or query.mode != VectorStoreQueryMode.DEFAULT:
+            return super().query(query, **kwargs)
+
+        node_ids = [node_id for node_id in query.node_ids if node_id in self.data.embedding_dict]
+        if not node_ids:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        top_similarities, top_ids = get_top_k_embeddings(
+            query.query_embedding,
+            [self.data.embedding_dict[node_id] for node_id in node_ids],
+            similarity_top_k=query.similarity_top_k,
+            embedding_ids=node_ids,
+        )
+        return VectorStoreQueryResult(similarities=top_similarities, ids=top_ids)
+
+
+class CompressedVectorStore(BasePydanticVectorStore):
+    """
+    Vector store keeping the embeddings truncated to `dimensions` and encoded by a quantization codec.
+
+    Queries score the codes, then re-rank `rerank_oversample` times the requested candidates against float16 copies
+    of the truncated embeddings. The float16 copies are memory mapped from disk once persisted, so only the codes
+    stay resident. Texts live in the docstore, the store only keeps node and document ids.
+
+    Once the store holds `ann_min_nodes` embeddings, queries only score the candidates of an IVF index.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+
+    codec_name: str = "int8"
+    dimensions: Optional[int] = None
+    rerank: bool = True
+    rerank_oversample: int = 4
+    pq_subspaces: int = 16
+    ann_min_nodes: Optional[int] = None
+    ann_probes: int = 32
+
+    _codec: Optional[EmbeddingCodec] = PrivateAttr(default=None)
+    _node_ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[str] = PrivateAttr(default_factory=list)
+    _rows: Dict[str, int] = PrivateAttr(default_factory=dict)
+    # Rows of every document, including the rows of its nodes added again since, so that deletes skip the other rows
+    _doc_rows: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+    _alive: np.ndarray = PrivateAttr(default_factory=lambda: np.zeros(0, dtype=bool))
+    _codes: Optional[np.ndarray] = PrivateAttr(default=None)
+    # Float16 embeddings persisted to disk, memory mapped, followed by the ones added since
+    _mapped_vectors: Optional[np.ndarray] = PrivateAttr(default=None)
+    _new_vectors: List[np.ndarray] = PrivateAttr(default_factory=list)
+    # Number of embeddings the codec was last fitted on
+    _fitted_count: int = PrivateAttr(default=0)
+    _ann: Optional[IVFIndex] = PrivateAttr(default=None)
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def __bool__(self) -> bool:
+        # An empty store is still a store, StorageContext.from_defaults replaces falsy ones with a SimpleVectorStore
+        return True
+
+    def _index_rows(self):
+        """Rebuild the rows of the nodes and documents from their ids"""
+
+        self._rows = {node_id: row for row, node_id in enumerate(self._node_ids)}
+        doc_rows: Dict[str, List[int]] = {}
+        for row, ref_doc_id in enumerate(self._ref_doc_ids):
+            doc_rows.setdefault(ref_doc_id, []).append(row)
+        self._doc_rows = doc_rows
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Float32 embeddings of the rows"""
+
+        mapped_count = 0 if self._mapped_vectors is None else len(self._mapped_vectors)
+        if not self._new_vectors:
+            # An empty store has no embeddings to map yet
+            if self._mapped_vectors is None:
+                return np.zeros((len(rows), self.dimensions or 0), dtype=np.float32)
+            return np.asarray(self._mapped_vectors[rows], dtype=np.float32)
+
+        new_vectors = np.concatenate(self._new_vectors)
+        self._new_vectors = [new_vectors]
+        vectors = np.empty((len(rows), new_vectors.shape[1]), dtype=np.float32)
+        mapped = rows < mapped_count
+        if mapped.any():
+            vectors[mapped] = self._mapped_vectors[rows[mapped]]
+        vectors[~mapped] = new_vectors[rows[~mapped] - mapped_count]
+        return vectors
+
+    def _fit(self):
+        """(Re)fit the codec on the stored embeddings and re-encode all of them"""
+
+        rows = np.arange(len(self._node_ids))
+        vectors = self._vectors(rows)
+        self._codec.fit(vectors[self._alive] if self._alive.any() else vectors)
+        self._codes = self._codec.encode(vectors)
+        self._fitted_count = max(1, int(self._alive.sum()))
+
+    def _update_ann(self, vectors: Optional[np.ndarray] = None):
+        """
+        Build the IVF index once the store reaches `ann_min_nodes` embeddings and retrain it once the store has grown
+        four times, otherwise assign the rows just added for `vectors`
+        """
+
+        if self.ann_min_nodes is None or len(self) < self.ann_min_nodes:
+            self._ann = None
+            return
+
+        if self._ann is not None and len(self) <= 4 * self._ann.trained_count:
+            if vectors is not None:
+                self._ann.add(vectors)
+            return
+
+        alive_rows = np.flatnonzero(self._alive)
+        sample_rows = np.random.default_rng(0).choice(
+            alive_rows, min(len(alive_rows), ANN_TRAINING_ROWS), replace=False
+        )
+        ann = IVFIndex()
+        ann.train(self._vectors(np.sort(sample_rows)), count=len(alive_rows))
+        for start in range(0, len(self._node_ids), ANN_BATCH_ROWS):
+            ann.add(self._vectors(np.arange(start, min(start + ANN_BATCH_ROWS, len(self._node_ids)))))
+        self._ann = ann
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        if self.dimensions is None or self.dimensions > vectors.shape[1]:
+            self.dimensions = vectors.shape[1]
+        vectors = truncate(vectors, self.dimensions)
+        if self._codec is None:
+            self._codec = make_codec(self.codec_name, self.dimensions, pq_subspaces=self.pq_subspaces)
+
+        for node in nodes:
+            if node.node_id in self._rows:
+                self._alive[self._rows[node.node_id]] = False
+            row = len(self._node_ids)
+            self._rows[node.node_id] = row
+            self._node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id or "")
+            self._doc_rows.setdefault(node.ref_doc_id or "", []).append(row)
+        self._alive = np.concatenate([self._alive, np.ones(len(nodes), dtype=bool)])
+        self._new_vectors.append(vectors.astype(np.float16))
+
+        # Codecs learnt on few embeddings are refitted once the store has grown four times
+        if not self._codec.is_fitted or len(self) > 4 * self._fitted_count:
+            self._fit()
+        else:
+            self._codes = np.concatenate([self._codes, self._codec.encode(vectors)])
+        self._update_ann(vectors)
+
+        return [node.node_id for node in nodes]
+
+    def add_from_simple_store(self, vector_store: SimpleVectorStore):
+        """Add the embeddings of a SimpleVectorStore"""
+
+        data = vector_store.data
+        self.add(
+            [
+                TextNode(
+                    id_=node_id,
+                    embedding=embedding,
+                    relationships=(
+                        {NodeRelationship.SOURCE: RelatedNodeInfo(node_id=data.text_id_to_ref_doc_id[node_id])}
+                        if data.text_id_to_ref_doc_id.get(node_id)
+                        else {}
+                    ),
+                )
+                for node_id, embedding in data.embedding_dict.items()
+            ]
+        )
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        # Private attributes are bound once, every access goes through pydantic
+        alive, rows, node_ids = self._alive, self._rows, self._node_ids
+        for row in self._doc_rows.pop(ref_doc_id, []):
+            if alive[row]:
+                alive[row] = False
+                del rows[node_ids[row]]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None or query.mode != VectorStoreQueryMode.DEFAULT:
+            raise NotImplementedError("CompressedVectorStore only supports default queries without metadata filters")
+
+        if query.node_ids is None:
+            rows = np.flatnonzero(self._alive)
+        else:
+            node_rows = self._rows
+            rows = np.asarray([node_rows[node_id] for node_id in query.node_ids if node_id in node_rows], dtype=int)
+        if len(rows) == 0 or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        query_embedding = truncate(np.asarray(query.query_embedding), self.dimensions)
+        top_k = min(query.similarity_top_k, len(rows))
+
+        # Float32 codes are exact, there is nothing to re-rank
+        rerank = self.rerank and self.codec_name != "float32"
+        candidates_count = min(top_k * self.rerank_oversample if rerank else top_k, len(rows))
+
+        if self._ann is not None and self.ann_min_nodes is not None and len(rows) >= self.ann_min_nodes:
+            ann_rows = self._ann.search(query_embedding, probes=self.ann_probes)
+            if query.node_ids is None:
+                ann_rows = ann_rows[self._alive[ann_rows]]
+            else:
+                requested = np.zeros(len(self._node_ids), dtype=bool)
+                requested[rows] = True
+                ann_rows = ann_rows[requested[ann_rows]]
+            # Subsets with too few rows in the probed clusters are scored exactly
+            if len(ann_rows) >= candidates_count:
+                rows = ann_rows
+
+        # Scoring every row avoids copying the codes
+        full_scan = query.node_ids is None and len(rows) == len(self._codes)
+        codes = self._codes if full_scan else self._codes[rows]
+        scores = self._codec.score(codes, query_embedding)
+        candidates = np.argpartition(-scores, candidates_count - 1)[:candidates_count]
+        rows, scores = rows[candidates], scores[candidates]
+
+        if rerank:
+            scores = self._vectors(rows) @ query_embedding
+
+        order = np.argsort(-scores)[:top_k]
+        return VectorStoreQueryResult(
+            similarities=[float(score) for score in scores[order]],
+            ids=[self._node_ids[row] for row in rows[order]],
+        )
+
+    def memory_bytes(self) -> int:
+        """Bytes resident in memory for the embeddings, excluding the memory mapped float16 copies"""
+
+        codes_bytes = 0 if self._codes is None else self._codes.nbytes
+        return codes_bytes + sum(vectors.nbytes for vectors in self._new_vectors)
+
+    def persist(
+        self, persist_path: str = os.path.join(DEFAULT_PERSIST_DIR, JSON_STORE_FILE), fs: Optional[Any] = None
+    ) -> None:
+        """
+        Save the codes, the float16 embeddings and the codec next to `persist_path`, dropping deleted rows.
+        The JSON store previously persisted at `persist_path` is removed.
+        """
+
+        persist_dir = os.path.dirname(persist_path)
+        prefix = os.path.join(persist_dir, COMPRESSED_STORE_PREFIX)
+        os.makedirs(persist_dir, exist_ok=True)
+
+        alive_rows = np.flatnonzero(self._alive)
+        vectors = self._vectors(alive_rows).astype(np.float16)
+        self._node_ids = [self._node_ids[row] for row in alive_rows]
+        self._ref_doc_ids = [self._ref_doc_ids[row] for row in alive_rows]
+        self._index_rows()
+        self._alive = np.ones(len(alive_rows), dtype=bool)
+        if self._codes is not None:
+            self._codes = self._codes[alive_rows]
+        if self._ann is not None:
+            self._ann.compact(alive_rows)
+
+        # Written aside and renamed, the previous files may still be memory mapped
+        def save_array(path: str, array: np.ndarray):
+            with open(f"{path}.tmp", "wb") as file:
+                np.save(file, array)
+            os.replace(f"{path}.tmp", path)
+
+        save_array(f"{prefix}.vectors.npy", vectors)
+        if self._codes is not None:
+            save_array(f"{prefix}.codes.npy", self._codes)
+        if self._codec is not None:
+            with open(f"{prefix}.codec.npz.tmp", "wb") as file:
+                np.savez(file, **self._codec.state())
+            os.replace(f"{prefix}.codec.npz.tmp", f"{prefix}.codec.npz")
+        if self._ann is not None:
+            with open(f"{prefix}.ivf.npz.tmp", "wb") as file:
+                np.savez(file, **self._ann.state())
+            os.replace(f"{prefix}.ivf.npz.tmp", f"{prefix}.ivf.npz")
+        elif os.path.exists(f"{prefix}.ivf.npz"):
+            os.remove(f"{prefix}.ivf.npz")
+
+        with open(f"{prefix}.meta.json.tmp", "w") as file:
+            json.dump(
+                {
+                    "codec": self.codec_name,
+                    "dimensions": self.dimensions,
+                    "pq_subspaces": self.pq_subspaces,
+                    "fitted_count": self._fitted_count,
+                    "node_ids": self._node_ids,
+                    "ref_doc_ids": self._ref_doc_ids,
+                },
+                file,
+            )
+        os.replace(f"{prefix}.meta.json.tmp", f"{prefix}.meta.json")
+
+        if os.path.exists(persist_path):
+            os.remove(persist_path)
+
+        self._mapped_vectors = np.load(f"{prefix}.vectors.npy", mmap_mode="r")
+        self._new_vectors = []
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        """Whether a compressed store was persisted in the directory"""
+
+        return os.path.exists(os.path.join(persist_dir, f"{COMPRESSED_STORE_PREFIX}.meta.json"))
+
+    @classmethod
+    def from_persist_dir(
+        cls,
+        persist_dir: str,
+        codec_name: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        rerank: bool = True,
+        rerank_oversample: int = 4,
+        pq_subspaces: int = 16,
+        ann_min_nodes: Optional[int] = None,
+        ann_probes: int = 32,
+    ) -> "CompressedVectorStore":
+        """
+        Load the store persisted in the directory.
+
+        A JSON store persisted by SimpleVectorStore is converted, with int8 codes unless `codec_name` is given.
+        A compressed store keeps the dimensions it was persisted with, and is re-encoded if `codec_name` changed.
+        """
+
+        store = cls(
+            codec_name=codec_name or "int8",
+            dimensions=dimensions,
+            rerank=rerank,
+            rerank_oversample=rerank_oversample,
+            pq_subspaces=pq_subspaces,
+            ann_min_nodes=ann_min_nodes,
+            ann_probes=ann_probes,
+        )
+        prefix = os.path.join(persist_dir, COMPRESSED_STORE_PREFIX)
+
+        if not cls.exists(persist_dir):
+            legacy_path = os.path.join(persist_dir, JSON_STORE_FILE)
+            if os.path.exists(legacy_path):
+                store.add_from_simple_store(SimpleVectorStore.from_persist_path(legacy_path))
+            return store
+
+        with open(f"{prefix}.meta.json") as file:
+            data = json.load(file)
+
+        store.codec_name = codec_name or data["codec"]
+        store.dimensions = data["dimensions"]
+        store._node_ids = data["node_ids"]
+        store._ref_doc_ids = data["ref_doc_ids"]
+        store._index_rows()
+        store._alive = np.ones(len(store._node_ids), dtype=bool)
+        store._fitted_count = data["fitted_count"]
+        if not store._node_ids:
+            return store
+
+        store._mapped_vectors = np.load(f"{prefix}.vectors.npy", mmap_mode="r")
+        store._codec = make_codec(store.codec_name, store.dimensions, pq_subspaces=pq_subspaces)
+        if store.codec_name == data["codec"] and pq_subspaces == data["pq_subspaces"]:
+            store._codes = np.load(f"{prefix}.codes.npy")
+            with np.load(f"{prefix}.codec.npz") as state:
+                store._codec.load_state(dict(state))
+        else:
+            store._fit()
+
+        if ann_min_nodes is not None and os.path.exists(f"{prefix}.ivf.npz"):
+            store._ann = IVFIndex()
+            with np.load(f"{prefix}.ivf.npz") as state:
+                store._ann.load_state(dict(state))
+        store._update_ann()
+
+        return store
@@ -1,4 +1,4 @@
-from typing import Optional, Union
+from typing import Dict, List, Optional, Set, Union
 
 import redis.asyncio as redis
 from kombu.utils.url import safequote
@@ -26,6 +26,107 @@ class RedisRepository:
         if expire:
             await self.redis_client.expire(key, expire)
 
+    async def add_if_absent(self, key: str, value: Union[str, bytes], expire: Optional[int] = None) -> bool:
+        """Add a key-value pair to Redis unless the key exists, returns whether it was added."""
+
+        return bool(await self.redis_client.set(key, value, nx=True, ex=expire))
+
+    async def add_ranked(self, key: str, member: str, score: float, expire_before: float) -> int:
+        """
+        Add a member to a sorted set after removing the members scored below `expire_before`, returns the rank of the
+        member in one round trip.
+        """
+
+        async with self.redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.zremrangebyscore(key, "-inf", f"({expire_before}")
+            pipeline.zadd(key, {member: score})
+            pipeline.zrank(key, member)
+            pipeline.expireat(key, int(score) + 1)
+            *_, rank, _ = await pipeline.execute()
+
+        return rank
+
+    async def remove_ranked(self, key: str, member: str):
+        """Remove a member from a sorted set."""
+
+        await self.redis_client.zrem(key, member)
+
+    async def add_list(self, key: str, values: List[Union[str, bytes]], expire: Optional[int] = None):
+        """Replace a list in Redis with the values."""
+
+        async with self.redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.delete(key)
+            if values:
+                pipeline.rpush(key, *values)
+            if expire:
+                pipeline.expire(key, expire)
+            await pipeline.execute()
+
+    async def get_list_range(self, key: str, start: int, end: int) -> List[bytes]:
+        """Retrieve the values of a list from `start` to `end` included."""
+
+        return await self.redis_client.lrange(key, start, end)
+
+    async def get_list_values(self, key: str, indexes: List[int]) -> List[Optional[bytes]]:
+        """Retrieve the values at the indexes of a list in one round trip."""
+
+        async with self.redis_client.pipeline(transaction=False) as pipeline:
+            for index in indexes:
+                pipeline.lindex(key, index)
+            return await pipeline.execute()
+
+    async def get_list_length(self, key: str) -> int:
+        """Length of a list, 0 if it does not exist."""
+
+        return await self.redis_client.llen(key)
+
+    async def add_to_set(self, key: str, members: List[str], expire: Optional[int] = None):
+        """Add the members to a set in Redis"""
+
+        if not members:
+            return
+
+        async with self.redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.sadd(key, *members)
+            if expire:
+                pipeline.expire(key, expire)
+            await pipeline.execute()
+
+    async def remove_from_set(self, key: str, member: str):
+        """Remove a member from a set in Redis"""
+
+        await self.redis_client.srem(key, member)
+
+    async def get_set_members(self, key: str) -> Set[bytes]:
+        """Members of a set, empty if it does not exist"""
+
+        return await self.redis_client.smembers(key)
+
+    async def pop_set(self, key: str) -> Set[bytes]:
+        """Members of a set, which is deleted atomically"""
+
+        async with self.redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.smembers(key)
+            pipeline.delete(key)
+            members, _ = await pipeline.execute()
+        return members
+
+    async def increment_hashes(self, values_by_key: Dict[str, Dict[str, float]], expire: Optional[int] = None):
+        """Increment fields of hashes in Redis, created if they do not exist, all of them or none in one transaction"""
+
+        async with self.redis_client.pipeline(transaction=True) as pipeline:
+            for key, values in values_by_key.items():
+                for field, value in values.items():
+                    pipeline.hincrbyfloat(key, field, value)
+                if expire:
+                    pipeline.expire(key, expire)
+            await pipeline.execute()
+
+    async def get_hash(self, key: str) -> Dict[bytes, bytes]:
+        """Fields of a hash, empty if it does not exist"""
+
+        return await self.redis_client.hgetall(key)
+
     async def get(self, key: str) -> Optional[str]:
         """Retrieve a value from Redis by key."""
 
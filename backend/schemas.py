@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -21,6 +21,50 @@ class IntegrationItem(BaseModel):
     visibility: Optional[bool] = True
 
 
+class IntegrationItemPage(BaseModel):
+    """Page of a result set of items, `next_cursor` is None on the last page"""
+
+    items: List[IntegrationItem]
+    next_cursor: Optional[str] = None
+    total: int
+
+
+class IntegrationLoadReport(BaseModel):
+    """Outcome of one integration in a load of all the integrations"""
+
+    integration_type: str
+    connected: bool
+    items: int = 0
+    fetch_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class AllIntegrationsItems(BaseModel):
+    """Items of every connected integration, indexed together in `index_seconds`"""
+
+    items: Dict[str, List[IntegrationItem]]
+    integrations: List[IntegrationLoadReport]
+    index_seconds: Optional[float] = None
+
+
 class ChatMessage(BaseModel):
     message: str
     role: str = "ASSISTANT"
+
+
+class BatchChatResult(BaseModel):
+    """Answer to the question at `index` of a batch, or the error it failed with"""
+
+    index: int
+    question: str
+    message: Optional[str] = None
+    role: str = "ASSISTANT"
+    error: Optional[str] = None
+
+
+class ChatScope(BaseModel):
+    """Restricts a chat to the items matching every given field"""
+
+    integration_type: Optional[str] = None
+    parent_id: Optional[str] = None
+    type: Optional[str] = None
@@ -1,9 +1,21 @@
 from .ai import AIService
-from .integrations import AirtableService, HubspotService, NotionService
+from .integrations import (
+    AirtableService,
+    CombinedIntegrationService,
+    HubspotService,
+    NotionService,
+)
+from .profiles import ProfileService
+from .snapshots import SnapshotService
+from .usage import UsageService
 
 __all__ = [
     "AIService",
     "AirtableService",
+    "CombinedIntegrationService",
     "HubspotService",
     "NotionService",
+    "ProfileService",
+    "SnapshotService",
+    "UsageService",
 ]
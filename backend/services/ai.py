@@ -1,13 +1,73 @@
-from rag import RAGEngine
-from schemas import ChatMessage
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
+
+from schemas import BatchChatResult, ChatMessage, ChatScope
+
+from .usage import UsageService
+
+if TYPE_CHECKING:
+    from llama_index.core.chat_engine.types import ChatMode
+
+    from rag import RAGEngine
 
 
 class AIService:
-    def __init__(self, rag_engine: RAGEngine):
+    def __init__(self, rag_engine: "RAGEngine", usage_service: Optional[UsageService] = None):
         self.rag_engine = rag_engine
+        self.usage_service = usage_service
+
+    async def _budget_chat_mode(self, user_id: str, org_id: str) -> Optional["ChatMode"]:
+        """Chat mode forced by the token budgets, the fast mode over a soft budget, None to route the message"""
+
+        if self.usage_service is None or not await self.usage_service.enforce_budget(user_id=user_id, org_id=org_id):
+            return None
 
-    async def chat(self, user_id: str, org_id: str, chat_session_id: str, message: str):
-        message = await self.rag_engine.chat(
-            user_id=user_id, org_id=org_id, chat_session_id=chat_session_id, message=message
-        )
+        return self.rag_engine.chat_mode_router.fast_mode
+
+    async def _flush_usage(self):
+        if self.usage_service is not None:
+            await self.usage_service.flush()
+
+    async def chat(
+        self, user_id: str, org_id: str, chat_session_id: str, message: str, scope: Optional[ChatScope] = None
+    ):
+        chat_mode = await self._budget_chat_mode(user_id=user_id, org_id=org_id)
+        try:
+            message = await self.rag_engine.chat(
+                user_id=user_id,
+                org_id=org_id,
+                chat_session_id=chat_session_id,
+                message=message,
+                chat_mode=chat_mode,
+                filters=scope.model_dump(exclude_none=True) if scope else None,
+            )
+        finally:
+            await self._flush_usage()
         return ChatMessage(message=message.response, role="ASSISTANT")
+
+    async def chat_batch(
+        self, user_id: str, org_id: str, messages: List[str], scope: Optional[ChatScope] = None
+    ) -> AsyncIterator[BatchChatResult]:
+        """
+        Answer the questions against one load of the index, in the order they complete
+        The budgets are checked before the answers are streamed, so that a rejected batch gets its status code
+        """
+
+        chat_mode = await self._budget_chat_mode(user_id=user_id, org_id=org_id)
+
+        async def results() -> AsyncIterator[BatchChatResult]:
+            try:
+                async for index, response in self.rag_engine.chat_batch(
+                    user_id=user_id,
+                    org_id=org_id,
+                    messages=messages,
+                    filters=scope.model_dump(exclude_none=True) if scope else None,
+                    chat_mode=chat_mode,
+                ):
+                    if isinstance(response, Exception):
+                        yield BatchChatResult(index=index, question=messages[index], error=str(response))
+                    else:
+                        yield BatchChatResult(index=index, question=messages[index], message=response.response)
+            finally:
+                await self._flush_usage()
+
+        return results()
@@ -1,9 +1,11 @@
 from .airtable import AirtableService
+from .combined import CombinedIntegrationService
 from .hubspot import HubspotService
 from .notion import NotionService
 
 __all__ = [
     "AirtableService",
+    "CombinedIntegrationService",
     "HubspotService",
     "NotionService",
 ]
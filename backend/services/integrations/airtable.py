@@ -19,6 +19,8 @@ from .base import BaseIntegrationService
 class AirtableService(BaseIntegrationService):
     """Airtable integration service inherits from BaseIntegrationService"""
 
+    integration_type = "Airtable"
+
     async def authorize(self, user_id: str, org_id: str) -> str:
         """Authorize the user to access the Airtable API"""
 
@@ -89,9 +91,7 @@ class AirtableService(BaseIntegrationService):
                 self.redis_repository.delete(f"airtable_verifier:{org_id}:{user_id}"),
             )
 
-        await self.redis_repository.add(
-            f"airtable_credentials:{org_id}:{user_id}", json.dumps(response.json()), expire=600
-        )
+        await self.save_credentials(user_id, org_id, response.json())
 
         close_window_script = """
         <html>
@@ -103,16 +103,27 @@ class AirtableService(BaseIntegrationService):
 
         return HTMLResponse(content=close_window_script)
 
-    async def get_credentials(self, user_id: str, org_id: str) -> Any:
-        """Get the Airtable credentials for the user"""
+    async def refresh_credentials(self, credentials: dict) -> dict:
+        """Exchange the refresh token for a new access token, Airtable rotates the refresh token as well"""
 
-        credentials = await self.redis_repository.get(f"airtable_credentials:{org_id}:{user_id}")
-        if not credentials:
-            raise HTTPException(status_code=400, detail="No credentials found.")
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{settings.AIRTABLE_OAUTH_URL}/token",
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": credentials["refresh_token"],
+                    "client_id": self.client_id,
+                },
+                headers={
+                    "Authorization": f"Basic {self.encoded_client_id_secret}",
+                    "Content-Type": "application/x-www-form-urlencoded",
+                },
+            )
+            response.raise_for_status()
 
-        return json.loads(credentials)
+        return response.json()
 
-    async def get_items(self, user_id: str, org_id: str) -> List[IntegrationItem]:
+    async def get_items(self, user_id: str, org_id: str, add_to_rag: bool = True) -> List[IntegrationItem]:
         """Fetch the items from the Airtable API"""
 
         credentials = await self.get_credentials(user_id, org_id)
@@ -147,13 +158,13 @@ class AirtableService(BaseIntegrationService):
         rich_print_json(items_json, "Airtable Integration Items")
 
         # Add the items to the RAG engine in a coroutine without blocking the main thread
-        if self.rag_engine is not None:
+        if add_to_rag and self.rag_engine is not None:
             asyncio.create_task(
                 self.add_integration_items_to_rag(
                     user_id=user_id,
                     org_id=org_id,
-                    items_json=items_json,
-                    integration_type="Airtable",
+                    items=list_of_integration_item_metadata,
+                    integration_type=self.integration_type,
                 )
             )
 
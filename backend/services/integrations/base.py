@@ -1,18 +1,40 @@
 import base64
+import copy
+import json
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 
-from fastapi import Request
+from fastapi import HTTPException, Request
 from fastapi.responses import HTMLResponse
+from pydantic import TypeAdapter
 
-from rag import RAGEngine
+from config import settings
 from repositories.redis import RedisRepository
-from schemas import IntegrationItem
+from schemas import IntegrationItem, IntegrationItemPage
+from singleflight import single_flight
+
+from .credentials import credential_store
+from .pagination import ItemResultSets
+from .webhooks import webhook_sync
+
+if TYPE_CHECKING:
+    from rag import RAGEngine
+
+    from ..usage import UsageService
+
+IntegrationItemsAdapter = TypeAdapter(List[IntegrationItem])
+
+
+def _redis_repository() -> RedisRepository:
+    return RedisRepository(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
 
 
 class BaseIntegrationService(ABC):
     """Base integration service class"""
 
+    # Name of the integration in the RAG metadata, e.g. to scope a chat
+    integration_type: str
+
     def __init__(
         self,
         redis_repository: RedisRepository,
@@ -21,7 +43,8 @@ class BaseIntegrationService(ABC):
         client_secret: str,
         redirect_uri: str,
         scopes: Optional[str] = None,
-        rag_engine: Optional[RAGEngine] = None,
+        rag_engine: Optional["RAGEngine"] = None,
+        usage_service: Optional["UsageService"] = None,
     ):
         # Initialize the client id and secret
         self.client_id = client_id
@@ -47,8 +70,14 @@ class BaseIntegrationService(ABC):
         # Initialize the redis client
         self.redis_repository = redis_repository
 
-        # Initialize the RAG engine
+        # Initialize the RAG engine, and the token usage of its ingestion
         self.rag_engine = rag_engine
+        self.usage_service = usage_service
+
+        # Initialize the paged result sets of the loaded items
+        self.result_sets = ItemResultSets(
+            redis_repository, ttl=settings.ITEMS_RESULT_SET_TTL, max_page_size=settings.ITEMS_MAX_PAGE_SIZE
+        )
 
     @abstractmethod
     async def authorize(self, user_id: str, org_id: str) -> str:
@@ -58,19 +87,152 @@ class BaseIntegrationService(ABC):
     async def oauth2callback(self, request: Request) -> HTMLResponse:
         pass
 
-    @abstractmethod
-    async def get_credentials(self, user_id: str, org_id: str) -> Any:
-        pass
+    async def get_credentials(self, user_id: str, org_id: str) -> dict:
+        """Credentials of the user, cached in the process, with their access token refreshed before it expires"""
+
+        return await credential_store.get(self, user_id, org_id)
+
+    async def save_credentials(self, user_id: str, org_id: str, token_response: dict):
+        """Store the token response of the OAuth flow of the user"""
+
+        await credential_store.save(self, user_id, org_id, token_response)
+
+    async def refresh_credentials(self, credentials: dict) -> dict:
+        """
+        Token response of the provider for the refresh token of the credentials
+        Raises an httpx.HTTPStatusError with a 400 or 401 status if the provider rejects the refresh token
+        """
+
+        raise NotImplementedError(f"{self.integration_type} credentials cannot be refreshed.")
 
     @abstractmethod
-    async def get_items(self, user_id: str, org_id: str) -> List[IntegrationItem]:
-        pass
+    async def get_items(self, user_id: str, org_id: str, add_to_rag: bool = True) -> List[IntegrationItem]:
+        """Fetch the items, and unless `add_to_rag` is false add them to the RAG engine in the background"""
+
+    async def load_items(self, user_id: str, org_id: str) -> List[IntegrationItem]:
+        """
+        Get the items, concurrent loads of the same user and org share one crawl of the provider API and one RAG
+        ingestion
+        """
+
+        await self.enforce_budget(user_id, org_id)
+        return await single_flight.do(
+            f"{type(self).__name__}_items:{org_id}:{user_id}",
+            lambda: self.get_items(user_id=user_id, org_id=org_id),
+            redis_repository=self.redis_repository if settings.SINGLE_FLIGHT == "redis" else None,
+            serialize=IntegrationItemsAdapter.dump_json,
+            deserialize=IntegrationItemsAdapter.validate_json,
+            kind="integration_items",
+        )
+
+    def _result_sets_namespace(self, user_id: str, org_id: str) -> str:
+        return f"integration_items:{org_id}:{user_id}:{type(self).__name__}"
+
+    async def load_items_page(
+        self,
+        user_id: str,
+        org_id: str,
+        page_size: int,
+        sort: Optional[str] = None,
+        item_type: Optional[str] = None,
+        parent_id: Optional[str] = None,
+    ) -> IntegrationItemPage:
+        """Load the items into a result set and return its first page, the next pages are read with `get_items_page`"""
+
+        items = await self.load_items(user_id=user_id, org_id=org_id)
+        return await self.result_sets.create(
+            self._result_sets_namespace(user_id, org_id),
+            items,
+            page_size=page_size,
+            sort=sort,
+            item_type=item_type,
+            parent_id=parent_id,
+        )
 
-    async def add_integration_items_to_rag(self, user_id: str, org_id: str, items_json: str, integration_type: str):
-        """Add the items to the RAG engine"""
+    async def get_items_page(self, user_id: str, org_id: str, cursor: str) -> IntegrationItemPage:
+        """Page of a result set of the user at the cursor"""
+
+        return await self.result_sets.next_page(self._result_sets_namespace(user_id, org_id), cursor)
+
+    # Webhooks, implemented by the integrations pushing their changes
+
+    async def get_webhook_account_id(self, user_id: str, org_id: str) -> str:
+        """Id of the account of the user the webhook events are sent for, e.g. a HubSpot portal"""
+
+        raise HTTPException(status_code=404, detail=f"{self.integration_type} webhooks are not supported.")
+
+    def verify_webhook_signature(self, request: Request, body: bytes):
+        """Raise a 401 unless the webhook request is signed by the integration"""
+
+        raise HTTPException(status_code=404, detail=f"{self.integration_type} webhooks are not supported.")
+
+    def parse_webhook_events(self, payload: Any) -> Dict[str, Set[str]]:
+        """Keys of the objects changed per account, e.g. `contact:123`"""
+
+        raise HTTPException(status_code=404, detail=f"{self.integration_type} webhooks are not supported.")
+
+    async def get_changed_items(
+        self, user_id: str, org_id: str, object_keys: List[str]
+    ) -> Tuple[List[IntegrationItem], List[dict]]:
+        """
+        Fetch the current items of the changed objects, with the filters matching the items they replace
+        Objects which were deleted have no items, so their previous items are removed
+        """
+
+        raise HTTPException(status_code=404, detail=f"{self.integration_type} webhooks are not supported.")
+
+    async def subscribe_webhooks(self, user_id: str, org_id: str) -> dict:
+        """Sync the changes pushed by the webhooks of the account of the user into their index"""
+
+        account_id = await self.get_webhook_account_id(user_id, org_id)
+        await webhook_sync.subscribe(self.redis_repository, self.integration_type, account_id, user_id, org_id)
+        return {"account_id": account_id}
+
+    async def unsubscribe_webhooks(self, user_id: str, org_id: str) -> dict:
+        account_id = await self.get_webhook_account_id(user_id, org_id)
+        await webhook_sync.unsubscribe(self.redis_repository, self.integration_type, account_id, user_id, org_id)
+        return {"account_id": account_id}
+
+    async def receive_webhook(self, request: Request) -> dict:
+        """Verify a webhook request and queue its changed objects, they are synced once the burst is over"""
+
+        body = await request.body()
+        self.verify_webhook_signature(request, body)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid webhook payload.")
+
+        changes = self.parse_webhook_events(payload)
+        for account_id, object_keys in changes.items():
+            await webhook_sync.enqueue(self, account_id, object_keys)
+
+        return {"accepted": sum(len(object_keys) for object_keys in changes.values())}
+
+    async def enforce_budget(self, user_id: str, org_id: str):
+        """Raise a 429 if the org or the user is over its hard token budget, the ingestion of a load embeds its items"""
+
+        if self.usage_service is not None and self.rag_engine is not None:
+            await self.usage_service.enforce_budget(user_id=user_id, org_id=org_id)
+
+    async def add_integration_items_to_rag(
+        self, user_id: str, org_id: str, items: List[IntegrationItem], integration_type: str
+    ):
+        """Add the items to the RAG engine, in the background of the load"""
         if self.rag_engine is None:
             return
 
-        metadata = {"integration_type": integration_type}
-
-        await self.rag_engine.add_data(user_id=user_id, org_id=org_id, data=items_json, metadata=metadata)
+        try:
+            await self.rag_engine.add_integration_items(
+                user_id=user_id, org_id=org_id, items=items, integration_type=integration_type
+            )
+        finally:
+            # The embedding tokens count against the budgets of the next chats and loads. The request is over, its
+            # Redis connection is closed, so the usage is written with a connection of its own
+            if self.usage_service is not None:
+                usage_service = copy.copy(self.usage_service)
+                usage_service.redis_repository = _redis_repository()
+                try:
+                    await usage_service.flush()
+                finally:
+                    await usage_service.redis_repository.close()
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config import settings
+from metrics import metrics
+from schemas import AllIntegrationsItems, IntegrationItem, IntegrationLoadReport
+from singleflight import single_flight
+
+from .base import BaseIntegrationService
+
+if TYPE_CHECKING:
+    from rag import RAGEngine
+
+    from ..usage import UsageService
+
+
+class CombinedIntegrationService:
+    """Loads every connected integration of a user at once, and indexes their items with a single index write"""
+
+    def __init__(
+        self,
+        integration_services: List[BaseIntegrationService],
+        rag_engine: Optional["RAGEngine"] = None,
+        usage_service: Optional["UsageService"] = None,
+    ):
+        self.integration_services = integration_services
+        self.rag_engine = rag_engine
+        self.usage_service = usage_service
+
+    async def _fetch(
+        self, integration_service: BaseIntegrationService, user_id: str, org_id: str
+    ) -> Tuple[IntegrationLoadReport, List[IntegrationItem]]:
+        """Fetch the items of an integration without indexing them, integrations without credentials are skipped"""
+
+        integration_type = integration_service.integration_type
+        try:
+            await integration_service.get_credentials(user_id, org_id)
+        except HTTPException:
+            return IntegrationLoadReport(integration_type=integration_type, connected=False), []
+
+        started_at = time.perf_counter()
+        try:
+            items = await integration_service.get_items(user_id=user_id, org_id=org_id, add_to_rag=False)
+        except Exception as e:
+            fetch_seconds = time.perf_counter() - started_at
+            metrics.increment("integration_fetch_errors_total", integration_type=integration_type)
+            return (
+                IntegrationLoadReport(
+                    integration_type=integration_type, connected=True, fetch_seconds=fetch_seconds, error=str(e)
+                ),
+                [],
+            )
+
+        fetch_seconds = time.perf_counter() - started_at
+        metrics.observe("integration_fetch_seconds", fetch_seconds, integration_type=integration_type)
+        return (
+            IntegrationLoadReport(
+                integration_type=integration_type, connected=True, items=len(items), fetch_seconds=fetch_seconds
+            ),
+            items,
+        )
+
+    async def get_all_items(self, user_id: str, org_id: str) -> AllIntegrationsItems:
+        """
+        Fetch the items of the connected integrations concurrently, then embed and insert them into the RAG index in
+        one batch, persisted once
+        The items of an integration which failed are kept in the index as they were
+        Loads of a tenant over its hard token budget are rejected before anything is fetched
+        """
+
+        if self.usage_service is not None and self.rag_engine is not None:
+            await self.usage_service.enforce_budget(user_id=user_id, org_id=org_id)
+
+        results = await asyncio.gather(
+            *[self._fetch(integration_service, user_id, org_id) for integration_service in self.integration_services]
+        )
+        reports = [report for report, _ in results]
+        items_by_integration_type = {
+            report.integration_type: items for report, items in results if report.connected and report.error is None
+        }
+
+        index_seconds = None
+        if self.rag_engine is not None and items_by_integration_type:
+            started_at = time.perf_counter()
+            try:
+                await self.rag_engine.add_integrations_items(
+                    user_id=user_id, org_id=org_id, items_by_integration_type=items_by_integration_type
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to add the items to the RAG engine: {e}")
+            finally:
+                # The embedding tokens count against the budgets of the next chats and loads
+                if self.usage_service is not None:
+                    await self.usage_service.flush()
+            index_seconds = time.perf_counter() - started_at
+            metrics.observe("integration_index_seconds", index_seconds)
+
+        return AllIntegrationsItems(items=items_by_integration_type, integrations=reports, index_seconds=index_seconds)
+
+    async def load_all_items(self, user_id: str, org_id: str) -> AllIntegrationsItems:
+        """Get the items of every integration, concurrent loads of the same user and org share one load"""
+
+        return await single_flight.do(
+            f"all_integrations_items:{org_id}:{user_id}",
+            lambda: self.get_all_items(user_id=user_id, org_id=org_id),
+            redis_repository=(
+                self.integration_services[0].redis_repository if settings.SINGLE_FLIGHT == "redis" else None
+            ),
+            serialize=AllIntegrationsItems.model_dump_json,
+            deserialize=AllIntegrationsItems.model_validate_json,
+            kind="all_integrations_items",
+        )
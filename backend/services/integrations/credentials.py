@@ -0,0 +1,270 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from config import settings
+from metrics import metrics
+from repositories.redis import RedisRepository
+from singleflight import single_flight
+
+if TYPE_CHECKING:
+    from .base import BaseIntegrationService
+
+
+def _redis_repository() -> RedisRepository:
+    return RedisRepository(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+
+
+@dataclass
+class CachedCredentials:
+    credentials: dict
+    # Monotonic times the credentials were read from Redis and last returned
+    cached_at: float
+    last_access: float
+
+
+class CredentialStore:
+    """
+    Credentials of the integrations, stored in Redis and cached in the worker process for `cache_ttl` seconds, so that
+    the loads do not read and parse them on every call.
+
+    Access tokens given with a refresh token and a lifetime are renewed `refresh_margin` seconds before they expire:
+    in the background while the credentials were used in the last `refresh_idle` seconds, otherwise by the next call
+    finding them expired. The refresh is locked in Redis, so that one worker exchanges a refresh token the provider may
+    rotate.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: float = 60,
+        refresh_margin: float = 300,
+        refresh_idle: float = 86400,
+        retry_interval: float = 30,
+        ttl: int = 90 * 86400,
+        max_entries: int = 10_000,
+        redis_repository_factory: Callable[[], RedisRepository] = _redis_repository,
+    ):
+        self.cache_ttl = cache_ttl
+        self.refresh_margin = refresh_margin
+        self.refresh_idle = refresh_idle
+        self.retry_interval = retry_interval
+        # Lifetime in Redis of the credentials without a refresh token lifetime
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # The refreshes outlive the request which cached the credentials, so they open their own Redis connection
+        self.redis_repository_factory = redis_repository_factory
+
+        # Redis key -> cached credentials, least recently used first
+        self._cache: OrderedDict[str, CachedCredentials] = OrderedDict()
+        # Redis key -> background refresh of the credentials
+        self._refreshes: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(service: "BaseIntegrationService", user_id: str, org_id: str) -> str:
+        return f"{service.integration_type.lower()}_credentials:{org_id}:{user_id}"
+
+    def _expiring(self, credentials: dict) -> bool:
+        """Whether the access token expires within the refresh margin, credentials without an expiry never do"""
+
+        expires_at = credentials.get("expires_at")
+        return expires_at is not None and expires_at - time.time() <= self.refresh_margin
+
+    def _cache_put(self, key: str, credentials: dict):
+        now = time.monotonic()
+        self._cache[key] = CachedCredentials(credentials=credentials, cached_at=now, last_access=now)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _cache_refreshed(self, key: str, credentials: dict):
+        # A refresh is no access, the credentials of idle users stop being refreshed
+        entry = self._cache.get(key)
+        if entry is not None:
+            entry.credentials = credentials
+            entry.cached_at = time.monotonic()
+
+    async def _read(self, redis_repository: RedisRepository, key: str) -> Optional[dict]:
+        credentials = await redis_repository.get(key)
+        return json.loads(credentials) if credentials else None
+
+    async def _write(self, redis_repository: RedisRepository, key: str, credentials: dict):
+        # The credentials are kept as long as they can be refreshed
+        refresh_expires_at = credentials.get("refresh_expires_at")
+        expire = int(refresh_expires_at - time.time()) if refresh_expires_at is not None else self.ttl
+        await redis_repository.add(key, json.dumps(credentials), expire=max(expire, 1))
+
+    @staticmethod
+    def _stamp(token_response: dict) -> dict:
+        """Token response with the absolute expiry of its tokens, shared by the workers"""
+
+        credentials = dict(token_response)
+        now = time.time()
+        if token_response.get("expires_in") is not None:
+            credentials["expires_at"] = now + float(token_response["expires_in"])
+        if token_response.get("refresh_expires_in") is not None:
+            credentials["refresh_expires_at"] = now + float(token_response["refresh_expires_in"])
+        return credentials
+
+    async def save(self, service: "BaseIntegrationService", user_id: str, org_id: str, token_response: dict):
+        """Store the credentials of a token response of the OAuth flow, and schedule their refresh"""
+
+        key = self._key(service, user_id, org_id)
+        credentials = self._stamp(token_response)
+        await self._write(service.redis_repository, key, credentials)
+        self._cache_put(key, credentials)
+        self._schedule_refresh(service, key)
+
+    async def get(self, service: "BaseIntegrationService", user_id: str, org_id: str) -> dict:
+        """Credentials of the user, raises a 400 if they went through no OAuth flow or their refresh token expired"""
+
+        key = self._key(service, user_id, org_id)
+        integration_type = service.integration_type
+
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.cached_at < self.cache_ttl and not self._expiring(entry.credentials):
+            metrics.increment("credentials_cache_total", integration_type=integration_type, outcome="hit")
+            entry.last_access = now
+            self._cache.move_to_end(key)
+            return entry.credentials
+
+        metrics.increment("credentials_cache_total", integration_type=integration_type, outcome="miss")
+        credentials = await self._read(service.redis_repository, key)
+        if credentials is None:
+            self._cache.pop(key, None)
+            raise HTTPException(status_code=400, detail=f"No credentials found for {integration_type}.")
+
+        # Expired, e.g. after a restart of the worker refreshing them, the call waits for the refresh
+        expires_at = credentials.get("expires_at")
+        if expires_at is not None and expires_at <= time.time() and credentials.get("refresh_token"):
+            credentials = await single_flight.do(
+                f"credentials_refresh:{key}",
+                lambda: self._refresh(service, key, trigger="inline"),
+                kind="credentials_refresh",
+            )
+            if credentials is None:
+                raise HTTPException(status_code=400, detail=f"No credentials found for {integration_type}.")
+
+        self._cache_put(key, credentials)
+        self._schedule_refresh(service, key)
+        return credentials
+
+    async def _refresh(
+        self, service: "BaseIntegrationService", key: str, trigger: str, lock_timeout: float = 30
+    ) -> Optional[dict]:
+        """
+        Renew the access token of the credentials unless another worker did, returns the current credentials, None if
+        the provider revoked them
+        """
+
+        integration_type = service.integration_type
+        redis_repository = service.redis_repository
+        lock_key = f"{key}:refresh_lock"
+        started_at = time.monotonic()
+        while not await redis_repository.add_if_absent(lock_key, "1", expire=int(lock_timeout)):
+            # Another worker refreshes them, its credentials are read once it released the lock
+            if time.monotonic() - started_at > lock_timeout:
+                return await self._read(redis_repository, key)
+            await asyncio.sleep(0.1)
+
+        try:
+            credentials = await self._read(redis_repository, key)
+            if credentials is None or not self._expiring(credentials) or not credentials.get("refresh_token"):
+                return credentials
+
+            started_at = time.perf_counter()
+            try:
+                token_response = await service.refresh_credentials(credentials)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in (400, 401):
+                    raise
+                # The refresh token was revoked or expired, the user goes through the OAuth flow again
+                logging.warning(
+                    f"The {integration_type} refresh token of {key} was rejected, the credentials are removed"
+                )
+                metrics.increment("credentials_refreshes_total", integration_type=integration_type, outcome="revoked")
+                await redis_repository.delete(key)
+                self._cache.pop(key, None)
+                return None
+            metrics.observe(
+                "credentials_refresh_seconds", time.perf_counter() - started_at, integration_type=integration_type
+            )
+            metrics.increment(
+                "credentials_refreshes_total", integration_type=integration_type, outcome="refreshed", trigger=trigger
+            )
+
+            # Fields the token response leaves out, e.g. the refresh token when it is not rotated, are kept
+            credentials = {**credentials, **self._stamp(token_response)}
+            await self._write(redis_repository, key, credentials)
+            self._cache_refreshed(key, credentials)
+            return credentials
+        finally:
+            await redis_repository.delete(lock_key)
+
+    def _schedule_refresh(self, service: "BaseIntegrationService", key: str):
+        entry = self._cache.get(key)
+        if entry is None or entry.credentials.get("expires_at") is None or not entry.credentials.get("refresh_token"):
+            return
+
+        task = self._refreshes.get(key)
+        if task is not None and not task.done():
+            return
+
+        task = asyncio.create_task(self._refresh_loop(service, key))
+        self._refreshes[key] = task
+
+        def discard(done: asyncio.Task):
+            if self._refreshes.get(key) is done:
+                del self._refreshes[key]
+
+        task.add_done_callback(discard)
+
+    async def _refresh_loop(self, service: "BaseIntegrationService", key: str):
+        """Refresh the cached credentials before they expire, until they are evicted or unused for `refresh_idle`"""
+
+        # The request the service was created for is over, it is given a connection of its own
+        service = copy.copy(service)
+        failed = False
+        while True:
+            entry = self._cache.get(key)
+            if entry is None or time.monotonic() - entry.last_access > self.refresh_idle:
+                return
+
+            delay = entry.credentials["expires_at"] - self.refresh_margin - time.time()
+            await asyncio.sleep(max(delay, self.retry_interval if failed else 0))
+
+            redis_repository = self.redis_repository_factory()
+            service.redis_repository = redis_repository
+            try:
+                credentials = await self._refresh(service, key, trigger="background")
+            except Exception:
+                logging.exception(f"Failed to refresh the {service.integration_type} credentials of {key}")
+                metrics.increment(
+                    "credentials_refreshes_total", integration_type=service.integration_type, outcome="error"
+                )
+                failed = True
+                continue
+            finally:
+                await redis_repository.close()
+
+            if credentials is None:
+                return
+            # Refreshed by another worker, or still expiring if its refresh failed
+            self._cache_refreshed(key, credentials)
+            failed = self._expiring(credentials)
+
+
+credential_store = CredentialStore(
+    cache_ttl=settings.CREDENTIALS_CACHE_TTL,
+    refresh_margin=settings.CREDENTIALS_REFRESH_MARGIN,
+    refresh_idle=settings.CREDENTIALS_REFRESH_IDLE,
+    ttl=settings.CREDENTIALS_TTL,
+)
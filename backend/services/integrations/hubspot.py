@@ -1,13 +1,16 @@
 import asyncio
 import base64
+import hashlib
+import hmac
 import json
 import secrets
-from typing import List
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Dict, List, Set, Tuple
 
 import httpx
 from fastapi import HTTPException, Request
 from fastapi.responses import HTMLResponse
-from hubspot import HubSpot
 
 from config import settings
 from schemas import IntegrationItem
@@ -15,10 +18,22 @@ from utils import rich_print_json
 
 from .base import BaseIntegrationService
 
+if TYPE_CHECKING:
+    from hubspot import HubSpot
+
+
+def _hubspot_client(access_token: str) -> "HubSpot":
+    # The SDK is imported on first use, it loads the API clients and models of every CRM object
+    from hubspot import HubSpot
+
+    return HubSpot(access_token=access_token)
+
 
 class HubspotService(BaseIntegrationService):
     """Hubspot integration service inherits from BaseIntegrationService"""
 
+    integration_type = "Hubspot"
+
     async def authorize(self, user_id: str, org_id: str) -> str:
         """Authorize the user to access the Hubspot API"""
 
@@ -73,9 +88,7 @@ class HubspotService(BaseIntegrationService):
             )
             response.raise_for_status()
 
-        await self.redis_repository.add(
-            f"hubspot_credentials:{org_id}:{user_id}", json.dumps(response.json()), expire=600
-        )
+        await self.save_credentials(user_id, org_id, response.json())
 
         close_window_script = """
         <html>
@@ -87,25 +100,34 @@ class HubspotService(BaseIntegrationService):
 
         return HTMLResponse(content=close_window_script)
 
-    async def get_credentials(self, user_id: str, org_id: str) -> dict:
-        """
-        Get the HubSpot credentials for the user
-        """
+    async def refresh_credentials(self, credentials: dict) -> dict:
+        """Exchange the refresh token for a new access token, HubSpot access tokens expire after 30 minutes"""
 
-        credentials = await self.redis_repository.get(f"hubspot_credentials:{org_id}:{user_id}")
-        if not credentials:
-            raise HTTPException(status_code=400, detail="No credentials found for HubSpot integration.")
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{settings.HUBSPOT_API_URL}/oauth/v1/token",
+                data={
+                    "grant_type": "refresh_token",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "refresh_token": credentials["refresh_token"],
+                },
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded",
+                },
+            )
+            response.raise_for_status()
 
-        return json.loads(credentials)
+        return response.json()
 
-    async def get_items(self, user_id: str, org_id: str) -> List[IntegrationItem]:
+    async def get_items(self, user_id: str, org_id: str, add_to_rag: bool = True) -> List[IntegrationItem]:
         """
         Fetch the items from HubSpot API
         - Here we are fetching the contacts of the companies as integration items.
         """
 
         credentials = await self.get_credentials(user_id, org_id)
-        api_client = HubSpot(access_token=credentials.get("access_token"))
+        api_client = _hubspot_client(credentials.get("access_token"))
 
         list_of_integration_item_metadata = []
 
@@ -135,19 +157,168 @@ class HubspotService(BaseIntegrationService):
         rich_print_json(items_json, "Hubspot Integration Items")
 
         # Add the items to the RAG engine in a coroutine without blocking the main thread
-        if self.rag_engine is not None:
+        if add_to_rag and self.rag_engine is not None:
             asyncio.create_task(
                 self.add_integration_items_to_rag(
                     user_id=user_id,
                     org_id=org_id,
-                    items_json=items_json,
-                    integration_type="Hubspot",
+                    items=list_of_integration_item_metadata,
+                    integration_type=self.integration_type,
                 )
             )
 
         return list_of_integration_item_metadata
 
-    async def _fetch_contacts_of_companies(self, api_client: HubSpot):
+    async def get_webhook_account_id(self, user_id: str, org_id: str) -> str:
+        """Id of the HubSpot portal the access token of the user belongs to"""
+
+        credentials = await self.get_credentials(user_id, org_id)
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                f"{settings.HUBSPOT_API_URL}/oauth/v1/access-tokens/{credentials.get('access_token')}"
+            )
+            response.raise_for_status()
+
+        return str(response.json()["hub_id"])
+
+    def verify_webhook_signature(self, request: Request, body: bytes):
+        """Check the v3 signature, an HMAC of the method, URL, body and timestamp keyed by the client secret"""
+
+        signature = request.headers.get("X-HubSpot-Signature-v3")
+        timestamp = request.headers.get("X-HubSpot-Request-Timestamp")
+        if not signature or not timestamp or not timestamp.isdigit():
+            raise HTTPException(status_code=401, detail="Missing HubSpot webhook signature.")
+
+        # Old requests are rejected, so that a captured request cannot be replayed
+        if abs(time.time() - int(timestamp) / 1000) > settings.WEBHOOK_SIGNATURE_MAX_AGE:
+            raise HTTPException(status_code=401, detail="Expired HubSpot webhook signature.")
+
+        # Signed with the URL HubSpot calls, which is the public one when the backend is behind a proxy
+        uri = f"{settings.BACKEND_URL}{request.url.path}{f'?{request.url.query}' if request.url.query else ''}"
+        message = f"{request.method}{uri}".encode() + body + timestamp.encode()
+        expected_signature = base64.b64encode(
+            hmac.new(self.client_secret.encode(), message, hashlib.sha256).digest()
+        ).decode()
+        if not hmac.compare_digest(expected_signature, signature):
+            raise HTTPException(status_code=401, detail="Invalid HubSpot webhook signature.")
+
+    def parse_webhook_events(self, payload: Any) -> Dict[str, Set[str]]:
+        """
+        Contacts and companies changed per portal
+        An association change is synced through the object it is from, which is resynced with all its associations
+        """
+
+        changes = defaultdict(set)
+        for event in payload if isinstance(payload, list) else []:
+            subscription_type = str(event.get("subscriptionType", ""))
+            object_type, _, change = subscription_type.partition(".")
+            if object_type not in ("contact", "company"):
+                continue
+
+            object_id = event.get("fromObjectId") if change == "associationChange" else event.get("objectId")
+            if event.get("portalId") is None or object_id is None:
+                continue
+            changes[str(event["portalId"])].add(f"{object_type}:{object_id}")
+
+        return changes
+
+    async def get_changed_items(
+        self, user_id: str, org_id: str, object_keys: List[str]
+    ) -> Tuple[List[IntegrationItem], List[dict]]:
+        """
+        A changed contact replaces its items, one per company, a changed company replaces the items of its contacts
+        """
+
+        credentials = await self.get_credentials(user_id, org_id)
+        api_client = _hubspot_client(credentials.get("access_token"))
+
+        items, replace_filters = [], []
+        for object_key in object_keys:
+            object_type, _, object_id = object_key.partition(":")
+            if object_type == "contact":
+                replace_filters.append({"item_id": object_id})
+                items.extend(await self._fetch_contact_items(api_client, object_id))
+            elif object_type == "company":
+                replace_filters.append({"parent_id": object_id})
+                items.extend(await self._fetch_company_items(api_client, object_id))
+
+        return items, replace_filters
+
+    async def _fetch_contact_items(self, api_client: "HubSpot", contact_id: str) -> List[IntegrationItem]:
+        """Items of a contact with each of its companies, none if it was deleted"""
+
+        from hubspot.crm.companies import ApiException as CompaniesApiException
+        from hubspot.crm.contacts import ApiException as ContactsApiException
+
+        try:
+            contact = await asyncio.to_thread(
+                api_client.crm.contacts.basic_api.get_by_id, contact_id, associations=["companies"]
+            )
+        except ContactsApiException as e:
+            if e.status == 404:
+                return []
+            raise
+
+        contact = contact.to_dict()
+        if contact.get("archived"):
+            return []
+
+        company_ids = [
+            company.get("id")
+            for company in ((contact.get("associations") or {}).get("companies") or {}).get("results", [])
+            if company.get("type") == "contact_to_company"
+        ]
+        items = []
+        for company_id in company_ids:
+            try:
+                company = await asyncio.to_thread(api_client.crm.companies.basic_api.get_by_id, company_id)
+            except CompaniesApiException as e:
+                if e.status == 404:
+                    continue
+                raise
+            items.append(await self._create_integration_item_metadata_object(contact, company.to_dict()))
+
+        return items
+
+    async def _fetch_company_items(self, api_client: "HubSpot", company_id: str) -> List[IntegrationItem]:
+        """Items of the contacts of a company, none if it was deleted"""
+
+        from hubspot.crm.companies import ApiException as CompaniesApiException
+        from hubspot.crm.contacts import ApiException as ContactsApiException
+
+        try:
+            company = await asyncio.to_thread(
+                api_client.crm.companies.basic_api.get_by_id, company_id, associations=["contacts"]
+            )
+        except CompaniesApiException as e:
+            if e.status == 404:
+                return []
+            raise
+
+        company = company.to_dict()
+        if company.get("archived"):
+            return []
+
+        contact_ids = [
+            contact.get("id")
+            for contact in ((company.get("associations") or {}).get("contacts") or {}).get("results", [])
+            if contact.get("type") == "company_to_contact"
+        ]
+        items = []
+        for contact_id in contact_ids:
+            try:
+                contact = await asyncio.to_thread(api_client.crm.contacts.basic_api.get_by_id, contact_id)
+            except ContactsApiException as e:
+                if e.status == 404:
+                    continue
+                raise
+            contact = contact.to_dict()
+            if not contact.get("archived"):
+                items.append(await self._create_integration_item_metadata_object(contact, company))
+
+        return items
+
+    async def _fetch_contacts_of_companies(self, api_client: "HubSpot"):
         """
         Fetch the contacts of the companies
         """
@@ -156,7 +327,7 @@ class HubspotService(BaseIntegrationService):
         companies_with_contacts = [company.to_dict() for company in companies_with_contacts]
         return companies_with_contacts
 
-    async def _fetch_item_as_hubspot_contact(self, api_client: HubSpot, contact_id: str):
+    async def _fetch_item_as_hubspot_contact(self, api_client: "HubSpot", contact_id: str):
         """
         Fetch the contact of the company
         """
@@ -1,8 +1,11 @@
 import asyncio
 import base64
+import hashlib
+import hmac
 import json
 import secrets
-from typing import Any, List
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
 
 import httpx
 from fastapi import HTTPException, Request
@@ -18,6 +21,8 @@ from .base import BaseIntegrationService
 class NotionService(BaseIntegrationService):
     """Notion integration service inherits from BaseIntegrationService"""
 
+    integration_type = "Notion"
+
     async def authorize(self, user_id: str, org_id: str) -> str:
         """Authorize the user to access the Notion API"""
 
@@ -67,9 +72,7 @@ class NotionService(BaseIntegrationService):
                 self.redis_repository.delete(f"notion_state:{org_id}:{user_id}"),
             )
 
-        await self.redis_repository.add(
-            f"notion_credentials:{org_id}:{user_id}", json.dumps(response.json()), expire=600
-        )
+        await self.save_credentials(user_id, org_id, response.json())
 
         close_window_script = """
         <html>
@@ -80,16 +83,7 @@ class NotionService(BaseIntegrationService):
         """
         return HTMLResponse(content=close_window_script)
 
-    async def get_credentials(self, user_id: str, org_id: str) -> dict:
-        """Get the credentials for the Notion API"""
-
-        credentials = await self.redis_repository.get(f"notion_credentials:{org_id}:{user_id}")
-        if not credentials:
-            raise HTTPException(status_code=400, detail="No credentials found.")
-
-        return json.loads(credentials)
-
-    async def get_items(self, user_id: str, org_id: str) -> List[IntegrationItem]:
+    async def get_items(self, user_id: str, org_id: str, add_to_rag: bool = True) -> List[IntegrationItem]:
         """Aggregates all metadata relevant for a notion integration"""
 
         credentials = await self.get_credentials(user_id, org_id)
@@ -117,18 +111,104 @@ class NotionService(BaseIntegrationService):
         rich_print_json(items_json, "Notion Integration Items")
 
         # Add the items to the RAG engine in a coroutine without blocking the main thread
-        if self.rag_engine is not None:
+        if add_to_rag and self.rag_engine is not None:
             asyncio.create_task(
                 self.add_integration_items_to_rag(
                     user_id=user_id,
                     org_id=org_id,
-                    items_json=items_json,
-                    integration_type="Notion",
+                    items=list_of_integration_item_metadata,
+                    integration_type=self.integration_type,
                 )
             )
 
         return list_of_integration_item_metadata
 
+    async def get_webhook_account_id(self, user_id: str, org_id: str) -> str:
+        """Id of the Notion workspace the integration of the user is installed in"""
+
+        credentials = await self.get_credentials(user_id, org_id)
+        if not credentials.get("workspace_id"):
+            raise HTTPException(status_code=400, detail="No Notion workspace found in the credentials.")
+
+        return credentials["workspace_id"]
+
+    def verify_webhook_signature(self, request: Request, body: bytes):
+        """Check the signature, an HMAC of the body keyed by the verification token of the subscription"""
+
+        if settings.NOTION_WEBHOOK_VERIFICATION_TOKEN is None:
+            raise HTTPException(status_code=401, detail="Notion webhooks are not verified yet.")
+
+        signature = request.headers.get("X-Notion-Signature", "")
+        expected_signature = (
+            "sha256=" + hmac.new(settings.NOTION_WEBHOOK_VERIFICATION_TOKEN.encode(), body, hashlib.sha256).hexdigest()
+        )
+        if not hmac.compare_digest(expected_signature, signature):
+            raise HTTPException(status_code=401, detail="Invalid Notion webhook signature.")
+
+    def parse_webhook_events(self, payload: Any) -> Dict[str, Set[str]]:
+        """Pages and databases changed per workspace, Notion sends one event per request"""
+
+        changes = defaultdict(set)
+        events = payload if isinstance(payload, list) else [payload]
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+
+            entity = event.get("entity") or {}
+            if entity.get("type") not in ("page", "database") or not entity.get("id"):
+                continue
+            if event.get("workspace_id") is None:
+                continue
+            changes[event["workspace_id"]].add(f"{entity['type']}:{entity['id']}")
+
+        return changes
+
+    async def receive_webhook(self, request: Request) -> dict:
+        # Notion sends the verification token once, unsigned, when the subscription is created
+        body = await request.body()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid webhook payload.")
+
+        if isinstance(payload, dict) and "verification_token" in payload:
+            rich_print_json(
+                json.dumps(payload, indent=4),
+                "Notion webhook verification token, set it as NOTION_WEBHOOK_VERIFICATION_TOKEN",
+            )
+            return {"accepted": 0}
+
+        return await super().receive_webhook(request)
+
+    async def get_changed_items(
+        self, user_id: str, org_id: str, object_keys: List[str]
+    ) -> Tuple[List[IntegrationItem], List[dict]]:
+        """A changed page or database replaces its item, a deleted one removes it"""
+
+        credentials = await self.get_credentials(user_id, org_id)
+        items, replace_filters = [], []
+        async with httpx.AsyncClient() as client:
+            for object_key in object_keys:
+                object_type, _, object_id = object_key.partition(":")
+                replace_filters.append({"item_id": object_id})
+
+                response = await client.get(
+                    f"{settings.NOTION_API_URL}/{object_type}s/{object_id}",
+                    headers={
+                        "Authorization": f"Bearer {credentials.get('access_token')}",
+                        "Notion-Version": settings.NOTION_VERSION,
+                    },
+                )
+                if response.status_code == 404:
+                    continue
+                response.raise_for_status()
+
+                result = response.json()
+                if not result.get("archived") and not result.get("in_trash"):
+                    items.append(await self._create_integration_item_metadata_object(result))
+
+        return items, replace_filters
+
     async def _create_integration_item_metadata_object(self, response_json: dict) -> IntegrationItem:
         """Creates an integration metadata object from the response"""
 
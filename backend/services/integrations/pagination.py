@@ -0,0 +1,138 @@
+import base64
+import binascii
+import hashlib
+import json
+import secrets
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from repositories.redis import RedisRepository
+from schemas import IntegrationItem, IntegrationItemPage
+
+SORT_FIELDS = ("name", "type", "creation_time", "last_modified_time")
+
+
+def encode_cursor(result_set_id: str, view_id: str, offset: int, page_size: int) -> str:
+    cursor = json.dumps({"r": result_set_id, "v": view_id, "o": offset, "n": page_size}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(cursor.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not (
+            isinstance(decoded.get("r"), str)
+            and isinstance(decoded.get("v"), str)
+            and isinstance(decoded.get("o"), int)
+            and isinstance(decoded.get("n"), int)
+        ):
+            raise ValueError("Missing cursor field")
+    except (binascii.Error, ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    return decoded
+
+
+class ItemResultSets:
+    """
+    Server-side result sets of integration items, paged through by opaque cursors.
+
+    A load stores its items once in a Redis list, and the sort and filters of the load as a list of positions in that
+    list, computed when the result set is created. A page reads a range of positions and the items at them, its cost
+    depends on the page size only. The keys are derived from the user and org of the request, a cursor cannot reach the items of another user.
+    """
+
+    def __init__(self, redis_repository: RedisRepository, ttl: int = 900, max_page_size: int = 500):
+        self.redis_repository = redis_repository
+        self.ttl = ttl
+        self.max_page_size = max_page_size
+
+    @staticmethod
+    def _view_id(sort: Optional[str], item_type: Optional[str], parent_id: Optional[str]) -> str:
+        return hashlib.sha256(json.dumps([sort, item_type, parent_id]).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _sort_value(value):
+        # Datetimes of different integrations may or may not carry a timezone
+        return value.timestamp() if isinstance(value, datetime) else str(value)
+
+    def _view(
+        self, items: List[IntegrationItem], sort: Optional[str], item_type: Optional[str], parent_id: Optional[str]
+    ) -> List[int]:
+        """Positions of the items matching the filters, in sort order"""
+
+        positions = [
+            position
+            for position, item in enumerate(items)
+            if (item_type is None or item.type == item_type) and (parent_id is None or item.parent_id == parent_id)
+        ]
+        if not sort:
+            return positions
+
+        descending = sort.startswith("-")
+        field = sort.lstrip("-")
+        if field not in SORT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Invalid sort field {field}, expected one of {SORT_FIELDS}.")
+
+        # Items without a value come last in both directions
+        with_value = [position for position in positions if getattr(items[position], field) is not None]
+        without_value = [position for position in positions if getattr(items[position], field) is None]
+        with_value.sort(key=lambda position: self._sort_value(getattr(items[position], field)), reverse=descending)
+        return with_value + without_value
+
+    async def _page(self, items_key: str, result_set_id: str, view_id: str, offset: int, page_size: int):
+        view_key = f"{items_key}:view:{view_id}"
+        positions = await self.redis_repository.get_list_range(view_key, offset, offset + page_size - 1)
+        total = await self.redis_repository.get_list_length(view_key)
+        values = await self.redis_repository.get_list_values(items_key, [int(position) for position in positions])
+        if any(value is None for value in values):
+            raise HTTPException(status_code=410, detail="The result set expired, please load the items again.")
+
+        next_offset = offset + len(positions)
+        return IntegrationItemPage(
+            items=[IntegrationItem.model_validate_json(value) for value in values],
+            next_cursor=encode_cursor(result_set_id, view_id, next_offset, page_size) if next_offset < total else None,
+            total=total,
+        )
+
+    def _check_page_size(self, page_size: int):
+        if not 0 < page_size <= self.max_page_size:
+            raise HTTPException(status_code=400, detail=f"The page size must be between 1 and {self.max_page_size}.")
+
+    async def create(
+        self,
+        namespace: str,
+        items: List[IntegrationItem],
+        page_size: int,
+        sort: Optional[str] = None,
+        item_type: Optional[str] = None,
+        parent_id: Optional[str] = None,
+    ) -> IntegrationItemPage:
+        """Materialize the items under `namespace` and return the first page of the sorted and filtered view"""
+
+        self._check_page_size(page_size)
+        view_id = self._view_id(sort, item_type, parent_id)
+        view = self._view(items, sort, item_type, parent_id)
+
+        result_set_id = secrets.token_urlsafe(12)
+        items_key = f"{namespace}:{result_set_id}"
+        await self.redis_repository.add_list(items_key, [item.model_dump_json() for item in items], expire=self.ttl)
+        await self.redis_repository.add_list(f"{items_key}:view:{view_id}", view, expire=self.ttl)
+
+        return await self._page(items_key, result_set_id, view_id, 0, page_size)
+
+    async def next_page(self, namespace: str, cursor: str) -> IntegrationItemPage:
+        """Page of a result set of `namespace` at the cursor"""
+
+        decoded = decode_cursor(cursor)
+        self._check_page_size(decoded["n"])
+        if decoded["o"] < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+        items_key = f"{namespace}:{decoded['r']}"
+        if await self.redis_repository.get_list_length(f"{items_key}:view:{decoded['v']}") == 0:
+            raise HTTPException(status_code=410, detail="The result set expired, please load the items again.")
+
+        return await self._page(items_key, decoded["r"], decoded["v"], decoded["o"], decoded["n"])
@@ -0,0 +1,144 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, Set
+
+from fastapi import HTTPException
+
+from config import settings
+from metrics import metrics
+from repositories.redis import RedisRepository
+
+if TYPE_CHECKING:
+    from .base import BaseIntegrationService
+
+
+def _redis_repository() -> RedisRepository:
+    return RedisRepository(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+
+
+class WebhookSync:
+    """
+    Coalesces the change events pushed by the webhooks of an integration, and re-ingests the changed objects.
+
+    The objects changed in an account, e.g. a HubSpot portal or a Notion workspace, are collected in a Redis set shared
+    by the worker processes, so that a burst of events on the same object is synced once. The first event of a burst
+    takes a flush lock and schedules the flush of the account `coalesce_seconds` later, which fetches the changed
+    objects for every user subscribed to the account and upserts them into their index.
+    """
+
+    def __init__(
+        self,
+        coalesce_seconds: float = 5,
+        redis_repository_factory: Callable[[], RedisRepository] = _redis_repository,
+    ):
+        self.coalesce_seconds = coalesce_seconds
+        # The flush outlives the webhook request, so it opens its own Redis connection
+        self.redis_repository_factory = redis_repository_factory
+
+        # Scheduled flushes, referenced so that they are not garbage collected while they wait
+        self._flushes: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _subscribers_key(integration_type: str, account_id: str) -> str:
+        return f"webhook_subscribers:{integration_type}:{account_id}"
+
+    @staticmethod
+    def _pending_key(integration_type: str, account_id: str) -> str:
+        return f"webhook_pending:{integration_type}:{account_id}"
+
+    @staticmethod
+    def _flush_lock_key(integration_type: str, account_id: str) -> str:
+        return f"webhook_flush:{integration_type}:{account_id}"
+
+    async def subscribe(
+        self, redis_repository: RedisRepository, integration_type: str, account_id: str, user_id: str, org_id: str
+    ):
+        await redis_repository.add_to_set(
+            self._subscribers_key(integration_type, account_id), [json.dumps([org_id, user_id])]
+        )
+
+    async def unsubscribe(
+        self, redis_repository: RedisRepository, integration_type: str, account_id: str, user_id: str, org_id: str
+    ):
+        await redis_repository.remove_from_set(
+            self._subscribers_key(integration_type, account_id), json.dumps([org_id, user_id])
+        )
+
+    async def enqueue(self, service: "BaseIntegrationService", account_id: str, object_keys: Iterable[str]):
+        """Add changed objects of an account, and schedule its flush unless one is already scheduled"""
+
+        object_keys = sorted(set(object_keys))
+        if not object_keys:
+            return
+
+        integration_type = service.integration_type
+        metrics.increment("webhook_events_total", len(object_keys), integration_type=integration_type)
+        await service.redis_repository.add_to_set(self._pending_key(integration_type, account_id), object_keys)
+
+        # Held for twice the window, a flush lost with its worker is retried by the next event after that
+        if await service.redis_repository.add_if_absent(
+            self._flush_lock_key(integration_type, account_id), "1", expire=int(2 * self.coalesce_seconds) + 1
+        ):
+            task = asyncio.create_task(self._flush_later(service, account_id))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush_later(self, service: "BaseIntegrationService", account_id: str):
+        await asyncio.sleep(self.coalesce_seconds)
+
+        redis_repository = self.redis_repository_factory()
+        try:
+            await self.flush(service, account_id, redis_repository)
+        except Exception:
+            logging.exception(f"Failed to sync the webhook changes of {service.integration_type} account {account_id}")
+        finally:
+            await redis_repository.close()
+
+    async def flush(self, service: "BaseIntegrationService", account_id: str, redis_repository: RedisRepository):
+        """Sync the pending objects of an account for every user subscribed to it"""
+
+        integration_type = service.integration_type
+        # The request the service was created for is over, it is given a connection of its own
+        service = copy.copy(service)
+        service.redis_repository = redis_repository
+
+        # Released before taking the pending objects, an event arriving meanwhile schedules the next flush
+        await redis_repository.delete(self._flush_lock_key(integration_type, account_id))
+        object_keys = sorted(
+            member.decode()
+            for member in await redis_repository.pop_set(self._pending_key(integration_type, account_id))
+        )
+        subscribers = await redis_repository.get_set_members(self._subscribers_key(integration_type, account_id))
+        if not object_keys or service.rag_engine is None:
+            return
+
+        for subscriber in subscribers:
+            org_id, user_id = json.loads(subscriber)
+            started_at = time.perf_counter()
+            try:
+                items, replace_filters = await service.get_changed_items(user_id, org_id, object_keys)
+                await service.rag_engine.sync_integration_items(
+                    user_id=user_id,
+                    org_id=org_id,
+                    items=items,
+                    integration_type=integration_type,
+                    replace_filters=replace_filters,
+                )
+            except HTTPException:
+                # The credentials of the user expired, the changes are picked up by their next load
+                metrics.increment("webhook_syncs_total", integration_type=integration_type, outcome="no_credentials")
+                continue
+            except Exception:
+                logging.exception(f"Failed to sync the {integration_type} webhook changes of {org_id}:{user_id}")
+                metrics.increment("webhook_syncs_total", integration_type=integration_type, outcome="error")
+                continue
+
+            metrics.increment("webhook_syncs_total", integration_type=integration_type, outcome="synced")
+            metrics.increment("webhook_synced_objects_total", len(object_keys), integration_type=integration_type)
+            metrics.observe("webhook_sync_seconds", time.perf_counter() - started_at, integration_type=integration_type)
+
+
+webhook_sync = WebhookSync(coalesce_seconds=settings.WEBHOOK_COALESCE_SECONDS)
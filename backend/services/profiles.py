@@ -0,0 +1,30 @@
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import PlainTextResponse
+
+from profiling import profile_key
+from repositories import RedisRepository
+
+
+class ProfileService:
+    """Profiles of the requests recorded by the profiling middleware"""
+
+    def __init__(self, redis_repository: RedisRepository):
+        self.redis_repository = redis_repository
+
+    async def get_profile(self, profile_id: str, collapsed: bool = False):
+        """
+        Profile of the request, or its stacks in the collapsed format of the flame graph tools, e.g. speedscope or
+        flamegraph.pl, if `collapsed` is set
+        """
+
+        profile = await self.redis_repository.get(profile_key(profile_id))
+        if profile is None:
+            raise HTTPException(status_code=404, detail=f"No profile found for the id {profile_id}.")
+
+        profile = json.loads(profile)
+        if collapsed:
+            return PlainTextResponse("\n".join(f"{stack['stack']} {stack['count']}" for stack in profile["stacks"]))
+
+        return profile
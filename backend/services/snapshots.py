@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+
+if TYPE_CHECKING:
+    from rag import RAGEngine
+
+
+class SnapshotService:
+    """Export and import of tenant index snapshots, to warm up or migrate a node"""
+
+    def __init__(self, rag_engine: "RAGEngine"):
+        self.rag_engine = rag_engine
+
+    async def export_snapshot(self, user_id: str, org_id: str) -> FileResponse:
+        """Snapshot archive of the index of the user and org, removed once sent"""
+
+        # Imported on use, the snapshots pull in the vector stores and llama_index
+        from rag.snapshots import file_sha256
+
+        directory = tempfile.mkdtemp(prefix="rag_snapshot_")
+        archive_path = os.path.join(directory, f"snapshot_org_{org_id}_user_{user_id}.tar.gz")
+        try:
+            await self.rag_engine.export_snapshot(user_id=user_id, org_id=org_id, output_path=archive_path)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        return FileResponse(
+            archive_path,
+            media_type="application/gzip",
+            filename=os.path.basename(archive_path),
+            headers={"X-Snapshot-SHA256": file_sha256(archive_path)},
+            background=BackgroundTask(shutil.rmtree, directory, ignore_errors=True),
+        )
+
+    async def import_snapshot(self, user_id: str, org_id: str, archive: UploadFile, warm: bool = False) -> dict:
+        """Replace the index of the user and org with the uploaded snapshot, returns its manifest"""
+
+        from rag.snapshots import SnapshotError
+
+        with tempfile.NamedTemporaryFile(prefix="rag_snapshot_", suffix=".tar.gz") as file:
+            shutil.copyfileobj(archive.file, file)
+            file.flush()
+
+            try:
+                manifest = await self.rag_engine.import_snapshot(
+                    user_id=user_id, org_id=org_id, archive_path=file.name, warm=warm
+                )
+            except SnapshotError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+
+        return {"imported_files": len(manifest["files"]), "created_at": manifest["created_at"]}
@@ -0,0 +1,162 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config import settings
+from metrics import metrics
+from rag.usage import USAGE_FIELDS, total_tokens
+from repositories import RedisRepository
+
+if TYPE_CHECKING:
+    from rag.callbacks import UsageHandler
+
+# Format of the period in the usage keys, and longest duration of a period
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+PERIOD_SECONDS = {"day": 86400, "month": 31 * 86400}
+
+
+def _budget_status(tokens: float, soft_budget: Optional[int], hard_budget: Optional[int]) -> str:
+    if hard_budget is not None and tokens >= hard_budget:
+        return "hard"
+    if soft_budget is not None and tokens >= soft_budget:
+        return "soft"
+    return "ok"
+
+
+class UsageService:
+    """
+    Token usage of the orgs and users over the current period, aggregated in Redis across the worker processes, and
+    their budgets.
+
+    The usage recorded by the RAG engine of the process is written on `flush`, after every chat and before the usage
+    is read, so the usage of the loads is written with the next chat of the worker.
+    """
+
+    def __init__(self, redis_repository: RedisRepository, usage_handler: Optional["UsageHandler"] = None):
+        self.redis_repository = redis_repository
+        self.usage_handler = usage_handler
+
+    @staticmethod
+    def _period() -> Tuple[str, int]:
+        """Current period, and the seconds until the next one"""
+
+        now = datetime.now(timezone.utc)
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if settings.USAGE_PERIOD == "day":
+            next_start = start + timedelta(days=1)
+        else:
+            start = start.replace(day=1)
+            next_start = (start + timedelta(days=32)).replace(day=1)
+
+        return start.strftime(PERIOD_FORMATS[settings.USAGE_PERIOD]), int((next_start - now).total_seconds()) + 1
+
+    @staticmethod
+    def _org_key(org_id: str, period: str) -> str:
+        return f"usage:org:{org_id}:{period}"
+
+    @staticmethod
+    def _user_key(org_id: str, user_id: str, period: str) -> str:
+        return f"usage:user:{org_id}:{user_id}:{period}"
+
+    async def _get_usage(self, key: str) -> Dict[str, float]:
+        usage = {field.decode(): float(value) for field, value in (await self.redis_repository.get_hash(key)).items()}
+        return {field: usage.get(field, 0.0) for field in USAGE_FIELDS}
+
+    async def flush(self):
+        """Write the usage recorded in the process since the last flush, kept for the next one if Redis fails"""
+
+        if self.usage_handler is None:
+            return
+
+        usage_by_tenant = self.usage_handler.drain()
+        if not usage_by_tenant:
+            return
+
+        period, reset_in = self._period()
+        # The usage of the previous period stays readable for a period
+        expire = reset_in + PERIOD_SECONDS[settings.USAGE_PERIOD]
+
+        # The org and user usage of every tenant is written in one transaction, so that a failed write is retried
+        # whole without counting any part of it twice
+        values_by_key: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for (org_id, user_id), usage in usage_by_tenant.items():
+            for key in (self._org_key(org_id, period), self._user_key(org_id, user_id, period)):
+                for field, value in usage.items():
+                    values_by_key[key][field] += value
+        try:
+            await self.redis_repository.increment_hashes(values_by_key, expire=expire)
+        except Exception:
+            logging.exception("Failed to write the token usage, it is kept for the next flush")
+            self.usage_handler.restore(usage_by_tenant)
+
+    async def enforce_budget(self, user_id: str, org_id: str) -> bool:
+        """
+        Raise a 429 if the org or the user is over its hard budget, and return whether it is over its soft budget, in
+        which case its chats should be degraded to the cheaper fast mode
+        """
+
+        budgets = [
+            ("org", settings.USAGE_ORG_SOFT_BUDGET, settings.USAGE_ORG_HARD_BUDGET),
+            ("user", settings.USAGE_USER_SOFT_BUDGET, settings.USAGE_USER_HARD_BUDGET),
+        ]
+        budgets = [(scope, soft, hard) for scope, soft, hard in budgets if soft is not None or hard is not None]
+        if not budgets:
+            return False
+
+        # The usage of the previous chats of the process counts as well
+        await self.flush()
+
+        period, reset_in = self._period()
+        degraded = False
+        for scope, soft_budget, hard_budget in budgets:
+            key = self._org_key(org_id, period) if scope == "org" else self._user_key(org_id, user_id, period)
+            status = _budget_status(total_tokens(await self._get_usage(key)), soft_budget, hard_budget)
+            if status == "ok":
+                continue
+
+            metrics.increment("usage_budget_exceeded_total", scope=scope, budget=status)
+            if status == "hard":
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"The token budget of the {scope} is used up until the next {settings.USAGE_PERIOD}.",
+                    headers={"Retry-After": str(reset_in)},
+                )
+            degraded = True
+
+        return degraded
+
+    async def get_usage(self, org_id: str, user_id: Optional[str] = None) -> dict:
+        """Usage of the org, and of the user if given, over the current period, with their budgets"""
+
+        await self.flush()
+
+        period, reset_in = self._period()
+        usage = {"period": period, "resets_in_seconds": reset_in}
+        scopes = [
+            ("org", self._org_key(org_id, period), settings.USAGE_ORG_SOFT_BUDGET, settings.USAGE_ORG_HARD_BUDGET)
+        ]
+        if user_id is not None:
+            scopes.append(
+                (
+                    "user",
+                    self._user_key(org_id, user_id, period),
+                    settings.USAGE_USER_SOFT_BUDGET,
+                    settings.USAGE_USER_HARD_BUDGET,
+                )
+            )
+
+        for scope, key, soft_budget, hard_budget in scopes:
+            scope_usage = await self._get_usage(key)
+            tokens = total_tokens(scope_usage)
+            usage[scope] = {
+                **scope_usage,
+                "total_tokens": tokens,
+                "soft_budget": soft_budget,
+                "hard_budget": hard_budget,
+                "budget_status": _budget_status(tokens, soft_budget, hard_budget),
+            }
+
+        return usage
@@ -0,0 +1,119 @@
+import asyncio
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Union
+
+from config import settings
+from metrics import metrics
+from repositories import RedisRepository
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical operations, the callers of `do` with the same key while a call is in flight share
+    its result instead of running the operation again.
+
+    Calls given a Redis repository are also coalesced across worker processes: the first worker takes a lock in
+    Redis, and the workers arriving while it is held wait for the result it publishes.
+    """
+
+    def __init__(self, enabled: bool = True, lock_ttl: int = 120, result_ttl: int = 5, poll_interval: float = 0.05):
+        self.enabled = enabled
+        self.lock_ttl = lock_ttl
+        # Kept long enough for the workers polling for it
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+
+        # key -> task running the operation
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: Union[str, Hashable],
+        operation: Callable[[], Awaitable[Any]],
+        redis_repository: Optional[RedisRepository] = None,
+        serialize: Callable[[Any], Union[str, bytes]] = str,
+        deserialize: Callable[[Union[str, bytes]], Any] = lambda value: value,
+        kind: str = "default",
+    ) -> Any:
+        """
+        Run the operation, or wait for the identical one in flight
+        Across processes the result goes through Redis, `serialize` and `deserialize` convert it from and to bytes
+        """
+
+        if not self.enabled:
+            return await operation()
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            metrics.increment("singleflight_calls_total", kind=kind, outcome="shared")
+        else:
+            metrics.increment("singleflight_calls_total", kind=kind, outcome="leader")
+            if redis_repository is not None:
+                coroutine = self._do_shared(str(key), operation, redis_repository, serialize, deserialize, kind)
+            else:
+                coroutine = operation()
+            task = asyncio.ensure_future(coroutine)
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # A cancelled caller, e.g. a closed connection, does not cancel the operation for the others
+        return await asyncio.shield(task)
+
+    async def _do_shared(
+        self,
+        key: str,
+        operation: Callable[[], Awaitable[Any]],
+        redis_repository: RedisRepository,
+        serialize: Callable[[Any], Union[str, bytes]],
+        deserialize: Callable[[Union[str, bytes]], Any],
+        kind: str,
+    ) -> Any:
+        lock_key = f"singleflight_lock:{key}"
+        token = secrets.token_hex(16)
+        while not await redis_repository.add_if_absent(lock_key, token, expire=self.lock_ttl):
+            # Another worker runs the operation, its result is published under the token of its lock
+            leader_token = await redis_repository.get(lock_key)
+            if leader_token is None:
+                continue
+            if isinstance(leader_token, bytes):
+                leader_token = leader_token.decode("utf-8")
+
+            result = await self._wait_for_result(key, leader_token, redis_repository)
+            if result is not None:
+                metrics.increment("singleflight_calls_total", kind=kind, outcome="shared_remote")
+                return deserialize(result)
+            # The other worker failed or its lock expired, try to run the operation here
+
+        try:
+            result = await operation()
+            await redis_repository.add(f"singleflight_result:{key}:{token}", serialize(result), expire=self.result_ttl)
+            return result
+        finally:
+            # Only release the lock if it was not taken over after expiring
+            if await redis_repository.get(lock_key) in (token, token.encode("utf-8")):
+                await redis_repository.delete(lock_key)
+
+    async def _wait_for_result(
+        self, key: str, leader_token: str, redis_repository: RedisRepository
+    ) -> Optional[Union[str, bytes]]:
+        """Result published by the leader, None if it releases its lock without one"""
+
+        result_key = f"singleflight_result:{key}:{leader_token}"
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            result = await redis_repository.get(result_key)
+            if result is not None:
+                return result
+            if await redis_repository.get(f"singleflight_lock:{key}") not in (
+                leader_token,
+                leader_token.encode("utf-8"),
+            ):
+                # The result is published before the lock is released
+                return await redis_repository.get(result_key)
+            await asyncio.sleep(self.poll_interval)
+
+        return None
+
+
+single_flight = SingleFlight(enabled=settings.SINGLE_FLIGHT != "none", lock_ttl=settings.SINGLE_FLIGHT_LOCK_TTL)
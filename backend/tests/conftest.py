@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The settings require the OAuth clients of the integrations, placeholders are enough offline
+for name in ["AIRTABLE", "HUBSPOT", "NOTION"]:
+    os.environ.setdefault(f"{name}_CLIENT_ID", "test")
+    os.environ.setdefault(f"{name}_CLIENT_SECRET", "test")
+
+# The modules of the backend are imported from its directory, like uvicorn does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
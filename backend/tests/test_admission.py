@@ -0,0 +1,132 @@
+import asyncio
+from typing import Optional
+from urllib.parse import urlencode
+
+import pytest
+from fakeredis import FakeServer
+
+import dependencies
+from benchmarks.providers import FakeRedisRepository
+from dependencies import get_ai_service, get_redis_client
+from main import create_server
+from schemas import BatchChatResult
+
+USER_KEY = "admission:chat:user:o:u"
+
+
+class FakeAIService:
+    """Answers the batches after `latency` seconds per message, recording the slots of the user held meanwhile"""
+
+    def __init__(self, latency: float, server: FakeServer):
+        self.latency = latency
+        self.redis_repository = FakeRedisRepository(server)
+        self.held = []
+
+    async def chat_batch(self, user_id, org_id, messages, scope):
+        async def results():
+            for index, question in enumerate(messages):
+                await asyncio.sleep(self.latency)
+                self.held.append(await self.redis_repository.redis_client.zcard(USER_KEY))
+                yield BatchChatResult(index=index, question=question, message="answer")
+
+        return results()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(dependencies, "RedisRepository", lambda **kwargs: FakeRedisRepository(server))
+    return server
+
+
+def _app(server, ai_service):
+    async def get_fake_redis_client():
+        redis_repository = FakeRedisRepository(server)
+        try:
+            yield redis_repository
+        finally:
+            await redis_repository.close()
+
+    app = create_server()
+    app.dependency_overrides[get_redis_client] = get_fake_redis_client
+    app.dependency_overrides[get_ai_service] = lambda: ai_service
+    return app
+
+
+async def _post_batch(app, messages, disconnect_after: Optional[float] = None):
+    """POST a batch to the app, the client disconnects after `disconnect_after` seconds if given"""
+
+    body = urlencode({"user_id": "u", "org_id": "o", "messages": messages}, doseq=True).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/chat/batch",
+        "raw_path": b"/chat/batch",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/x-www-form-urlencoded"), (b"host", b"test")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    sent = []
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # A client which stays connected never disconnects
+        await asyncio.sleep(disconnect_after if disconnect_after is not None else float("inf"))
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # Sent over a network
+        await asyncio.sleep(0.01)
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent
+
+
+def test_slot_is_held_while_streaming_and_released_after(server):
+    ai_service = FakeAIService(latency=0.01, server=server)
+    app = _app(server, ai_service)
+    redis_repository = FakeRedisRepository(server)
+
+    async def run():
+        sent = await _post_batch(app, ["first", "second"])
+        return sent, await redis_repository.redis_client.zcard(USER_KEY)
+
+    sent, released = asyncio.run(run())
+
+    assert sent[0]["status"] == 200
+    assert b"second" in b"".join(message.get("body", b"") for message in sent)
+    assert ai_service.held == [1, 1]
+    assert released == 0
+
+
+def test_slot_is_released_when_the_client_disconnects(server):
+    app = _app(server, FakeAIService(latency=10, server=server))
+    redis_repository = FakeRedisRepository(server)
+
+    async def run():
+        await asyncio.wait_for(_post_batch(app, ["first"], disconnect_after=0), timeout=5)
+        return await redis_repository.redis_client.zcard(USER_KEY)
+
+    assert asyncio.run(run()) == 0
+
+
+def test_slot_is_released_when_the_batch_is_rejected(server):
+    app = _app(server, FakeAIService(latency=0, server=server))
+    redis_repository = FakeRedisRepository(server)
+
+    async def run():
+        sent = await _post_batch(app, ["question"] * 1000)
+        return sent, await redis_repository.redis_client.zcard(USER_KEY)
+
+    sent, held = asyncio.run(run())
+
+    assert sent[0]["status"] == 400
+    assert held == 0
@@ -0,0 +1,44 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from rag.context import ContextAssembler
+
+
+def _nodes(texts):
+    return [NodeWithScore(node=TextNode(text=text), score=1.0 - index / 100) for index, text in enumerate(texts)]
+
+
+def _tokens(assembler, nodes):
+    return sum(assembler._count_tokens(node.node) for node in nodes)
+
+
+def test_context_stays_within_the_token_budget():
+    assembler = ContextAssembler(token_budget=100)
+    nodes = _nodes(["alpha beta gamma " * 200, *[f"small node {index} " * 5 for index in range(4)]])
+
+    assembled = assembler.postprocess_nodes(nodes)
+
+    assert assembled
+    assert _tokens(assembler, assembled) <= 100
+
+
+def test_oversized_best_node_is_truncated_and_uses_up_the_budget():
+    assembler = ContextAssembler(token_budget=50)
+    nodes = _nodes(["one two three four " * 100, "short"])
+
+    assembled = assembler.postprocess_nodes(nodes)
+
+    assert len(assembled) == 1
+    assert 40 < _tokens(assembler, assembled) <= 50
+    assert nodes[0].node.text.startswith(assembled[0].node.text)
+
+
+def test_nodes_are_packed_in_score_order_up_to_the_budget_and_max_nodes():
+    texts = [f"node {index} " + "word " * 20 for index in range(6)]
+
+    for token_budget in [10, 30, 60, 100, 1000]:
+        assembler = ContextAssembler(token_budget=token_budget)
+        assert _tokens(assembler, assembler.postprocess_nodes(_nodes(texts))) <= token_budget
+
+    assembler = ContextAssembler(token_budget=1000, max_nodes=2)
+    assembled = assembler.postprocess_nodes(_nodes(texts))
+    assert [node.node.text for node in assembled] == [text.strip() for text in texts[:2]]
@@ -0,0 +1,70 @@
+import asyncio
+from typing import List
+
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import Document
+
+from benchmarks.fakes import FakeEmbedding
+from rag.ingestion import IngestionStages
+
+
+class CountingEmbedding(FakeEmbedding):
+    """Fake embedding model counting the texts it embedded"""
+
+    texts: int = 0
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.texts += len(texts)
+        return await super()._aget_text_embeddings(texts)
+
+
+def _stages(tmp_path):
+    return IngestionStages(
+        embed_model=CountingEmbedding(),
+        transformations=[SentenceSplitter(chunk_size=64, chunk_overlap=0)],
+        workers=1,
+        cache_path=str(tmp_path / "ingestion_cache.json"),
+    )
+
+
+def _documents(texts):
+    return [Document(text=text, doc_id=f"doc{index}") for index, text in enumerate(texts)]
+
+
+def test_only_the_changed_documents_are_embedded_again(tmp_path):
+    stages = _stages(tmp_path)
+    texts = [f"Document {index} is about the topic number {index}." for index in range(5)]
+    first = asyncio.run(stages.run(_documents(texts)))
+    assert stages.embed_model.texts == 5
+
+    texts[2] = "Document 2 changed its topic."
+    second = asyncio.run(stages.run(_documents([*texts, "A new document."])))
+
+    assert stages.embed_model.texts == 7
+    assert [node.ref_doc_id for node in second] == [f"doc{index}" for index in range(6)]
+    unchanged = {node.node_id: node.embedding for node in first if node.ref_doc_id != "doc2"}
+    assert all(unchanged[node.node_id] == node.embedding for node in second if node.node_id in unchanged)
+    assert len(unchanged.keys() & {node.node_id for node in second}) == 4
+
+
+def test_cache_outlives_the_stages(tmp_path):
+    stages = _stages(tmp_path)
+    documents = _documents(["First document. " * 40, "Second document."])
+    nodes = asyncio.run(stages.run(documents))
+    stages.persist_cache()
+
+    stages = _stages(tmp_path)
+    cached_nodes = asyncio.run(stages.run(documents))
+
+    assert stages.embed_model.texts == 0
+    assert len(nodes) > 2
+    assert [node.node_id for node in cached_nodes] == [node.node_id for node in nodes]
+
+
+def test_same_content_under_another_id_is_not_a_hit(tmp_path):
+    stages = _stages(tmp_path)
+    asyncio.run(stages.run([Document(text="Same text.", doc_id="a")]))
+
+    nodes = asyncio.run(stages.run([Document(text="Same text.", doc_id="b")]))
+
+    assert [node.ref_doc_id for node in nodes] == ["b"]
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeServer
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError
+
+from benchmarks.providers import FakeRedisRepository
+from rag.callbacks import UsageHandler
+from services.usage import UsageService
+
+USAGE = {("org", "user"): {"llm_calls": 1.0, "llm_prompt_tokens": 120.0, "llm_completion_tokens": 30.0}}
+
+
+def _service():
+    usage_handler = UsageHandler()
+    usage_handler.restore(USAGE)
+    return UsageService(FakeRedisRepository(FakeServer()), usage_handler)
+
+
+def _recorded(usage):
+    return {field: value for field, value in usage.items() if field in USAGE[("org", "user")]}
+
+
+def test_flush_writes_the_org_and_user_usage():
+    service = _service()
+
+    usage = asyncio.run(service.get_usage("org", "user"))
+
+    assert _recorded(usage["org"]) == USAGE[("org", "user")]
+    assert _recorded(usage["user"]) == USAGE[("org", "user")]
+    assert service.usage_handler.drain() == {}
+
+
+@pytest.mark.parametrize("failing_write", [1, 2])
+def test_failed_flush_is_retried_without_counting_twice(monkeypatch, failing_write):
+    service = _service()
+    execute = Pipeline.execute
+    writes = 0
+
+    async def flaky_execute(pipeline, *args, **kwargs):
+        nonlocal writes
+        writes += 1
+        if writes == failing_write:
+            raise ConnectionError("connection lost")
+        return await execute(pipeline, *args, **kwargs)
+
+    monkeypatch.setattr(Pipeline, "execute", flaky_execute)
+
+    async def flush_twice():
+        await service.flush()
+        await service.flush()
+        return await service.get_usage("org", "user")
+
+    usage = asyncio.run(flush_twice())
+
+    assert _recorded(usage["org"]) == USAGE[("org", "user")]
+    assert _recorded(usage["user"]) == USAGE[("org", "user")]
@@ -0,0 +1,48 @@
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from rag.vector_stores import CompressedVectorStore
+
+
+def _node(node_id, ref_doc_id, seed):
+    embedding = np.random.default_rng(seed).standard_normal(16).tolist()
+    return TextNode(
+        id_=node_id,
+        embedding=embedding,
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)},
+    )
+
+
+def _query_ids(store):
+    query = VectorStoreQuery(query_embedding=[1.0] * 16, similarity_top_k=100)
+    return set(store.query(query).ids)
+
+
+def test_delete_removes_the_nodes_of_the_document_only():
+    store = CompressedVectorStore()
+    store.add([_node(f"a{index}", "a", index) for index in range(3)] + [_node("b0", "b", 3)])
+    # Added again, its previous row is already dead
+    store.add([_node("a0", "a", 4)])
+
+    store.delete("a")
+
+    assert len(store) == 1
+    assert _query_ids(store) == {"b0"}
+    store.delete("a")
+    assert len(store) == 1
+
+
+def test_delete_after_persist(tmp_path):
+    store = CompressedVectorStore()
+    store.add([_node("a0", "a", 0), _node("b0", "b", 1), _node("c0", "c", 2)])
+    store.delete("a")
+    store.persist(str(tmp_path / "default__vector_store.json"))
+
+    store = CompressedVectorStore.from_persist_dir(str(tmp_path))
+    store.delete("b")
+    store.add([_node("d0", "d", 3)])
+    store.delete("d")
+
+    assert len(store) == 1
+    assert _query_ids(store) == {"c0"}
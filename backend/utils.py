@@ -1,8 +1,8 @@
-from rich.console import Console
-from rich.syntax import Syntax
-
-
 def rich_print_json(items: str, message: str, theme: str = "dracula", line_numbers: bool = True):
+    # Imported on use, rich is only needed to print the loaded items
+    from rich.console import Console
+    from rich.syntax import Syntax
+
     console = Console()
     console.print(f"\n-------------------------------- {message} --------------------------------")
     syntax = Syntax(items, "json", theme=theme, line_numbers=line_numbers)